@@ -10,12 +10,20 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-import plyer
-from app import Alert, db  # Adjust the import if needed
-from flask import current_app
-from app import CameraSetting  # Replace 'your_app' with your actual app module name
+from models import Alert, CameraSetting, db
+from database import app_context
+from metrics import ALERT_TYPES, series
+from object_detection import object_view
+from quality_ladder import tier_name
+from shared_state import camera_frame_shape, cameras_by_id
+from startup_report import StartupReport
+from structured_log import get_logger
+
+log = get_logger("alerts")
 # 🔹 Global settings
 ALERT_INTERVAL = 60
+# IVSS_NOTIFICATIONS=0 stores and logs alerts without email or desktop notifications (soak tests, headless hosts)
+NOTIFICATIONS = os.getenv("IVSS_NOTIFICATIONS", "1") != "0"
 last_alert_time = {
     "motion": {},
     "object": {},
@@ -26,17 +34,16 @@ last_alert_time = {
 def load_camera_settings():
     """Loads camera settings from database."""
     try:
-        with current_app.app_context():
-            settings = CameraSetting.query.all()
-            if settings:
-                setts = [setting.to_dict() for setting in settings]
-                print(setts)
-                return setts
-            else:
-                # Return default settings if no settings exist in database
-                return []
+        settings = CameraSetting.query.order_by(CameraSetting.id).all()
+        if settings:
+            setts = [setting.to_dict() for setting in settings]
+            log.debug("Camera settings: %s", setts)
+            return setts
+        else:
+            # Return default settings if no settings exist in database
+            return []
     except Exception as e:
-        print(f"Error loading camera settings: {e}")
+        log.error("Error loading camera settings: %s", e)
         # Return default settings on error
         return []
 
@@ -46,7 +53,7 @@ def capture_frame(cam_id):
     time.sleep(2)
 
     if not cap.isOpened():
-        print(f"[ERROR] Could not access camera {cam_id}")
+        log.error("Could not access camera %s", cam_id, extra={"key": f"capture-open:{cam_id}"})
         return None
 
     ret, frame = cap.read()
@@ -56,13 +63,13 @@ def capture_frame(cam_id):
         image_path = f"alert_frame_cam{cam_id}.jpg"
         cv2.imwrite(image_path, frame)
         if os.path.exists(image_path) and os.path.getsize(image_path) > 0:
-            print(f"[INFO] Frame captured successfully: {image_path}")
+            log.info("Frame captured successfully: %s", image_path)
             return image_path
         else:
-            print("[ERROR] Captured image is empty or corrupted.")
+            log.error("Captured image is empty or corrupted.")
             return None
     else:
-        print("[ERROR] Failed to capture frame.")
+        log.error("Failed to capture frame.")
         return None
 
 # 🔹 Send Email with Attachment
@@ -84,9 +91,9 @@ def send_email_notification(subject, message, attachment_path=None):
             encoders.encode_base64(part)
             part.add_header("Content-Disposition", f"attachment; filename={os.path.basename(attachment_path)}")
             msg.attach(part)
-        print(f"[INFO] Image attached: {attachment_path}")
+        log.info("Image attached: %s", attachment_path)
     else:
-        print("[WARNING] No valid image attached.")
+        log.warning("No valid image attached.")
 
     try:
         server = smtplib.SMTP('smtp.gmail.com', 587)
@@ -94,12 +101,13 @@ def send_email_notification(subject, message, attachment_path=None):
         server.login(sender_email, password)
         server.sendmail(sender_email, receiver_email, msg.as_string())
         server.quit()
-        print("[INFO] Email sent successfully.")
+        log.info("Email sent successfully.")
     except Exception as e:
-        print(f"[ERROR] Failed to send email: {e}")
+        log.error("Failed to send email: %s", e, extra={"key": "email-failed"})
 
 # 🔹 Send Local Notification
 def send_local_notification(title, message):
+    import plyer  # loads a platform notification backend; only needed once an alert fires
     plyer.notification.notify(
         title=title,
         message=message,
@@ -108,7 +116,15 @@ def send_local_notification(title, message):
     )
 
 
-def store_alert(camera, location, message, severity):
+def notify(title, message, attachment_path=None):
+    """Email and desktop notification for a stored alert, unless notifications are switched off."""
+    if not NOTIFICATIONS:
+        return
+    send_email_notification(title, message, attachment_path)
+    send_local_notification(title, message)
+
+
+def store_alert(camera, location, message, severity, clip_path=None, model_tier=None):
     alert_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     new_alert = Alert(
         camera=camera,
@@ -117,11 +133,14 @@ def store_alert(camera, location, message, severity):
         message=message,
         severity=severity,
         status='New',  # Default status
-        is_true_detection=None  # Will be reviewed later
+        is_true_detection=None,  # Will be reviewed later
+        clip_path=clip_path,
+        model_tier=model_tier
     )
     db.session.add(new_alert)
-    db.session.commit()
-    print(f"[INFO] Alert stored: {camera}, {location}, {alert_time}, {message}, {severity}")
+    with series("ivss_db_commit_seconds").time():
+        db.session.commit()
+    log.info("Alert stored: %s, %s, %s, %s, %s", camera, location, alert_time, message, severity)
 
 # 🔹 Check Alert Interval (per alert type)
 def can_trigger_alert(alert_type, cam_id):
@@ -133,7 +152,8 @@ def can_trigger_alert(alert_type, cam_id):
         last_alert_time[alert_type][cam_id] = current_time
         return True
     else:
-        print(f"[DEBUG] Skipping {alert_type} alert for Camera {cam_id} due to time restriction.")
+        log.debug("Skipping %s alert for Camera %s due to time restriction.", alert_type, cam_id,
+                  extra={"key": f"skip-{alert_type}:{cam_id}"})
         return False
 
 # 🔹 Main Alert Processing Function
@@ -143,13 +163,40 @@ from collections import defaultdict
 import time
 from collections import defaultdict
 from queue import Empty
-from app import app  # or whatever your Flask file is named
+from clip_recorder import request_clip
+from detection_ring import DETECTION_TYPES, DetectionRing
 
-def alert_process(object_queue, face_queue, motion_queue):
-    with app.app_context():
-        camera_settings = load_camera_settings()
-        print(camera_settings)
-        log_file_path = "alerts_log.txt"
+def queue_depth(queue):
+    try:
+        return queue.qsize()
+    except NotImplementedError:  # multiprocessing queues on macOS
+        return float("nan")
+
+
+def alert_process(rings, clip_queues=None, health_queue=None):
+    """
+    Turns detections into stored alerts. rings maps (cam_id, detector) to the
+    name of that detector's detection ring; each pass reads everything new in
+    every ring and alerts on the newest frame's detections, at most one alert
+    per camera and type every alert_interval seconds.
+    """
+    clip_queues = clip_queues or {}
+    startup = StartupReport("alerts")
+    readers = {key: DetectionRing(name) for key, name in rings.items()}
+    dropped = {key: series("ivss_detections_dropped_total", cam=key[0], detector=key[1]) for key in readers}
+    reported_drops = defaultdict(int)
+    metrics = {alert_type: {
+        "alerts": series("ivss_alerts_total", type=alert_type),
+        "latency": series("ivss_alert_latency_seconds", type=alert_type),
+        "queue_depth": series("ivss_alert_queue_depth", type=alert_type),
+    } for alert_type in ALERT_TYPES}
+    with app_context():
+        with startup.measure("database"):
+            camera_settings = cameras_by_id(load_camera_settings())
+        startup.finish("ready")
+        log.debug("Alert settings: %s", camera_settings)
+        # Kept open for the life of the process instead of being reopened for every alert
+        alert_log = open("alerts_log.txt", "a", encoding="utf-8", buffering=1)
 
         last_alert_times = defaultdict(lambda: 0)
         alert_interval = 10  # seconds
@@ -157,92 +204,92 @@ def alert_process(object_queue, face_queue, motion_queue):
         def log_to_file(alert_type, cam_id, message, severity, image_path):
             timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
             log_line = f"[{timestamp}] {alert_type.upper()} ALERT - Camera: {cam_id} | Severity: {severity} | Message: {message} | Image: {image_path}\n"
-            with open(log_file_path, "a", encoding="utf-8") as f:
-                f.write(log_line)
+            alert_log.write(log_line)
+
+        def record_alert(alert_type, frame_time):
+            metrics[alert_type]["alerts"].inc()
+            if frame_time:
+                metrics[alert_type]["latency"].observe(max(time.time() - frame_time, 0.0))
 
         while True:
             now = time.time()
-            # 🔥 Face Recognition Alerts
-
-            try:
-                alert = face_queue.get_nowait()
-                print('Im here --------------------------')
-                print(alert)
-                alert = alert[0]  # Assuming alert is a list-like with one item
-                cam_id = alert.get("cam_id")
-                name = alert.get("label") or alert.get("name", "Unknown face")
-
-                if isinstance(cam_id, int) and 0 <= cam_id < len(camera_settings):
-                    if "face" in camera_settings[cam_id].get("detections", []):
-                        key = ("face", cam_id)
-                        if now - last_alert_times[key] >= alert_interval:
-                            image_path = alert.get("image") or capture_frame(cam_id)
-                            message = f"Face detected: {name}"
-                            severity = alert.get("severity", "high")
-                            log_to_file("face", cam_id, message, severity, image_path)
-                            store_alert(f"Camera {cam_id}", "Face Recognition", message, severity)
-                            send_email_notification("Face Detected", message, image_path)
-                            send_local_notification("Face Detected", message)
-                            last_alert_times[key] = now
-
-                            # ✅ Flush the rest of the queue
-                            while True:
-                                try:
-                                    face_queue.get_nowait()
-                                except Empty:
-                                    break
-            except Empty:
-                pass
-
-            # # 🔥 Motion Detection Alerts
+            backlog = dict.fromkeys(DETECTION_TYPES, 0)
+            for (_, detector), ring in readers.items():
+                backlog[detector] += ring.backlog()
+            for detector, depth in backlog.items():
+                metrics[detector]["queue_depth"].set(depth)
+            if health_queue is not None:
+                metrics["health"]["queue_depth"].set(queue_depth(health_queue))
+
+            # 🔥 Camera Health Alerts (already limited to one per camera per few minutes by the preprocess process)
             try:
-
-                alert = motion_queue.get_nowait()
-                cam_id = alert.get("cam_id")
-                if isinstance(cam_id, int) and 0 <= cam_id < len(camera_settings):
-                    if "motion" in camera_settings[cam_id].get("detections", []):
-                        key = ("motion", cam_id)
-                        if now - last_alert_times[key] >= alert_interval:
-                            image_path = alert.get("image") or capture_frame(cam_id)
-                            message = alert.get("message", "Motion detected")
-                            severity = alert.get("severity", "medium")
-                            log_to_file("motion", cam_id, message, severity, image_path)
-                            store_alert(f"Camera {cam_id}", "Motion Detection", message, severity)
-                            send_local_notification("Motion Detected", message)
-                            send_email_notification("Motion Detected", message, image_path)
-                            last_alert_times[key] = now
+                alert = health_queue.get_nowait() if health_queue is not None else None
+                cam_id = alert.get("cam_id") if alert else None
+                if cam_id in camera_settings:
+                    image_path = alert.get("image_path")
+                    message = alert.get("message", "Camera unhealthy")
+                    severity = alert.get("severity", "high")
+                    log_to_file("health", cam_id, message, severity, image_path)
+                    store_alert(f"Camera {cam_id}", "Camera Health", message, severity)
+                    record_alert("health", None)
+                    notify("Camera Unhealthy", message, image_path)
             except Empty:
                 pass
 
-            # 🔥 Object Detection Alerts
-            try:
-                alert = object_queue.get_nowait()
-                cam_id = alert.get("cam_id")
-                if isinstance(cam_id, int) and 0 <= cam_id < len(camera_settings):
-                    if "object" in camera_settings[cam_id].get("detections", []):
-                        label = alert.get("detections")[0]["label"]
-                        key = ("object", cam_id)
-                        print(alert)
-                        if now - last_alert_times[key] >= alert_interval:
-                            # image_path = alert.get("image") or capture_frame(cam_id)
-                            message = f"Object detected: {label}"
-                            severity = alert.get("severity", "high")
-                            log_to_file("object", cam_id, message, severity, "image_path")
-                            store_alert(f"Camera {cam_id}", "Object Detection", message, severity)
-                            send_email_notification("Object Detected", message, "image_path")
-                            send_local_notification("Object Detected", message)
-                            last_alert_times[key] = now
-                                                    # ✅ Flush the rest of the queue
-                            while True:
-                                try:
-                                    object_queue.get_nowait()
-                                except Empty:
-                                    break
-            except Empty:
-                pass
-
-
+            for (cam_id, detector), ring in readers.items():
+                records = ring.read()
+                drops = ring.dropped()
+                if drops > reported_drops[(cam_id, detector)]:
+                    dropped[(cam_id, detector)].inc(drops - reported_drops[(cam_id, detector)])
+                    reported_drops[(cam_id, detector)] = drops
+                if not len(records) or cam_id not in camera_settings:
+                    continue
+                if detector not in camera_settings[cam_id].get("detections", []):
+                    continue
+                key = (detector, cam_id)
+                if now - last_alert_times[key] < alert_interval:
+                    # Detections read while the camera is rate-limited are not alerted on
+                    continue
+                # Only the newest frame's detections are reported
+                latest = records[records["seq"] == records["seq"][-1]]
+                first = latest[0]
+                label = first["label"].decode(errors="replace")
+                image_path = first["image"].decode(errors="replace") or None
+                frame_time = float(first["frame_time"])
+                model_tier = None
+
+                # 🔥 Face Recognition Alerts
+                if detector == "face":
+                    log.debug("Face detections received: %s", latest)
+                    image_path = image_path or capture_frame(cam_id)
+                    message = f"Face detected: {label or 'Unknown face'}"
+                    severity = "high"
+                    location, title = "Face Recognition", "Face Detected"
+
+                # 🔥 Motion Detection Alerts
+                elif detector == "motion":
+                    image_path = image_path or capture_frame(cam_id)
+                    score = int(first["confidence"])
+                    message = (f"Motion detected in {label} with score {score}" if label
+                               else f"Motion detected with score {score}")
+                    severity = "medium"
+                    location, title = "Motion Detection", "Motion Detected"
+
+                # 🔥 Object Detection Alerts
+                else:
+                    log.debug("Object detections received: %s", latest)
+                    message = f"Object detected: {label}"
+                    view_size = object_view(camera_frame_shape(camera_settings[cam_id]))["size"]
+                    model_tier = tier_name(int(first["tier"]), view_size)
+                    severity = "high"
+                    location, title = "Object Detection", "Object Detected"
+
+                log_to_file(detector, cam_id, message, severity, image_path)
+                # Centred on the frame's capture, not on when this loop got to it
+                clip_path = request_clip(clip_queues.get(cam_id), cam_id, detector, frame_time or now)
+                store_alert(f"Camera {cam_id}", location, message, severity, clip_path, model_tier)
+                record_alert(detector, frame_time)
+                notify(title, message, image_path)
+                last_alert_times[key] = now
 
             time.sleep(0.05)
-
-
@@ -2,25 +2,36 @@
 # IMPORTS
 # ================================================================
 
-from flask import Flask, render_template, Response, jsonify, request, redirect, url_for, flash
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, render_template, Response, jsonify, request, redirect, url_for, flash, send_from_directory
+from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from flask_migrate import Migrate
-from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from functools import wraps
 from datetime import datetime
-from multiprocessing import shared_memory
 import cv2
 import numpy as np
 import sqlite3
 import os
 import json
-import face_recognition
 import pickle
 import filetype
+import time
+from shared_state import FRAME_META_DTYPE, attach_shared_array, camera_frame_shape, cameras_by_id, frame_meta_name
+from frame_health import HEALTH_NAMES
+from detection_overlay import OverlayReader
+from inference_scheduler import SCHEDULER_CAPACITY, SCHEDULER_SHM_NAME, SLOT_DTYPE
+from metrics import METRIC_DTYPE, SERIES, attach_metrics_table, render_metrics, web_metrics
+from worker_profiler import MAX_SECONDS, PROFILE_DIR, list_profiles, profile_requests, request_profile
+from motion_analytics import heatmap_overlay, load_activity, load_heatmap
+from segment_recorder import camera_recording_dir, find_frame, list_segments, load_index, read_recorded_frame
 # --- IMPORTS ---
+import signal
 import subprocess
+import sys
+from instance_lock import running_pipeline_pid
+from cpu_layout import pin_web_process
+from database import init_db
+from models import db, User, Alert, CameraSetting, bump_config_version
 from flask import flash, redirect, url_for
 # ================================================================
 # APPLICATION CONFIGURATION
@@ -33,105 +44,15 @@ load_dotenv()  # Load variables from .env
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY")
 
-# PostgreSQL configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("SQLALCHEMY_DATABASE_URI")
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = os.getenv("SQLALCHEMY_TRACK_MODIFICATIONS")
 app.config['UPLOAD_FOLDER'] = os.getenv("UPLOAD_FOLDER")
 
 
 
-# Initialize extensions
-db = SQLAlchemy(app)
+# Initialize extensions (PostgreSQL configuration comes from .env, see database.py)
+init_db(app)
 migrate = Migrate(app, db)
 
 
-# ================================================================
-# DATABASE MODELS
-# ================================================================
-
-class User(UserMixin, db.Model):
-    __tablename__ = 'users'
-    
-    # id = db.Column(db.Integer, primary_key=True)
-    # username = db.Column(db.String(80), unique=True, nullable=False)
-    # email = db.Column(db.String(120), unique=True)
-    # password_hash = db.Column(db.String(255), nullable=False)
-    # role = db.Column(db.String(20), nullable=False, default='moderator')
-    # created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    # is_active = db.Column(db.Boolean, default=True)
-
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=True, info={'unique_constraint_name': 'uq_users_email'})
-    password_hash = db.Column(db.String(255), nullable=False)
-    first_name = db.Column(db.String(50), nullable=True)
-    last_name = db.Column(db.String(50), nullable=True)
-    contact = db.Column(db.String(20), nullable=True)
-    role = db.Column(db.String(20), nullable=False, default='moderator')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    is_active = db.Column(db.Boolean, default=True)
-
-
-    def set_password(self, password):
-        """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
-
-    def check_password(self, password):
-        """Check if provided password matches hash"""
-        return check_password_hash(self.password_hash, password)
-
-    def is_admin(self):
-        """Check if user is admin"""
-        return self.role == 'admin'
-
-    def is_moderator(self):
-        """Check if user is moderator or admin"""
-        return self.role in ['admin', 'moderator']
-
-    def __repr__(self):
-        return f'<User {self.username}>'
-
-
-from datetime import datetime
-from flask import jsonify, request
-
-# Updated Alert Model
-class Alert(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    camera = db.Column(db.String(50))
-    location = db.Column(db.String(100))
-    time = db.Column(db.String(100))
-    message = db.Column(db.String(200))
-    severity = db.Column(db.String(20))
-    status = db.Column(db.String(20), default='New')  # New, Acknowledged, Resolved
-    is_true_detection = db.Column(db.Boolean, default=None)  # True, False, or None (unreviewed)
-    reviewed_by = db.Column(db.String(50))
-    reviewed_at = db.Column(db.DateTime)
-
-
-class CameraSetting(db.Model):
-    __tablename__ = 'camera_settings'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    source = db.Column(db.String(50), unique=True, nullable=False)
-    detections = db.Column(db.JSON, nullable=False)
-    object_threshold = db.Column(db.Float, nullable=False, default=0.5)
-    motion_threshold = db.Column(db.Integer, nullable=False, default=30)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-    def to_dict(self):
-        """Convert model to dictionary for JSON serialization"""
-        return {
-            'source': self.source,
-            'detections': self.detections,
-            'objectThreshold': self.object_threshold,
-            'motionThreshold': self.motion_threshold
-        }
-
-    def __repr__(self):
-        return f'<CameraSetting {self.source}>'
-
 # ================================================================
 # LOGIN MANAGER SETUP
 # ================================================================
@@ -172,13 +93,12 @@ def moderator_required(f):
 # UTILITY FUNCTIONS
 # ================================================================
 
-FRAME_SHAPE = (240, 320, 3)
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
 def load_camera_settings():
     """Loads camera settings from database."""
     try:
-        settings = CameraSetting.query.all()
+        settings = CameraSetting.query.order_by(CameraSetting.id).all()
         return [setting.to_dict() for setting in settings]
     except Exception as e:
         print(f"Error loading camera settings: {e}")
@@ -202,8 +122,10 @@ def migrate_json_to_db():
                         object_threshold=camera_data.get('objectThreshold', 0.5),
                         motion_threshold=camera_data.get('motionThreshold', 30)
                     )
+                    setting.apply_dict(camera_data)
                     db.session.add(setting)
             
+            bump_config_version()
             db.session.commit()
             print(f"Successfully migrated {len(data)} camera settings to database")
             os.rename(json_file, f"{json_file}.migrated")
@@ -224,22 +146,59 @@ def create_default_admin():
             db.session.commit()
             print("Default admin user created with username: admin, password: admin123")
 
-def gen_frames(shm_name):
+def gen_frames(shm_name, frame_shape, cam_id, overlay=True):
     try:
-        shm = shared_memory.SharedMemory(name=shm_name)
+        shm, frame_buffer = attach_shared_array(shm_name, np.uint8, frame_shape, track=False)
     except FileNotFoundError:
         print("Shared memory block not found. Is the backend running?")
         return
-    frame_buffer = np.ndarray(FRAME_SHAPE, dtype=np.uint8, buffer=shm.buf)
-    while True:
-        frame = frame_buffer.copy()
-        ret, jpeg = cv2.imencode('.jpg', frame)
-        if not ret:
-            continue
-        frame_bytes = jpeg.tobytes()
+    # The detectors' latest boxes are drawn on each encoded frame (detection_overlay.py)
+    overlay_reader = None
+    if overlay:
+        try:
+            overlay_reader = OverlayReader(cam_id)
+        except FileNotFoundError:
+            pass
+    web_metrics.add("ivss_mjpeg_clients", 1, cam=cam_id)
+    try:
+        while True:
+            frame = frame_buffer.copy()
+            if overlay_reader is not None:
+                overlay_reader.draw(frame)
+            ret, jpeg = cv2.imencode('.jpg', frame)
+            if not ret:
+                continue
+            frame_bytes = jpeg.tobytes()
+            web_metrics.add("ivss_mjpeg_bytes_total", len(frame_bytes), cam=cam_id)
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+    finally:
+        # Runs when the client disconnects and the generator is closed
+        web_metrics.add("ivss_mjpeg_clients", -1, cam=cam_id)
+        del frame_buffer
+        shm.close()
+        if overlay_reader is not None:
+            overlay_reader.close()
+
+def gen_playback(cam_dir, start_ts, speed=1.0):
+    """Stream recorded frames from start_ts onward, paced by their recorded timestamps"""
+    index = load_index(cam_dir)
+    if len(index) == 0:
+        return
+    pos, _ = find_frame(cam_dir, start_ts, index)
+    if pos is None:
+        pos = 0  # start_ts is before the recording; play from its first frame
+    previous_ts = None
+    for record in index[pos:]:
+        if previous_ts is not None and speed > 0:
+            time.sleep(min(max(record["ts"] - previous_ts, 0) / speed, 1.0))
+        previous_ts = record["ts"]
+        try:
+            frame_bytes = read_recorded_frame(cam_dir, record)
+        except FileNotFoundError:
+            continue  # segment removed by retention while streaming
         yield (b'--frame\r\n'
                b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-    shm.close()
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -264,6 +223,8 @@ def update_encodings(dataset_dir="dataset", encodings_file="encodings.pickle"):
     Processes all images in the dataset folder, applies augmentation,
     computes face encodings, and saves them in encodings_file.
     """
+    import face_recognition  # dlib is slow to load; only face registration needs it here
+
     image_paths = []
     for root, dirs, files in os.walk(dataset_dir):
         for file in files:
@@ -447,7 +408,144 @@ def settings():
 @login_required
 def video_feed(cam_id):
     shm_name = f"video_frame_shm_{cam_id}"
-    return Response(gen_frames(shm_name), mimetype='multipart/x-mixed-replace; boundary=frame')
+    frame_shape = camera_frame_shape(cameras_by_id(load_camera_settings()).get(cam_id))
+    overlay = request.args.get('overlay', '1') != '0'  # ?overlay=0 streams the raw frames
+    return Response(gen_frames(shm_name, frame_shape, cam_id, overlay),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/api/capture_stats')
+@login_required
+def api_capture_stats():
+    """Per-camera decode FPS, dropped frames and reconnect counts from the capture processes"""
+    stats = []
+    for cam_id in cameras_by_id(load_camera_settings()):
+        try:
+            shm, meta = attach_shared_array(frame_meta_name(cam_id), FRAME_META_DTYPE, track=False)
+        except FileNotFoundError:
+            stats.append({"cam_id": cam_id, "running": False})
+            continue
+        record = meta[0]
+        stats.append({
+            "cam_id": cam_id,
+            "running": True,
+            "connected": bool(record["connected"]),
+            "decode_fps": round(float(record["decode_fps"]), 2),
+            "frames_decoded": int(record["frames_decoded"]),
+            "frames_dropped": int(record["frames_dropped"]),
+            "reconnects": int(record["reconnects"]),
+            "health": HEALTH_NAMES[record["health"]],
+            "last_frame_age": round(time.time() - float(record["timestamp"]), 3) if record["seq"] else None
+        })
+        del meta, record
+        shm.close()
+    return jsonify({"status": "success", "cameras": stats})
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text format. Left without login so a scraper can read it; it holds no video or names."""
+    try:
+        shm, table = attach_metrics_table(track=False)
+        table = table.copy()
+        shm.close()
+    except FileNotFoundError:
+        table = np.zeros(len(SERIES), dtype=METRIC_DTYPE)  # pipeline not running
+    capture = []
+    for cam_id in cameras_by_id(load_camera_settings()):
+        try:
+            meta_shm, meta = attach_shared_array(frame_meta_name(cam_id), FRAME_META_DTYPE, track=False)
+        except FileNotFoundError:
+            continue
+        capture.append((cam_id, meta[0].copy()))
+        del meta
+        meta_shm.close()
+    body = render_metrics(table, capture, web_metrics.items())
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/scheduler_stats')
+@login_required
+def api_scheduler_stats():
+    """Achieved detector FPS and queueing delay per camera from the inference scheduler"""
+    try:
+        shm, table = attach_shared_array(SCHEDULER_SHM_NAME, SLOT_DTYPE, (SCHEDULER_CAPACITY,), track=False)
+    except FileNotFoundError:
+        return jsonify({"status": "error", "message": "Scheduler is not running"}), 404
+    table = table.copy()
+    shm.close()
+    slots = [{
+        "cam_id": int(slot["cam_id"]),
+        "detector": slot["detector"].decode(),
+        "priority": float(slot["priority"]),
+        "min_fps": float(slot["min_fps"]),
+        "max_fps": float(slot["max_fps"]),
+        "achieved_fps": round(float(slot["achieved_fps"]), 2),
+        "queue_delay_ms": round(float(slot["queue_delay_ms"]), 1),
+        "last_duration_ms": round(1000 * float(slot["last_duration"]), 1),
+        "runs": int(slot["runs"]),
+        "skipped": int(slot["skipped"]),
+        "skip_ratio": round(int(slot["skipped"]) / max(int(slot["skipped"]) + int(slot["runs"]), 1), 3),
+        "cpu_saved_s": round(float(slot["cpu_saved"]), 1)
+    } for slot in table if slot["detector"]]
+    return jsonify({"status": "success", "slots": slots})
+
+@app.route('/api/recordings/<int:cam_id>')
+@login_required
+def api_recordings(cam_id):
+    """List recorded segments for a camera"""
+    return jsonify({"status": "success", "segments": list_segments(camera_recording_dir(cam_id))})
+
+@app.route('/api/recordings/<int:cam_id>/frame')
+@login_required
+def api_recording_frame(cam_id):
+    """Return the recorded frame closest to (at or before) ?ts=<epoch seconds>"""
+    ts = request.args.get('ts', type=float, default=time.time())
+    cam_dir = camera_recording_dir(cam_id)
+    _, record = find_frame(cam_dir, ts)
+    if record is None:
+        return jsonify({"status": "error", "message": "No recording at or before that time"}), 404
+    response = Response(read_recorded_frame(cam_dir, record), mimetype='image/jpeg')
+    response.headers['X-Frame-Timestamp'] = f"{float(record['ts']):.3f}"
+    return response
+
+@app.route('/playback/<int:cam_id>')
+@login_required
+def playback(cam_id):
+    """MJPEG playback from ?ts=<epoch seconds> at ?speed= (0 = as fast as possible)"""
+    ts = request.args.get('ts', type=float, default=time.time() - 60)
+    speed = request.args.get('speed', type=float, default=1.0)
+    return Response(gen_playback(camera_recording_dir(cam_id), ts, speed),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/api/analytics/heatmap/<int:cam_id>.png')
+@login_required
+def api_motion_heatmap(cam_id):
+    """Motion heatmap as a transparent PNG sized to the camera frame, for overlaying on its feed"""
+    frame_shape = camera_frame_shape(cameras_by_id(load_camera_settings()).get(cam_id))
+    overlay = heatmap_overlay(load_heatmap(cam_id), (frame_shape[1], frame_shape[0]))
+    ok, png = cv2.imencode('.png', overlay)
+    if not ok:
+        return jsonify({"status": "error", "message": "Could not encode heatmap"}), 500
+    response = Response(png.tobytes(), mimetype='image/png')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/analytics/activity/<int:cam_id>')
+@login_required
+def api_motion_activity(cam_id):
+    """Per-minute motion activity for the last ?hours= (default 24)"""
+    hours = request.args.get('hours', type=float, default=24)
+    records = load_activity(cam_id, since=time.time() - hours * 3600)
+    return jsonify({"status": "success", "minutes": [{
+        "minute": int(r["minute"]),
+        "frames": int(r["frames"]),
+        "motion_frames": int(r["motion_frames"]),
+        "activity": round(float(r["activity"]), 5)
+    } for r in records]})
+
+@app.route('/clips/<path:filename>')
+@login_required
+def serve_clip(filename):
+    """Serve a pre/post-event alert clip"""
+    return send_from_directory(os.path.join(app.root_path, 'clips'), filename)
 
 # ================================================================
 # API ROUTES - DASHBOARD DATA
@@ -456,11 +554,17 @@ def video_feed(cam_id):
 @app.route('/toggle_system', methods=['POST'])
 @admin_required
 def toggle_system():
+    # The pipeline holds a single-instance lock, so check it instead of blindly starting another copy
+    pid = running_pipeline_pid()
     try:
-        subprocess.Popen(["python", "main.py"])
-        flash("System script started successfully.")
+        if pid:
+            os.kill(pid, signal.SIGTERM)
+            flash("System is stopping.")
+        else:
+            subprocess.Popen([sys.executable, "main.py"], cwd=app.root_path)
+            flash("System script started successfully.")
     except Exception as e:
-        flash(f"Failed to start system: {str(e)}", "danger")
+        flash(f"Failed to toggle system: {str(e)}", "danger")
     return redirect(url_for('dashboard'))
 @app.route('/')
 @login_required
@@ -495,7 +599,8 @@ def dashboard():
                            resolved_alerts=resolved_alerts,
                            total_users=total_users,
                            admin_count=admin_count,
-                           moderator_count=moderator_count)
+                           moderator_count=moderator_count,
+                           system_running=running_pipeline_pid() is not None)
 
 
 # Updated API Route with filtering
@@ -538,7 +643,9 @@ def api_alerts():
             "status": row.status,
             "is_true_detection": row.is_true_detection,
             "reviewed_by": row.reviewed_by,
-            "reviewed_at": row.reviewed_at.isoformat() if row.reviewed_at else None
+            "reviewed_at": row.reviewed_at.isoformat() if row.reviewed_at else None,
+            "clip_url": url_for('serve_clip', filename=os.path.basename(row.clip_path)) if row.clip_path else None,
+            "model_tier": row.model_tier
         })
     
     return jsonify(alerts_list)
@@ -635,18 +742,31 @@ def save_camera_settings():
         data = request.get_json()
         cameras = data.get("cameras", [])
         
-        CameraSetting.query.delete()
-        
+        # Update rows in place (keyed by source) so unchanged cameras keep their ids and
+        # position, letting the pipeline reconcile only the cameras that really changed
+        existing = {setting.source: setting for setting in CameraSetting.query.all()}
+        kept = set()
         for camera_data in cameras:
             if isinstance(camera_data, dict):
-                setting = CameraSetting(
-                    source=camera_data.get('source', ''),
-                    detections=camera_data.get('detections', ['motion', 'object', 'face']),
-                    object_threshold=camera_data.get('objectThreshold', 0.5),
-                    motion_threshold=camera_data.get('motionThreshold', 30)
-                )
-                db.session.add(setting)
+                source = camera_data.get('source', '')
+                setting = existing.get(source)
+                if setting is None:
+                    setting = CameraSetting(
+                        source=source,
+                        detections=camera_data.get('detections', ['motion', 'object', 'face']),
+                        object_threshold=camera_data.get('objectThreshold', 0.5),
+                        motion_threshold=camera_data.get('motionThreshold', 30)
+                    )
+                    db.session.add(setting)
+                    existing[source] = setting
+                setting.apply_dict(camera_data)
+                kept.add(source)
+        
+        for source, setting in existing.items():
+            if source not in kept:
+                db.session.delete(setting)
         
+        bump_config_version()
         db.session.commit()
         
         updated_cameras = load_camera_settings()
@@ -681,14 +801,10 @@ def update_single_camera_setting(source):
             setting = CameraSetting(source=source)
             db.session.add(setting)
         
-        if 'detections' in data:
-            setting.detections = data['detections']
-        if 'objectThreshold' in data:
-            setting.object_threshold = data['objectThreshold']
-        if 'motionThreshold' in data:
-            setting.motion_threshold = data['motionThreshold']
+        setting.apply_dict(data)
         
         setting.updated_at = datetime.utcnow()
+        bump_config_version()
         db.session.commit()
         
         return jsonify({"status": "success", "camera": setting.to_dict()})
@@ -705,6 +821,7 @@ def delete_camera_setting(source):
         setting = CameraSetting.query.filter_by(source=source).first()
         if setting:
             db.session.delete(setting)
+            bump_config_version()
             db.session.commit()
             return jsonify({"status": "success", "message": "Camera setting deleted"})
         else:
@@ -713,6 +830,52 @@ def delete_camera_setting(source):
         db.session.rollback()
         return jsonify({"status": "error", "message": str(e)}), 500
 
+# ================================================================
+# DIAGNOSTICS (ADMIN ONLY)
+# ================================================================
+
+def profile_targets(cameras):
+    """Worker names that can be profiled for the configured cameras"""
+    targets = []
+    for cam_id, cam in cameras_by_id(cameras).items():
+        roles = ["capture", "preprocess"] + [d for d in ("motion", "object", "face") if d in (cam.get("detections") or [])]
+        targets += [f"cam{cam_id}-{role}" for role in roles]
+    return targets + ["alerts", "scheduler"]
+
+@app.route('/diagnostics')
+@admin_required
+def diagnostics():
+    return render_template('diagnostics.html', targets=profile_targets(load_camera_settings()),
+                           max_seconds=MAX_SECONDS)
+
+@app.route('/api/diagnostics/profile', methods=['POST'])
+@admin_required
+def api_request_profile():
+    data = request.get_json() or {}
+    target = (data.get('target') or '').strip()
+    if not target:
+        return jsonify({'status': 'error', 'message': 'Choose a worker to profile'}), 400
+    try:
+        request_id = request_profile(target, data.get('seconds') or 10)
+    except FileNotFoundError:
+        return jsonify({'status': 'error', 'message': 'The pipeline is not running'}), 409
+    except (RuntimeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    return jsonify({'status': 'success', 'request_id': request_id})
+
+@app.route('/api/diagnostics/profiles')
+@admin_required
+def api_profiles():
+    """Requests in progress plus summaries of finished profiles"""
+    return jsonify({'status': 'success', 'requests': profile_requests(),
+                    'profiles': list_profiles(os.path.join(app.root_path, PROFILE_DIR))})
+
+@app.route('/diagnostics/profiles/<path:filename>')
+@admin_required
+def serve_profile(filename):
+    """Collapsed stacks or summary of one profile"""
+    return send_from_directory(os.path.join(app.root_path, PROFILE_DIR), filename, as_attachment=True)
+
 # ================================================================
 # USER MANAGEMENT ROUTES (ADMIN ONLY)
 # ================================================================
@@ -937,6 +1100,7 @@ def register():
 
 if __name__ == '__main__':
    # create_default_admin()
+    pin_web_process()
     with app.app_context():
         db.create_all()
     app.run(debug=True)
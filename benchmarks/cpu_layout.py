@@ -0,0 +1,134 @@
+"""
+Compare inference latency under the planned CPU layout with the OS defaults.
+
+    python -m benchmarks.cpu_layout --processes 20 --seconds 20 --output layout.json
+    python -m benchmarks.cpu_layout --model yolo11n.pt --slots 4
+
+Starts --processes workers at once, as a loaded pipeline does, each running
+inference back to back for --seconds, twice:
+  default  every process keeps the default OpenCV / OpenMP / BLAS pools
+  planned  each process is placed by cpu_layout.CpuLayout as an inference
+           worker (pinned to a core set, thread pools sized to it)
+The workload is YOLO predict on the letterboxed object view when
+ultralytics and the weights are available, otherwise a stand-in that uses
+the same thread pools: an OpenCV resize + blur of a 1080p frame and a BLAS
+matrix product. Reports per-run p50 / p95 / p99 latency, total runs per
+second and involuntary context switches per run for both layouts.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import time
+
+import numpy as np
+
+from benchmarks.stages import environment
+from cpu_layout import CpuLayout, apply_placement, available_cpus
+from inference_scheduler import default_budget
+from synthetic_scene import SyntheticScene
+
+LAYOUTS = ("default", "planned")
+
+
+def make_workload(model_path, seed):
+    """(name, run) where run() performs one inference."""
+    from frame_views import compute_view
+    from object_detection import object_view
+    frame = SyntheticScene(1920, 1080, objects=4, seed=seed).frames(1)[0]
+    spec = object_view(frame.shape)
+    if model_path and os.path.exists(model_path):
+        try:
+            from object_detection import load_object_model
+            model = load_object_model(model_path)
+            view = compute_view(spec, frame)
+            return "yolo", lambda: model.predict(view, imgsz=spec["size"], verbose=False, conf=0.5)
+        except ImportError:
+            pass
+    import cv2
+    matrix = np.random.default_rng(seed).random((384, 384), dtype=np.float32)
+
+    def run():
+        small = cv2.resize(frame, (spec["size"], spec["size"]))
+        cv2.GaussianBlur(small, (15, 15), 0)
+        matrix @ matrix
+    return "stand-in", run
+
+
+def worker(index, placement, model_path, start_at, seconds, results):
+    if placement is not None:
+        apply_placement(placement)
+    name, run = make_workload(model_path, index)
+    run()  # warm up outside the measured window
+    while time.time() < start_at:
+        time.sleep(0.001)
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    latencies = []
+    deadline = start_at + seconds
+    while time.time() < deadline:
+        started = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - started)
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    results.put((name, latencies, after.ru_nivcsw - before.ru_nivcsw))
+
+
+def run_layout(layout, args):
+    results = mp.Queue()
+    start_at = time.time() + args.startup
+    processes = []
+    for index in range(args.processes):
+        placement = layout.assign(f"bench{index}", "inference") if layout is not None else None
+        process = mp.Process(target=worker, args=(index, placement, args.model, start_at, args.seconds, results))
+        process.start()
+        processes.append(process)
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    latencies = np.concatenate([np.asarray(item[1]) for item in collected])
+    switches = sum(item[2] for item in collected)
+    return {
+        "workload": collected[0][0],
+        "runs": int(len(latencies)),
+        "runs_per_s": round(len(latencies) / args.seconds, 2),
+        "p50_ms": round(1000 * float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(1000 * float(np.percentile(latencies, 95)), 3),
+        "p99_ms": round(1000 * float(np.percentile(latencies, 99)), 3),
+        "involuntary_switches_per_run": round(switches / max(len(latencies), 1), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the planned CPU layout with the OS defaults.")
+    parser.add_argument("--processes", type=int, default=(os.cpu_count() or 1) + 4,
+                        help="Concurrent inference processes (default: one more than the cores, plus a few)")
+    parser.add_argument("--slots", type=int, default=default_budget(),
+                        help="Inference core sets of the planned layout (the scheduler budget by default)")
+    parser.add_argument("--seconds", type=float, default=15.0, help="Measured seconds per layout")
+    parser.add_argument("--startup", type=float, default=10.0, help="Seconds allowed for workers to load before timing")
+    parser.add_argument("--model", default="yolo11m.pt", help="YOLO weights; the stand-in workload runs without them")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    layout = CpuLayout(available_cpus(), args.slots)
+    print(f"[INFO] Planned layout: {layout.summary()}; {args.processes} processes")
+    report = {"environment": environment(), "processes": args.processes, "seconds": args.seconds,
+              "layout": layout.report(), "results": {}}
+    for name in LAYOUTS:
+        report["results"][name] = run_layout(layout if name == "planned" else None, args)
+        print(f"[INFO] {name}: {report['results'][name]}")
+    report["layout"] = layout.report()
+
+    print(f"\n{'layout':<10} {'runs/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'switches/run':>13}")
+    for name, result in report["results"].items():
+        print(f"{name:<10} {result['runs_per_s']:10.1f} {result['p50_ms']:10.2f} {result['p95_ms']:10.2f} "
+              f"{result['p99_ms']:10.2f} {result['involuntary_switches_per_run']:13.2f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"\n[INFO] Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Compare the MOG2 and block-difference motion engines on recorded clips.
+
+    python -m benchmarks.motion_engines clips/*.avi recordings/cam0/*.avi --width 160
+
+Every clip is decoded once and both engines see the same downscaled gray
+frames. Reports per-frame cost of each engine and how often the blockdiff
+decision (motion / no motion, using the default zone threshold) agrees with
+MOG2, plus the overlap of their foreground masks on frames where either
+engine saw motion.
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from frame_views import compute_view
+from motion_detection import MOTION_ENGINES, MOTION_VIEW, create_motion_detector
+from motion_zones import DEFAULT_ZONE_THRESHOLD
+
+
+def read_views(path, spec, limit):
+    cap = cv2.VideoCapture(path)
+    views = []
+    while len(views) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        views.append(compute_view(spec, frame))
+    cap.release()
+    return views
+
+
+def run_engine(engine, views, var_threshold):
+    detector = create_motion_detector(var_threshold, engine)
+    masks = []
+    start = time.perf_counter()
+    for view in views:
+        masks.append(detector.apply(view))
+    return masks, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark motion engines against each other.")
+    parser.add_argument("clips", nargs="+", help="Recorded video files")
+    parser.add_argument("--width", type=int, default=MOTION_VIEW["width"], help="Motion view width")
+    parser.add_argument("--var-threshold", type=int, default=30, help="motionThreshold of the camera")
+    parser.add_argument("--max-frames", type=int, default=3000, help="Frames per clip")
+    args = parser.parse_args()
+
+    spec = dict(MOTION_VIEW, width=args.width)
+    totals = dict.fromkeys(MOTION_ENGINES, 0.0)
+    frames = agree = both = only_mog2 = only_block = 0
+    ious = []
+
+    for path in args.clips:
+        views = read_views(path, spec, args.max_frames)
+        if not views:
+            print(f"[ERROR] Could not read {path}")
+            continue
+        results = {}
+        for engine in MOTION_ENGINES:
+            results[engine], seconds = run_engine(engine, views, args.var_threshold)
+            totals[engine] += seconds
+
+        pixels = views[0].size
+        for mog2, block in zip(results["mog2"], results["blockdiff"]):
+            a = np.count_nonzero(mog2) / pixels >= DEFAULT_ZONE_THRESHOLD
+            b = np.count_nonzero(block) / pixels >= DEFAULT_ZONE_THRESHOLD
+            agree += a == b
+            both += a and b
+            only_mog2 += a and not b
+            only_block += b and not a
+            if a or b:
+                union = np.count_nonzero((mog2 > 0) | (block > 0))
+                ious.append(np.count_nonzero((mog2 > 0) & (block > 0)) / max(union, 1))
+        frames += len(views)
+        print(f"[INFO] {path}: {len(views)} frames")
+
+    if not frames:
+        return
+    print(f"\nMotion engines on {frames} frames at width {args.width}")
+    for engine in MOTION_ENGINES:
+        print(f"  {engine:<10}: {1000 * totals[engine] / frames:.3f} ms/frame")
+    print(f"  speedup   : {totals['mog2'] / max(totals['blockdiff'], 1e-9):.1f}x")
+    print(f"  agreement : {100 * agree / frames:.1f}% of frames "
+          f"(both {both}, mog2 only {only_mog2}, blockdiff only {only_block})")
+    if ious:
+        print(f"  mask IoU  : {np.mean(ious):.2f} mean on frames with motion")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Soak test: run the real pipeline on synthetic cameras and find how many it sustains.
+
+    python -m benchmarks.soak --start 2 --step 2 --max-cameras 16 --output soak.json
+    python -m benchmarks.soak --mode pool --workers 4 --detections motion,object,face
+
+The harness starts the same Pipeline main.py runs (scheduler, alert process,
+clip recorders, process or pool mode) against a scratch SQLite database in
+a scratch working directory, with email and desktop notifications off. It
+runs the Pipeline in-process rather than launching main.py: main.py adds
+only argument parsing, the instance lock and the config-version polling
+loop around it, while the harness needs the Pipeline object itself to
+apply each step synchronously (no poll delay in the measured window), to
+find every worker's pid for CPU and memory sampling and to see worker exits
+(reported_exits). Because of the instance lock, do not soak on a machine
+whose pipeline is running. Each
+camera is a synthetic://WxH source (synthetic_scene.py): objects moving
+across a textured background, one with a drawn face, slow lighting swings,
+played in real time at --fps.
+
+Cameras are added --step at a time, the way the web app would: the settings
+are written to the database and reconciled into the running pipeline. After
+--warmup seconds (models load, background models settle) each step is
+measured for --duration seconds:
+  capture        decoded fps and frames dropped before publishing, per camera
+  motion         share of published frames the motion detector processed
+  alerts         alerts stored per type and capture-to-alert latency
+                 (ivss_alert_latency_seconds, p50 / p95 from its buckets)
+  processes      CPU (% of one core) and peak RSS per worker (psutil or /proc)
+A step passes when every SLO (--max-alert-latency, --max-drop-ratio,
+--min-fps-ratio, --max-cpu) holds and no worker exited. A step in which a
+configured detector stored no alert with a latency sample is INCONCLUSIVE
+rather than passed: its latency SLO was not measured (alerts fire when
+motion starts or an object appears, so a long enough --duration is needed
+to see new episodes). The ramp stops at the first failing step; the report
+gives the largest camera count whose step passed.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.stages import environment
+
+DETECTION_CHOICES = ("motion", "object", "face")
+LINKED_FILES = ("yolo11m.pt", "encodings.pickle")  # models the workers open relative to the working directory
+SAMPLE_INTERVAL = 1.0  # seconds between process samples
+
+
+# 🔹 Process statistics (Linux /proc; psutil when installed)
+
+def process_stats(pid):
+    """(cpu seconds, rss bytes) of pid, or None when it is gone or unreadable."""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            times = process.cpu_times()
+            return times.user + times.system, process.memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"), pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def pipeline_processes(pipeline):
+    """{process name: pid} of every running worker, plus this process (log listener, reconciliation)."""
+    pids = {"pipeline": os.getpid()}
+    for name, process in pipeline.processes.items():
+        pids[name] = process.pid
+    for cam in pipeline.cameras.values():
+        for role, process in cam.processes.items():
+            pids[f"cam{cam.cam_id}-{role}"] = process.pid
+    return pids
+
+
+# 🔹 Shared-memory snapshots
+
+def metrics_snapshot(table):
+    return table.copy()
+
+
+def capture_snapshot(cam_ids):
+    from shared_state import FRAME_META_DTYPE, attach_shared_array, frame_meta_name
+    records = {}
+    for cam_id in cam_ids:
+        try:
+            shm, meta = attach_shared_array(frame_meta_name(cam_id), FRAME_META_DTYPE)
+        except FileNotFoundError:
+            continue
+        records[cam_id] = meta[0].copy()
+        del meta
+        shm.close()
+    return records
+
+
+def histogram_quantile(buckets, quantile):
+    """Upper bound of the bucket holding the quantile; inf when it lies past the last bucket."""
+    from metrics import BUCKETS
+    total = int(buckets.sum())
+    if total == 0:
+        return None
+    rank = quantile * total
+    for bound, cumulative in zip(BUCKETS, np.cumsum(buckets)):
+        if cumulative >= rank:
+            return bound
+    return float("inf")
+
+
+def series_delta(before, after, name, **labels):
+    from metrics import SERIES_INDEX, series_key
+    index = SERIES_INDEX[series_key(name, **labels)]
+    return {field: after[index][field] - before[index][field] for field in ("value", "count", "sum", "buckets")}
+
+
+# 🔹 Camera settings
+
+def camera_settings(count, args):
+    width, height = (int(v) for v in args.resolution.lower().split("x"))
+    detections = [d.strip() for d in args.detections.split(",") if d.strip()]
+    return [{
+        "source": f"synthetic://{width}x{height}?fps={args.fps:g}&faces=1&lighting=0.3&seed={cam_id}",
+        "detections": detections,
+        "frameWidth": width,
+        "frameHeight": height,
+    } for cam_id in range(count)]
+
+
+def apply_settings(settings):
+    """Replace the CameraSetting rows with settings; returns them as the pipeline loads them."""
+    from models import CameraSetting, bump_config_version, db
+    CameraSetting.query.delete()
+    for cam_config in settings:
+        row = CameraSetting(source=cam_config["source"], detections=cam_config["detections"])
+        row.apply_dict(cam_config)
+        db.session.add(row)
+    bump_config_version()
+    db.session.commit()
+    return [row.to_dict() for row in CameraSetting.query.order_by(CameraSetting.id).all()]
+
+
+# 🔹 Measurement
+
+def measure_step(pipeline, metrics_table, cameras, args):
+    """Measure the running pipeline for args.duration seconds; returns the step's results."""
+    cam_ids = list(range(cameras))
+    exits_before = set(pipeline.reported_exits)
+    metrics_before = metrics_snapshot(metrics_table)
+    capture_before = capture_snapshot(cam_ids)
+    pids = pipeline_processes(pipeline)
+    cpu_before = {name: process_stats(pid) for name, pid in pids.items()}
+    peak_rss = {name: stats[1] for name, stats in cpu_before.items() if stats}
+
+    started = time.time()
+    while time.time() - started < args.duration:
+        time.sleep(SAMPLE_INTERVAL)
+        pipeline.check_processes()
+        for name, pid in pids.items():
+            stats = process_stats(pid)
+            if stats:
+                peak_rss[name] = max(peak_rss.get(name, 0), stats[1])
+    elapsed = time.time() - started
+
+    metrics_after = metrics_snapshot(metrics_table)
+    capture_after = capture_snapshot(cam_ids)
+    processes = {}
+    for name, pid in pids.items():
+        before, after = cpu_before.get(name), process_stats(pid)
+        if before and after:
+            processes[name] = {"cpu_pct": round(100 * (after[0] - before[0]) / elapsed, 1),
+                               "rss_mb": round(peak_rss.get(name, after[1]) / 2 ** 20, 1)}
+
+    capture = {}
+    for cam_id in cam_ids:
+        before, after = capture_before.get(cam_id), capture_after.get(cam_id)
+        if before is None or after is None:
+            capture[cam_id] = {"running": False}
+            continue
+        decoded = int(after["frames_decoded"] - before["frames_decoded"])
+        dropped = int(after["frames_dropped"] - before["frames_dropped"])
+        published = int(after["seq"] - before["seq"])
+        entry = {"decode_fps": round(decoded / elapsed, 2), "published": published,
+                 "drop_ratio": round(dropped / max(decoded, 1), 4)}
+        if "motion" in args.detections:
+            motion = series_delta(metrics_before, metrics_after, "ivss_detector_frames_total",
+                                  cam=cam_id, detector="motion")
+            entry["motion_miss_ratio"] = round(max(1 - motion["value"] / max(published, 1), 0.0), 4)
+        capture[cam_id] = entry
+
+    from metrics import ALERT_TYPES
+    alerts = {}
+    for alert_type in ALERT_TYPES:
+        count = series_delta(metrics_before, metrics_after, "ivss_alerts_total", type=alert_type)["value"]
+        latency = series_delta(metrics_before, metrics_after, "ivss_alert_latency_seconds", type=alert_type)
+        if not count and not latency["count"]:
+            continue
+        alerts[alert_type] = {
+            "stored": int(count),
+            "latency_samples": int(latency["count"]),
+            "latency_mean_s": round(latency["sum"] / latency["count"], 3) if latency["count"] else None,
+            "latency_p50_s": histogram_quantile(latency["buckets"], 0.50),
+            "latency_p95_s": histogram_quantile(latency["buckets"], 0.95),
+        }
+
+    return {
+        "cameras": cameras,
+        "seconds": round(elapsed, 1),
+        "capture": capture,
+        "alerts": alerts,
+        "processes": processes,
+        "cpu_pct_total": round(sum(p["cpu_pct"] for p in processes.values()), 1),
+        "worker_exits": len(pipeline.reported_exits - exits_before),
+    }
+
+
+def slo_violations(step, args):
+    """Human-readable reasons the step breaks an SLO; empty when it passes."""
+    violations = []
+    for cam_id, entry in step["capture"].items():
+        if not entry.get("running", True):
+            violations.append(f"camera {cam_id} not publishing")
+            continue
+        if entry["decode_fps"] < args.min_fps_ratio * args.fps:
+            violations.append(f"camera {cam_id} decodes {entry['decode_fps']} fps")
+        if entry["drop_ratio"] > args.max_drop_ratio:
+            violations.append(f"camera {cam_id} drops {entry['drop_ratio']:.1%} of frames")
+        if entry.get("motion_miss_ratio", 0) > args.max_drop_ratio:
+            violations.append(f"camera {cam_id} motion misses {entry['motion_miss_ratio']:.1%} of frames")
+    for alert_type, entry in step["alerts"].items():
+        if entry["latency_p95_s"] is not None and entry["latency_p95_s"] > args.max_alert_latency:
+            violations.append(f"{alert_type} alert p95 latency above {args.max_alert_latency}s")
+    cpu_budget = args.max_cpu * (os.cpu_count() or 1)
+    if step["cpu_pct_total"] > cpu_budget:
+        violations.append(f"CPU {step['cpu_pct_total']}% above {cpu_budget:.0f}%")
+    if step["worker_exits"]:
+        violations.append(f"{step['worker_exits']} worker(s) exited")
+    return violations
+
+
+def unmeasured_detectors(step, args):
+    """Configured detectors with no alert latency sample in the step, so their latency SLO went unchecked."""
+    detections = [d.strip() for d in args.detections.split(",") if d.strip()]
+    return [d for d in detections if not step["alerts"].get(d, {}).get("latency_samples")]
+
+
+def step_result(step):
+    if step["violations"]:
+        return "FAIL"
+    return "INCONCLUSIVE" if step["unmeasured"] else "PASS"
+
+
+def print_step(step):
+    fps = [c["decode_fps"] for c in step["capture"].values() if "decode_fps" in c]
+    drops = [c["drop_ratio"] for c in step["capture"].values() if "drop_ratio" in c]
+    latencies = ", ".join(f"{t} p95 {a['latency_p95_s']}s ({a['stored']})" for t, a in step["alerts"].items())
+    print(f"[INFO] {step['cameras']} cameras: {min(fps, default=0):.1f}-{max(fps, default=0):.1f} fps, "
+          f"max drop {max(drops, default=0):.1%}, CPU {step['cpu_pct_total']}%, "
+          f"alerts: {latencies or 'none'} -> {step['result']}")
+    for violation in step["violations"]:
+        print(f"[INFO]   {violation}")
+    if step["unmeasured"]:
+        print(f"[INFO]   no alert latency measured for {', '.join(step['unmeasured'])}")
+
+
+def prepare_workdir(args):
+    """Scratch working directory for evidence, clips and logs; models are linked in from the current one."""
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ivss_soak_")
+    os.makedirs(workdir, exist_ok=True)
+    for name in LINKED_FILES:
+        source, target = os.path.abspath(name), os.path.join(workdir, name)
+        if os.path.exists(source) and not os.path.exists(target):
+            os.symlink(source, target)
+    return os.path.abspath(workdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ramp synthetic cameras on the real pipeline until an SLO breaks.")
+    parser.add_argument("--mode", choices=("process", "pool"), default="process")
+    parser.add_argument("--workers", type=int, default=None, help="Detector workers in pool mode")
+    parser.add_argument("--no-scheduler", action="store_true", help="Run without the inference scheduler")
+    parser.add_argument("--detections", default="motion,object", help=f"Comma-separated subset of {DETECTION_CHOICES}")
+    parser.add_argument("--resolution", default="640x480", help="Camera resolution WxH")
+    parser.add_argument("--fps", type=float, default=15, help="Frames per second each synthetic camera produces")
+    parser.add_argument("--start", type=int, default=1, help="Cameras in the first step")
+    parser.add_argument("--step", type=int, default=1, help="Cameras added per step")
+    parser.add_argument("--max-cameras", type=int, default=16)
+    parser.add_argument("--warmup", type=float, default=20, help="Seconds after each step before measuring")
+    parser.add_argument("--duration", type=float, default=60, help="Measured seconds per step")
+    parser.add_argument("--max-alert-latency", type=float, default=2.5, help="SLO: p95 capture-to-alert seconds")
+    parser.add_argument("--max-drop-ratio", type=float, default=0.05, help="SLO: share of frames dropped or missed")
+    parser.add_argument("--min-fps-ratio", type=float, default=0.9, help="SLO: decoded fps as a share of --fps")
+    parser.add_argument("--max-cpu", type=float, default=90, help="SLO: total CPU %% per core of the machine")
+    parser.add_argument("--workdir", help="Working directory for evidence and logs (default: a new temp dir)")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory afterwards")
+    parser.add_argument("--debug", default="", help="Workers that log DEBUG, as main.py --debug")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    unknown = {d.strip() for d in args.detections.split(",") if d.strip()} - set(DETECTION_CHOICES)
+    if unknown:
+        parser.error(f"unknown detections: {', '.join(sorted(unknown))}")
+    output = os.path.abspath(args.output) if args.output else None
+
+    workdir = prepare_workdir(args)
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(workdir, 'soak.db')}"
+    os.environ.setdefault("SECRET_KEY", "soak")
+    os.environ["IVSS_NOTIFICATIONS"] = "0"  # read when alert_module is imported
+
+    from database import app_context
+    from metrics import attach_metrics_table
+    from models import db
+    from pipeline import Pipeline
+    from structured_log import start_log_service, stop_log_service
+    from worker_pool import default_pool_workers
+
+    report = {"environment": environment(), "settings": {k: v for k, v in vars(args).items() if k != "output"},
+              "steps": [], "supported_cameras": 0}
+    os.chdir(workdir)
+    print(f"[INFO] Soak working directory: {workdir}")
+    start_log_service(os.path.join(workdir, "logs"), debug=args.debug)
+    with app_context():
+        db.create_all()
+        pipeline = Pipeline(args.mode, args.workers or default_pool_workers(), scheduler=not args.no_scheduler)
+        metrics_shm, metrics_table = attach_metrics_table()
+        try:
+            cameras = args.start
+            while cameras <= args.max_cameras:
+                settings = apply_settings(camera_settings(cameras, args))
+                actions = pipeline.reconcile(settings)
+                print(f"[INFO] Step to {cameras} cameras: {len(actions)} actions; warming up {args.warmup:.0f}s")
+                time.sleep(args.warmup)
+                step = measure_step(pipeline, metrics_table, cameras, args)
+                step["violations"] = slo_violations(step, args)
+                step["unmeasured"] = unmeasured_detectors(step, args)
+                step["result"] = step_result(step)
+                step["passed"] = step["result"] == "PASS"
+                report["steps"].append(step)
+                print_step(step)
+                if step["result"] == "FAIL":
+                    break
+                if step["passed"]:
+                    report["supported_cameras"] = cameras
+                cameras += max(args.step, 1)
+        except KeyboardInterrupt:
+            print("[INFO] Interrupted; reporting the steps measured so far")
+        finally:
+            del metrics_table
+            metrics_shm.close()
+            pipeline.shutdown()
+            stop_log_service()
+
+    print(f"\n[INFO] Supported cameras: {report['supported_cameras']} "
+          f"({args.resolution} at {args.fps:g} fps, {args.detections}, {args.mode} mode)")
+    inconclusive = [step["cameras"] for step in report["steps"] if step["result"] == "INCONCLUSIVE"]
+    if inconclusive:
+        print(f"[INFO] Alert latency unmeasured at {', '.join(map(str, inconclusive))} cameras; "
+              f"those steps do not count as passed (try a longer --duration)")
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=1, default=str)
+        print(f"[INFO] Report written to {output}")
+    if not args.keep and not args.workdir:
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
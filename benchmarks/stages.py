@@ -0,0 +1,313 @@
+"""
+Time each pipeline stage in isolation, CPU-only, without a camera.
+
+    python -m benchmarks.stages --resolution 1280x720 --output results.json
+    python -m benchmarks.stages --clips clips/*.mp4 --stages motion,mjpeg_encode
+    python -m benchmarks.stages --compare base.json results.json
+
+Frames come from a deterministic synthetic scene (synthetic_scene.py) and,
+with --clips, from recorded footage as well. Stages:
+  shm_copy       publish a frame into shared memory and copy it back out
+  motion         one motion step per engine: background model + zone scores
+  yolo           YOLO predict on the letterboxed object view
+  face           face_recognition locate, encode and match on the face view
+  mjpeg_encode   cv2.imencode of a full frame, as the live view does
+  store_alert    one Alert insert + commit on a scratch SQLite database
+  analytics      the /analytics page and /api/alerts over --alerts stored alerts
+A stage whose dependency is missing (ultralytics, face_recognition, Flask
+extensions) is reported as skipped. Results are written as JSON with
+throughput and p50 / p99 latency per operation, the commit and the machine,
+so runs can be compared with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from synthetic_scene import SyntheticScene
+
+STAGES = ("shm_copy", "motion", "yolo", "face", "mjpeg_encode", "store_alert", "analytics")
+REGRESSION = 0.10  # --compare flags p50 or p99 more than 10% slower
+
+
+class SkipStage(Exception):
+    pass
+
+
+def measure(operation, inputs, iterations, warmup=3):
+    """Run operation(input) iterations times over cycled inputs; returns per-call seconds."""
+    for index in range(min(warmup, iterations)):
+        operation(inputs[index % len(inputs)])
+    latencies = np.empty(iterations)
+    for index in range(iterations):
+        item = inputs[index % len(inputs)]
+        start = time.perf_counter()
+        operation(item)
+        latencies[index] = time.perf_counter() - start
+    return latencies
+
+
+def stats(latencies, **extra):
+    return dict({
+        "iterations": int(len(latencies)),
+        "throughput_per_s": round(len(latencies) / max(float(latencies.sum()), 1e-12), 2),
+        "mean_ms": round(1000 * float(latencies.mean()), 4),
+        "p50_ms": round(1000 * float(np.percentile(latencies, 50)), 4),
+        "p99_ms": round(1000 * float(np.percentile(latencies, 99)), 4),
+    }, **extra)
+
+
+# 🔹 Stages. Each returns {operation name: stats}.
+
+def bench_shm_copy(frames, args):
+    from shared_state import create_shared_memory
+    shm = create_shared_memory("ivss_bench_frame", frames[0].nbytes)
+    try:
+        buffer = np.ndarray(frames[0].shape, dtype=np.uint8, buffer=shm.buf)
+        results = {
+            "shm_publish": stats(measure(lambda f: np.copyto(buffer, f), frames, args.iterations)),
+            "shm_read": stats(measure(lambda f: buffer.copy(), frames, args.iterations)),
+        }
+        del buffer
+        return results
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def bench_motion(frames, args):
+    from frame_views import compute_view
+    from motion_detection import MOTION_ENGINES, MOTION_VIEW, create_motion_detector
+    from motion_zones import MotionZones
+    views = [compute_view(MOTION_VIEW, frame) for frame in frames]
+    results = {}
+    for engine in MOTION_ENGINES:
+        subtractor = create_motion_detector(30, engine)
+        zones = MotionZones(None, views[0].shape)
+
+        def step(view):
+            mask = subtractor.apply(view)
+            zones.update(mask)
+            zones.activity(mask)
+
+        results[f"motion_{engine}"] = stats(measure(step, views, args.iterations), width=MOTION_VIEW["width"])
+    return results
+
+
+def bench_yolo(frames, args):
+    try:
+        from object_detection import OBJECT_MODEL, load_object_model, object_view
+        model = load_object_model(args.model or OBJECT_MODEL)
+    except ImportError as e:
+        raise SkipStage(f"ultralytics not available ({e})")
+    from frame_views import compute_view
+    spec = object_view(frames[0].shape)
+    size = spec["size"]
+    views = [compute_view(spec, frame) for frame in frames]
+    latencies = measure(lambda view: model.predict(view, imgsz=size, verbose=False, conf=0.5), views,
+                        max(args.iterations // 10, 5))
+    return {"yolo_predict": stats(latencies, model=args.model or OBJECT_MODEL, imgsz=size)}
+
+
+def bench_face(frames, args):
+    import face_recognition_module as faces
+    try:
+        faces.load_face_recognition()
+    except ImportError as e:
+        raise SkipStage(f"face_recognition not available ({e})")
+    from frame_views import compute_view
+    views = [compute_view(faces.FACE_VIEW, frame) for frame in frames]
+    height, width = views[0].shape[:2]
+    # A fixed face-sized box, so encoding is timed even though synthetic scenes contain no faces
+    box = [(height // 3, width // 2 + width // 10, height // 3 + width // 5, width // 2 - width // 10)]
+    rng = np.random.default_rng(0)
+    faces.known_encodings = list(rng.normal(0, 0.1, (args.known_faces, 128)))
+    faces.known_names = [f"person{i % 50}" for i in range(args.known_faces)]
+    probes = list(rng.normal(0, 0.1, (16, 128)))
+    iterations = max(args.iterations // 10, 5)
+    return {
+        "face_locate": stats(measure(faces.face_recognition.face_locations, views, iterations)),
+        "face_encode": stats(measure(lambda view: faces.face_recognition.face_encodings(view, box), views, iterations)),
+        "face_match": stats(measure(faces.match_face, probes, args.iterations), known_faces=args.known_faces),
+    }
+
+
+def bench_mjpeg_encode(frames, args):
+    sizes = []
+
+    def encode(frame):
+        ok, jpeg = cv2.imencode('.jpg', frame)
+        sizes.append(len(jpeg))
+
+    latencies = measure(encode, frames, args.iterations)
+    return {"mjpeg_encode": stats(latencies, mean_bytes=int(np.mean(sizes)))}
+
+
+def scratch_database(scratch):
+    """Point the models at a fresh SQLite file; must run before database / app are imported."""
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    try:
+        from database import app_context
+        from models import db
+    except ImportError as e:
+        raise SkipStage(f"Flask database extensions not available ({e})")
+    with app_context():
+        db.create_all()
+    return app_context
+
+
+def bench_store_alert(frames, args):
+    import logging
+    app_context = scratch_database(args.scratch)
+    from alert_module import store_alert
+    logging.getLogger("ivss").setLevel(logging.WARNING)  # store_alert logs every insert
+    with app_context():
+        latencies = measure(lambda i: store_alert(f"Camera {i % 4}", "Object Detection", "Object detected: person",
+                                                  "high"), list(range(64)), args.iterations)
+    return {"store_alert": stats(latencies)}
+
+
+def bench_analytics(frames, args):
+    scratch_database(args.scratch)
+    try:
+        import app as web
+    except ImportError as e:
+        raise SkipStage(f"web app dependencies not available ({e})")
+    from models import Alert, db
+    web.app.config["LOGIN_DISABLED"] = True
+    with web.app.app_context():
+        existing = Alert.query.count()
+        rng = np.random.default_rng(0)
+        now = time.time()
+        db.session.bulk_save_objects([Alert(
+            camera=f"Camera {int(rng.integers(0, 8))}",
+            location=("Motion Detection", "Object Detection", "Face Recognition")[i % 3],
+            time=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now - rng.uniform(0, 14 * 86400))),
+            message="Object detected: person", severity=("medium", "high", "Critical")[i % 3], status="New",
+        ) for i in range(max(args.alerts - existing, 0))])
+        db.session.commit()
+    client = web.app.test_client()
+    iterations = max(args.iterations // 10, 5)
+    return {
+        "analytics_page": stats(measure(lambda _: client.get('/analytics'), [None], iterations), alerts=args.alerts),
+        "alerts_api": stats(measure(lambda _: client.get('/api/alerts'), [None], iterations), alerts=args.alerts),
+    }
+
+
+# 🔹 Inputs, environment and output
+
+def parse_resolution(text):
+    width, height = (int(v) for v in text.lower().split("x"))
+    return width, height
+
+
+def load_frames(args):
+    width, height = parse_resolution(args.resolution)
+    frames = SyntheticScene(width, height, objects=4, seed=args.seed).frames(args.frames)
+    for path in args.clips:
+        cap = cv2.VideoCapture(path)
+        count = 0
+        while count < args.frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(cv2.resize(frame, (width, height)) if frame.shape[:2] != (height, width) else frame)
+            count += 1
+        cap.release()
+        print(f"[INFO] {path}: {count} frames")
+    return frames
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": platform.machine(),
+        "processor": platform.processor() or None,
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "cv2_threads": cv2.getNumThreads(),
+    }
+
+
+def compare(base_path, new_path):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'operation':<18} {'p50 base':>10} {'p50 new':>10} {'p99 base':>10} {'p99 new':>10}")
+    regressions = 0
+    for name, result in new["results"].items():
+        old = base["results"].get(name)
+        if not old:
+            continue
+        flag = ""
+        if result["p50_ms"] > old["p50_ms"] * (1 + REGRESSION) or result["p99_ms"] > old["p99_ms"] * (1 + REGRESSION):
+            flag = "  slower"
+            regressions += 1
+        print(f"{name:<18} {old['p50_ms']:10.3f} {result['p50_ms']:10.3f} "
+              f"{old['p99_ms']:10.3f} {result['p99_ms']:10.3f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages in isolation.")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {', '.join(STAGES)}")
+    parser.add_argument("--resolution", default="1280x720", help="Camera resolution WxH")
+    parser.add_argument("--frames", type=int, default=30, help="Synthetic frames (and frames per clip)")
+    parser.add_argument("--clips", nargs="*", default=[], help="Recorded clips added to the synthetic frames")
+    parser.add_argument("--iterations", type=int, default=200, help="Timed calls per operation (model stages run a tenth)")
+    parser.add_argument("--model", help="YOLO weights for the yolo stage")
+    parser.add_argument("--known-faces", type=int, default=200, help="Known encodings for face matching")
+    parser.add_argument("--alerts", type=int, default=5000, help="Stored alerts for the analytics stage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    frames = load_frames(args)
+    report = {"environment": environment(), "resolution": args.resolution, "frames": len(frames),
+              "results": {}, "skipped": {}}
+    with tempfile.TemporaryDirectory() as scratch:
+        args.scratch = scratch
+        for stage in stages:
+            try:
+                report["results"].update(globals()[f"bench_{stage}"](frames, args))
+            except SkipStage as e:
+                report["skipped"][stage] = str(e)
+                print(f"[INFO] {stage}: skipped, {e}")
+
+    print(f"\n{'operation':<18} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for name, result in report["results"].items():
+        print(f"{name:<18} {result['throughput_per_s']:10.1f} {result['p50_ms']:10.3f} {result['p99_ms']:10.3f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"\n[INFO] Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
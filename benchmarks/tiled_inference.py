@@ -0,0 +1,117 @@
+"""
+Compare full-view, motion-tiled and full-frame high-resolution YOLO inference.
+
+    python -m benchmarks.tiled_inference clips/*.mp4 --max-frames 300 --small 48
+
+Clips are read at their native resolution. For every frame three modes run:
+  full     the letterboxed 640 view the live detector uses
+  tiled    the same view plus native-resolution motion tiles (objectMode "tiled")
+  highres  the whole frame at imgsz = its longest side, the expensive baseline
+High-res detections serve as the reference: recall is the share of them
+(same label, IoU >= --iou) that a mode also found, reported separately for
+small objects (longest side below --small pixels). Per-frame cost is
+reported for each mode.
+"""
+import argparse
+import time
+
+import cv2
+
+from frame_views import compute_view, letterbox_params, unletterbox_box
+from object_detection import OBJECT_MODEL, load_object_model, object_view
+from tiled_inference import TiledInference, result_detections
+
+MODES = ("full", "tiled", "highres")
+
+
+def box_iou(a, b):
+    inter = max(min(a[2], b[2]) - max(a[0], b[0]), 0) * max(min(a[3], b[3]) - max(a[1], b[1]), 0)
+    area_a = max(a[2] - a[0], 1) * max(a[3] - a[1], 1)
+    area_b = max(b[2] - b[0], 1) * max(b[3] - b[1], 1)
+    return inter / (area_a + area_b - inter)
+
+
+def matched(reference, detections, iou):
+    return any(d["label"] == reference["label"] and box_iou(d["bbox"], reference["bbox"]) >= iou for d in detections)
+
+
+def highres_size(frame_shape):
+    return (max(frame_shape[:2]) + 31) // 32 * 32
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark motion-tiled against full-frame inference.")
+    parser.add_argument("clips", nargs="+", help="Video files at camera resolution")
+    parser.add_argument("--model", default=OBJECT_MODEL, help="YOLO weights")
+    parser.add_argument("--conf", type=float, default=0.5, help="objectThreshold")
+    parser.add_argument("--max-frames", type=int, default=300, help="Frames per clip")
+    parser.add_argument("--small", type=int, default=48, help="Longest box side (pixels) counted as small")
+    parser.add_argument("--iou", type=float, default=0.3, help="IoU needed to match a reference box")
+    args = parser.parse_args()
+
+    model = load_object_model(args.model)
+    seconds = dict.fromkeys(MODES, 0.0)
+    found = {mode: [0, 0] for mode in MODES}  # [all, small] reference boxes found
+    reference_all = reference_small = frames = tiles = 0
+
+    for path in args.clips:
+        cap = cv2.VideoCapture(path)
+        tiler = None
+        count = 0
+        while count < args.max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if tiler is None:
+                spec = object_view(frame.shape)
+                size = spec["size"]
+                tiler = TiledInference(frame.shape, size)
+                params = letterbox_params(frame.shape, size)
+            view = compute_view(spec, frame)
+            to_frame = lambda xyxy: unletterbox_box(xyxy, params)
+            detections = {}
+
+            start = time.perf_counter()
+            detections["full"] = [d for r in model.predict(view, imgsz=size, verbose=False, conf=args.conf)
+                                  for d in result_detections(model, r, to_frame)]
+            seconds["full"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            tiler.observe(frame)
+            detections["tiled"] = tiler.detect(model, view, frame, params, args.conf)
+            seconds["tiled"] += time.perf_counter() - start
+            tiles += tiler.last_tiles
+
+            start = time.perf_counter()
+            detections["highres"] = [d for r in model.predict(frame, imgsz=highres_size(frame.shape), verbose=False,
+                                                               conf=args.conf)
+                                     for d in result_detections(model, r, lambda xyxy: tuple(int(v) for v in xyxy))]
+            seconds["highres"] += time.perf_counter() - start
+
+            for reference in detections["highres"]:
+                x1, y1, x2, y2 = reference["bbox"]
+                small = max(x2 - x1, y2 - y1) < args.small
+                reference_all += 1
+                reference_small += small
+                for mode in MODES:
+                    if matched(reference, detections[mode], args.iou):
+                        found[mode][0] += 1
+                        found[mode][1] += small
+            count += 1
+        cap.release()
+        frames += count
+        print(f"[INFO] {path}: {count} frames")
+
+    if not frames:
+        return
+    print(f"\nObject inference on {frames} frames, {reference_all} reference boxes "
+          f"({reference_small} smaller than {args.small}px), {tiles / frames:.1f} tiles/frame")
+    for mode in MODES:
+        recall = 100 * found[mode][0] / max(reference_all, 1)
+        recall_small = 100 * found[mode][1] / max(reference_small, 1)
+        print(f"  {mode:<8}: {1000 * seconds[mode] / frames:7.1f} ms/frame, "
+              f"recall {recall:5.1f}% all, {recall_small:5.1f}% small")
+
+
+if __name__ == "__main__":
+    main()
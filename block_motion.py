@@ -0,0 +1,66 @@
+import numpy as np
+
+# 🔹 Block-difference motion engine
+#
+# A low-power alternative to MOG2. Each gray frame is reduced to a grid of
+# BLOCK x BLOCK averages, and every block keeps a running mean and a running
+# noise variance. A block is moving when it differs from its mean by more
+# than k standard deviations of its own noise (plus a small floor), so
+# sensor noise in dark or textured areas does not need a global threshold.
+# apply() returns a full-size 0/255 mask like MOG2's, so motion scores, zones
+# and heatmaps work unchanged.
+
+BLOCK = 8
+HISTORY = 50          # frames, same adaptation horizon as the MOG2 path
+MIN_DELTA = 3.0       # gray levels a block must change by regardless of its noise
+INITIAL_VARIANCE = 4.0
+
+
+class BlockDiffSubtractor:
+    """Drop-in for cv2.BackgroundSubtractorMOG2.apply() using block averages."""
+
+    def __init__(self, varThreshold=16, history=HISTORY, block=BLOCK):
+        self.set_var_threshold(varThreshold)
+        self.alpha = 1.0 / history
+        self.block = block
+        self.history = history
+        self.mean = None
+        self.var = None
+        self.moving_frames = None
+
+    def set_var_threshold(self, varThreshold):
+        # MOG2's varThreshold is a squared distance in standard deviations; keep that meaning
+        self.k = float(np.sqrt(varThreshold or 16))
+
+    def _blocks(self, gray):
+        height, width = gray.shape[:2]
+        rows, cols = height // self.block, width // self.block
+        grid = gray[:rows * self.block, :cols * self.block].reshape(rows, self.block, cols, self.block)
+        return grid.mean(axis=(1, 3), dtype=np.float32)
+
+    def apply(self, gray):
+        blocks = self._blocks(gray)
+        if self.mean is None or self.mean.shape != blocks.shape:
+            self.mean = blocks.copy()
+            self.var = np.full_like(blocks, INITIAL_VARIANCE)
+            self.moving_frames = np.zeros(blocks.shape, dtype=np.int32)
+            return np.zeros(gray.shape[:2], dtype=np.uint8)
+
+        diff = blocks - self.mean
+        moving = np.abs(diff) > self.k * np.sqrt(self.var) + MIN_DELTA
+
+        # Only still blocks update the background, so objects leave no ghost behind them.
+        # A block that stays "moving" for a whole history is a scene change and is absorbed.
+        still = ~moving
+        self.mean[still] += self.alpha * diff[still]
+        self.var[still] += self.alpha * (diff[still] ** 2 - self.var[still])
+        self.moving_frames = np.where(moving, self.moving_frames + 1, 0)
+        absorbed = self.moving_frames >= self.history
+        self.mean[absorbed] = blocks[absorbed]
+        self.moving_frames[absorbed] = 0
+
+        mask = np.zeros(gray.shape[:2], dtype=np.uint8)
+        rows, cols = blocks.shape
+        expanded = np.repeat(np.repeat(moving, self.block, axis=0), self.block, axis=1)
+        mask[:rows * self.block, :cols * self.block] = expanded * np.uint8(255)
+        return mask
@@ -0,0 +1,111 @@
+import cv2
+import numpy as np
+import time
+
+from structured_log import get_logger
+
+log = get_logger("change_gate")
+
+# 🔹 Near-duplicate frame skipping
+#
+# Static scenes produce views that differ only by sensor noise, and running
+# YOLO or face recognition on them returns the same result again. A
+# ChangeGate sits in front of a detector: each new view is reduced to a
+# SIGNATURE_WIDTH-wide gray thumbnail (area averaging removes most of the
+# noise) and compared with the thumbnail of the last view that was actually
+# inferred. If fewer than `threshold` of the cells changed by more than
+# CELL_DELTA gray levels, the detector reuses its previous result. A run is
+# forced every `refresh` seconds regardless, so slow changes (light, a parked
+# car) are never missed for long. Comparing with the last *inferred* view
+# rather than the previous frame means slow drift cannot accumulate unseen.
+
+SIGNATURE_WIDTH = 64
+CELL_DELTA = 8.0                 # gray levels a thumbnail cell must change by to count
+DEFAULT_CHANGE_THRESHOLD = 0.002  # fraction of cells (~8 cells of 64x64); 0 disables skipping
+DEFAULT_REFRESH_SECONDS = 5.0
+REPORT_INTERVAL = 30             # seconds between skip reports
+
+
+def reuse_settings(cam_config):
+    """Frame-skipping parameters of one camera."""
+    cam_config = cam_config or {}
+    threshold = cam_config.get("skipChangeThreshold")
+    refresh = cam_config.get("skipRefreshSeconds")
+    return {
+        "threshold": float(DEFAULT_CHANGE_THRESHOLD if threshold is None else threshold),
+        "refresh": float(refresh or DEFAULT_REFRESH_SECONDS),
+    }
+
+
+def view_signature(view):
+    """Small float32 gray thumbnail of a BGR, RGB or gray view."""
+    height, width = view.shape[:2]
+    size = (SIGNATURE_WIDTH, max(int(round(height * SIGNATURE_WIDTH / width)), 1))
+    small = cv2.resize(view, size, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        # Channel order does not matter for change detection, so RGB views need no conversion
+        small = small.mean(axis=2, dtype=np.float32)
+    return small.astype(np.float32)
+
+
+class ChangeGate:
+    """Decides per view whether a detector must run, and tracks how much work skipping saved."""
+
+    def __init__(self, cam_id, detector, settings=None):
+        self.label = f"Camera {cam_id} {detector}"
+        self.configure(settings or reuse_settings(None))
+        self.reference = None
+        self.last_run = 0.0
+        self.cost = 0.0  # average CPU seconds per inference
+        self.checked = self.skipped = 0
+        self.cpu_saved = 0.0
+        self.last_report = time.time()
+        self.report_checked = self.report_skipped = 0
+
+    def configure(self, settings):
+        self.threshold = settings["threshold"]
+        self.refresh = settings["refresh"]
+
+    def invalidate(self):
+        """Force the next view through the detector."""
+        self.reference = None
+
+    def changed_fraction(self, view):
+        if self.reference is None:
+            return 1.0
+        signature = view_signature(view)
+        if signature.shape != self.reference.shape:
+            return 1.0
+        return np.count_nonzero(np.abs(signature - self.reference) > CELL_DELTA) / signature.size
+
+    def unchanged(self, view):
+        """True when the previous result can be reused for view instead of running the detector."""
+        self.checked += 1
+        self.report_checked += 1
+        skip = bool(self.threshold > 0 and time.time() - self.last_run < self.refresh
+                    and self.changed_fraction(view) < self.threshold)
+        if skip:
+            self.skipped += 1
+            self.report_skipped += 1
+            self.cpu_saved += self.cost
+        self._maybe_report()
+        return skip
+
+    def inferred(self, view, cpu_seconds):
+        """Record that the detector ran on view, taking cpu_seconds of CPU time."""
+        self.reference = view_signature(view)
+        self.last_run = time.time()
+        self.cost = cpu_seconds if not self.cost else 0.8 * self.cost + 0.2 * cpu_seconds
+
+    def skip_ratio(self):
+        return self.skipped / self.checked if self.checked else 0.0
+
+    def _maybe_report(self):
+        now = time.time()
+        if now - self.last_report < REPORT_INTERVAL or not self.report_checked:
+            return
+        ratio = self.report_skipped / self.report_checked
+        log.info("%s: reused results for %.0f%% of %s views, %.1fs CPU saved in total",
+                 self.label, 100 * ratio, self.report_checked, self.cpu_saved)
+        self.last_report = now
+        self.report_checked = self.report_skipped = 0
@@ -0,0 +1,180 @@
+import cv2
+import numpy as np
+from collections import deque
+from queue import Empty
+import os
+import time
+
+from mjpeg_avi import MjpegAviWriter
+from shared_state import open_shared_memory
+from structured_log import get_logger
+
+log = get_logger("clips")
+
+# 🔹 Default clip settings (overridable per camera from CameraSetting)
+CLIP_FOLDER = "clips"
+DEFAULT_PRE_SECONDS = 5
+DEFAULT_POST_SECONDS = 5
+DEFAULT_CLIP_FPS = 10
+DEFAULT_JPEG_QUALITY = 70
+DEFAULT_BUFFER_MB = 16
+STATS_INTERVAL = 30  # seconds between ring/encode reports
+
+
+class FrameRing:
+    """
+    Bounded ring of (timestamp, jpeg_bytes) kept in the recorder process.
+    Frames are evicted once they are older than max_seconds or the ring
+    holds more than max_bytes of compressed data.
+    """
+
+    def __init__(self, max_seconds, max_bytes):
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.frames = deque()
+        self.total_bytes = 0
+        self.evicted = 0
+
+    def append(self, timestamp, jpeg_bytes):
+        self.frames.append((timestamp, jpeg_bytes))
+        self.total_bytes += len(jpeg_bytes)
+        self._evict(timestamp)
+
+    def _evict(self, now):
+        while self.frames and (
+            self.total_bytes > self.max_bytes or now - self.frames[0][0] > self.max_seconds
+        ):
+            _, old = self.frames.popleft()
+            self.total_bytes -= len(old)
+            self.evicted += 1
+
+    def between(self, start, end):
+        return [(ts, data) for ts, data in self.frames if start <= ts <= end]
+
+    def duration(self):
+        if len(self.frames) < 2:
+            return 0.0
+        return self.frames[-1][0] - self.frames[0][0]
+
+
+def clip_settings(cam_config):
+    cam_config = cam_config or {}
+    return {
+        "pre_seconds": float(cam_config.get("clipPreSeconds") or DEFAULT_PRE_SECONDS),
+        "post_seconds": float(cam_config.get("clipPostSeconds") or DEFAULT_POST_SECONDS),
+        "fps": float(cam_config.get("clipFps") or DEFAULT_CLIP_FPS),
+        "quality": int(cam_config.get("clipQuality") or DEFAULT_JPEG_QUALITY),
+        "buffer_mb": float(cam_config.get("clipBufferMb", DEFAULT_BUFFER_MB) or 0),
+    }
+
+
+def request_clip(clip_queue, cam_id, detection_type, event_time=None):
+    """
+    Ask the camera's clip recorder for a clip around event_time.
+    Returns the path the clip will be written to, so it can be stored on the
+    Alert row straight away; the file appears once the post-event window ends.
+    """
+    if clip_queue is None:
+        return None
+    event_time = event_time or time.time()
+    stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(event_time))
+    clip_path = os.path.join(CLIP_FOLDER, f"clip_cam{cam_id}_{detection_type}_{stamp}.avi")
+    clip_queue.put({"event_time": event_time, "clip_path": clip_path})
+    return clip_path
+
+
+def clip_recorder_process(shm_name, shape, clip_queue, cam_id, cam_config=None):
+    """
+    Samples frames from shared memory at the clip frame rate, keeps them as
+    JPEG bytes in a FrameRing and writes pre/post-event clips on request.
+    Clips are muxed from the stored JPEGs; nothing is decoded or re-read from
+    the camera.
+    """
+    settings = clip_settings(cam_config)
+    if settings["buffer_mb"] <= 0:
+        log.info("Clip recording disabled for Camera %s.", cam_id, extra={"cam_id": cam_id})
+        return
+
+    shm = open_shared_memory(shm_name)
+    frame_buffer = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+    ring = FrameRing(
+        max_seconds=settings["pre_seconds"] + settings["post_seconds"] + 1,
+        max_bytes=int(settings["buffer_mb"] * 1024 * 1024),
+    )
+    encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), settings["quality"]]
+    interval = 1.0 / settings["fps"]
+    pending = []
+
+    encode_time = 0.0
+    encoded_frames = 0
+    clips_written = 0
+    last_report = time.time()
+
+    log.info("Clip recorder started for Camera %s: %.0fs pre / %.0fs post, %.0f fps, %.0f MB ring", cam_id,
+             settings["pre_seconds"], settings["post_seconds"], settings["fps"], settings["buffer_mb"],
+             extra={"cam_id": cam_id})
+
+    try:
+        next_tick = time.time()
+        while True:
+            now = time.time()
+            if now < next_tick:
+                time.sleep(next_tick - now)
+                now = time.time()
+            next_tick += interval
+            if next_tick < now:
+                next_tick = now + interval
+
+            frame = frame_buffer.copy()
+            start = time.perf_counter()
+            ret, jpeg = cv2.imencode(".jpg", frame, encode_params)
+            encode_time += time.perf_counter() - start
+            if ret:
+                ring.append(now, jpeg.tobytes())
+                encoded_frames += 1
+
+            while True:
+                try:
+                    pending.append(clip_queue.get_nowait())
+                except Empty:
+                    break
+
+            for request in [r for r in pending if now >= r["event_time"] + settings["post_seconds"]]:
+                pending.remove(request)
+                if write_clip(ring, request, settings, shape):
+                    clips_written += 1
+
+            if now - last_report >= STATS_INTERVAL:
+                avg_ms = 1000 * encode_time / max(encoded_frames, 1)
+                cpu_pct = 100 * encode_time / (now - last_report)
+                log.info("Camera %s clip ring: %s frames, %.1f MB, %.1fs buffered, "
+                         "encode %.1f ms/frame (%.1f%% CPU), %s clips written", cam_id, len(ring.frames),
+                         ring.total_bytes / 1024 / 1024, ring.duration(), avg_ms, cpu_pct, clips_written,
+                         extra={"cam_id": cam_id})
+                encode_time = 0.0
+                encoded_frames = 0
+                last_report = now
+    finally:
+        log.info("Clip recorder shutting down for Camera %s...", cam_id, extra={"cam_id": cam_id})
+        shm.close()
+
+
+# 🔹 Write Clip From Ring
+def write_clip(ring, request, settings, shape):
+    event_time = request["event_time"]
+    frames = ring.between(event_time - settings["pre_seconds"],
+                          event_time + settings["post_seconds"])
+    if not frames:
+        log.error("No buffered frames for clip %s.", request["clip_path"])
+        return False
+
+    with MjpegAviWriter(request["clip_path"], shape[1], shape[0], settings["fps"]) as writer:
+        for _, jpeg_bytes in frames:
+            writer.write_frame(jpeg_bytes)
+    log.info("Clip saved: %s (%s frames)", request["clip_path"], len(frames))
+    return True
+
+
+if __name__ == "__main__":
+    print("Run main.py to start the system.")
@@ -0,0 +1,164 @@
+import json
+import os
+import sys
+
+import cv2
+
+# 🔹 CPU layout for the process fleet
+#
+# Every pipeline process used to start with the default thread pools of
+# OpenCV, OpenMP / PyTorch and BLAS, each sized to the whole machine, so 20
+# processes on 16 cores asked for hundreds of threads and YOLO latency
+# swung with the context switching. main.py now plans the layout once and
+# each worker applies its placement before it imports anything heavy:
+#   inference  object / face processes and pool workers. The shared cores
+#              are split into one core set per concurrent inference run
+#              (the scheduler's budget, or the pool size), and each worker
+#              is pinned to the least used set with as many threads as the
+#              set has cores.
+#   capture    decoding; CAPTURE_THREADS threads.
+#   light      preprocess, motion, recorders, links, alerts, scheduler;
+#              single-threaded, free to run on any shared core.
+# With isolation (--cpu-layout isolate, at least four cores) the web app
+# gets the first core and capture the next eighth of the machine to
+# themselves, and nothing else runs there. The layout in use, including
+# every running process's placement, is written to LAYOUT_FILE.
+
+LAYOUT_MODES = ("off", "on", "isolate")
+LAYOUT_FILE = os.path.join("diagnostics", "cpu_layout.json")
+THREAD_VARIABLES = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+INFERENCE_ROLES = ("object", "face", "pool")
+CAPTURE_THREADS = 2
+LIGHT_THREADS = 1
+ISOLATE_MIN_CPUS = 4
+
+
+def available_cpus():
+    """
+    Every CPU this process may run on. A narrower affinity inherited from the
+    parent (the web app pins itself when isolated) is widened again first.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return list(range(os.cpu_count() or 1))
+    try:
+        os.sched_setaffinity(0, range(os.cpu_count() or 1))
+    except OSError:
+        pass
+    return sorted(os.sched_getaffinity(0))
+
+
+def process_kind(role):
+    """inference / capture / light for a process role ("object", "pool3", "capture", ...)."""
+    role = role.rstrip("0123456789")
+    if role in INFERENCE_ROLES:
+        return "inference"
+    return "capture" if role == "capture" else "light"
+
+
+def split_cores(cpus, parts):
+    """cpus split into parts contiguous sets whose sizes differ by at most one."""
+    size, extra = divmod(len(cpus), parts)
+    sets, start = [], 0
+    for index in range(parts):
+        end = start + size + (index < extra)
+        sets.append(cpus[start:end])
+        start = end
+    return sets
+
+
+class CpuLayout:
+    """Core sets and thread counts per kind of process, and which process got which."""
+
+    def __init__(self, cpus, inference_slots, isolate=False):
+        self.cpus = sorted(cpus)
+        self.isolate = isolate and len(self.cpus) >= ISOLATE_MIN_CPUS
+        if self.isolate:
+            capture = max(len(self.cpus) // 8, 1)
+            self.web = self.cpus[:1]
+            self.capture = self.cpus[1:1 + capture]
+            self.shared = self.cpus[1 + capture:]
+        else:
+            self.web = self.capture = self.shared = self.cpus
+        self.slots = split_cores(self.shared, max(min(inference_slots, len(self.shared)), 1))
+        self.placements = {}  # process name -> {"kind", "cores", "threads", "slot"}
+
+    def assign(self, name, kind):
+        """Placement (cores, threads) for a new process; inference processes take the least used core set."""
+        slot = None
+        if kind == "inference":
+            used = [0] * len(self.slots)
+            for placement in self.placements.values():
+                if placement["slot"] is not None:
+                    used[placement["slot"]] += 1
+            slot = used.index(min(used))
+            cores, threads = self.slots[slot], len(self.slots[slot])
+        elif kind == "capture":
+            cores, threads = self.capture, min(CAPTURE_THREADS, len(self.capture))
+        else:
+            cores, threads = self.shared, LIGHT_THREADS
+        self.placements[name] = {"kind": kind, "cores": cores, "threads": threads, "slot": slot}
+        return cores, threads
+
+    def release(self, name):
+        self.placements.pop(name, None)
+
+    def report(self):
+        return {
+            "cpus": self.cpus,
+            "isolate": self.isolate,
+            "web": self.web,
+            "capture": self.capture,
+            "shared": self.shared,
+            "inference_slots": self.slots,
+            "processes": dict(sorted(self.placements.items())),
+        }
+
+    def summary(self):
+        slots = ", ".join(f"{len(cores)}" for cores in self.slots)
+        text = f"{len(self.cpus)} CPUs, {len(self.slots)} inference core sets ({slots} cores each)"
+        if self.isolate:
+            text += f"; web on {self.web}, capture on {self.capture}"
+        return text
+
+    def write_report(self, path=LAYOUT_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=1)
+
+
+def plan_layout(mode, inference_slots):
+    """The CpuLayout for a --cpu-layout mode, or None for "off"."""
+    if mode == "off":
+        return None
+    return CpuLayout(available_cpus(), inference_slots, isolate=mode == "isolate")
+
+
+def apply_placement(placement):
+    """Pin this process and size its library thread pools. Call before models are loaded."""
+    cores, threads = placement
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError:
+            pass
+    # Read by OpenMP (PyTorch) and BLAS libraries that are imported later
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(threads)
+    cv2.setNumThreads(threads)
+    try:
+        # numpy's BLAS was loaded before the fork; resize its pool where threadpoolctl is installed
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+
+def pin_web_process():
+    """Keep the web app on its own core when IVSS_CPU_LAYOUT=isolate."""
+    if os.getenv("IVSS_CPU_LAYOUT") != "isolate" or not hasattr(os, "sched_setaffinity"):
+        return
+    layout = CpuLayout(available_cpus(), 1, isolate=True)
+    if layout.isolate:
+        os.sched_setaffinity(0, layout.web)
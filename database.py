@@ -0,0 +1,45 @@
+import os
+
+from models import db
+
+# 🔹 Database configuration and sessions outside the web app
+#
+# Pipeline processes (config polling, alerts, offline analysis) only need
+# db.session. app_context() gives them one through a bare Flask app that
+# carries nothing but the database settings, so they never import app.py
+# with its routes, login manager and face recognition. .env is read on first
+# use rather than at import, so processes that never touch the database
+# (capture, detectors) do not read it at all.
+
+
+def database_config():
+    from dotenv import load_dotenv
+    load_dotenv()  # Load variables from .env
+    return {
+        'SQLALCHEMY_DATABASE_URI': os.getenv("SQLALCHEMY_DATABASE_URI"),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': os.getenv("SQLALCHEMY_TRACK_MODIFICATIONS"),
+    }
+
+
+def init_db(app):
+    """Configure app for the IVSS database and bind the shared db handle to it."""
+    app.config.update(database_config())
+    db.init_app(app)
+
+
+_db_app = None
+
+
+def db_app():
+    """The bare database-only Flask app for this process, created on first use."""
+    global _db_app
+    if _db_app is None:
+        from flask import Flask
+        _db_app = Flask("ivss_db")
+        init_db(_db_app)
+    return _db_app
+
+
+def app_context():
+    """App context giving access to db.session and Model.query: `with app_context(): ...`"""
+    return db_app().app_context()
@@ -0,0 +1,127 @@
+import time
+
+import cv2
+import numpy as np
+
+from detection_ring import DETECTION_DTYPE
+from shared_state import attach_shared_array, create_shared_array
+
+# 🔹 Detection overlay on the live stream
+#
+# Boxes used to be drawn only on the evidence copies the object and face
+# detectors save to disk, so the live MJPEG stream showed raw frames. Each
+# of those detectors now also publishes the detections of its latest run,
+# empty or not, to its section of the camera's overlay slot
+# (ivss_overlay_{cam}, created by the pipeline with the frame buffer), and
+# the web app draws them on every frame it encodes, with no extra inference:
+#   - one writer per section; its version is odd while the section is being
+#     written, and a reader that sees it change copies again rather than
+#     drawing a torn set;
+#   - a section whose run is older than OVERLAY_TTL is not drawn, so the
+#     boxes of a detector that stopped or fell behind disappear;
+#   - results reused for an unchanged view (change_gate.py) are published
+#     with that view's time, so boxes stay up while the scene is still;
+#   - remote detectors (frame_transport.py) publish through their link,
+#     which only hears about runs that found something; their boxes clear
+#     by expiry.
+
+OVERLAY_DETECTORS = ("object", "face")
+OVERLAY_BOXES = 32   # per detector; more are not drawn
+OVERLAY_TTL = 2.0    # seconds after its frame's capture that a run's boxes are drawn
+OVERLAY_COLORS = {"object": (0, 255, 0), "face": (0, 200, 255)}
+SECTION_DTYPE = np.dtype([
+    ("version", "<u8"),        # incremented before and after every write
+    ("frame_time", "<f8"),     # capture time of the frame the run was made on
+    ("count", "<u4"),
+    ("boxes", DETECTION_DTYPE, (OVERLAY_BOXES,)),
+])
+
+
+def overlay_name(cam_id):
+    return f"ivss_overlay_{cam_id}"
+
+
+def create_detection_overlay(cam_id):
+    """Create (or recreate) a camera's empty overlay slot. Returns its SharedMemory handle."""
+    shm, _ = create_shared_array(overlay_name(cam_id), SECTION_DTYPE, (len(OVERLAY_DETECTORS),))
+    return shm
+
+
+class OverlayWriter:
+    """
+    A detector's section of the overlay slot. Does nothing for detectors
+    without boxes (motion) or where there is no slot (detector nodes).
+    """
+
+    def __init__(self, cam_id, detector):
+        self.shm = None
+        if detector not in OVERLAY_DETECTORS:
+            return
+        try:
+            self.shm, sections = attach_shared_array(overlay_name(cam_id), SECTION_DTYPE, (len(OVERLAY_DETECTORS),))
+        except FileNotFoundError:
+            return
+        index = OVERLAY_DETECTORS.index(detector)
+        self.section = sections[index:index + 1]
+
+    def publish(self, records, frame_time):
+        """Replace the section with the detections of one run; records may be None or empty."""
+        if self.shm is None:
+            return
+        count = 0 if records is None else min(len(records), OVERLAY_BOXES)
+        self.section["version"] += 1
+        self.section["frame_time"] = frame_time or 0.0
+        self.section["count"] = count
+        if count:
+            self.section["boxes"][0, :count] = records[:count]
+        self.section["version"] += 1
+
+    def close(self):
+        if self.shm is not None:
+            del self.section
+            self.shm.close()
+
+
+class OverlayReader:
+    """The web app's view of one camera's overlay slot. Raises FileNotFoundError when the camera is not running."""
+
+    def __init__(self, cam_id):
+        self.shm, self.sections = attach_shared_array(overlay_name(cam_id), SECTION_DTYPE,
+                                                      (len(OVERLAY_DETECTORS),), track=False)
+
+    def read(self, index, attempts=3):
+        """A consistent copy of one section, or None when it kept changing while being copied."""
+        for _ in range(attempts):
+            version = int(self.sections["version"][index])
+            if version % 2:
+                continue
+            section = self.sections[index:index + 1].copy()[0]
+            if int(self.sections["version"][index]) == version:
+                return section
+        return None
+
+    def current(self, now=None):
+        """(detector, boxes) for every detector whose latest run is recent enough to draw."""
+        now = time.time() if now is None else now
+        for index, detector in enumerate(OVERLAY_DETECTORS):
+            section = self.read(index)
+            if section is None or now - section["frame_time"] > OVERLAY_TTL:
+                continue
+            yield detector, section["boxes"][:section["count"]]
+
+    def draw(self, frame, now=None):
+        """Draw the current boxes and labels onto frame in place."""
+        for detector, boxes in self.current(now):
+            color = OVERLAY_COLORS[detector]
+            for box in boxes:
+                x1, y1, x2, y2 = (int(v) for v in box["bbox"])
+                label = box["label"].decode(errors="replace")
+                if detector == "object":
+                    label = f"{label} {box['confidence']:.2f}"
+                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+                cv2.putText(frame, label, (x1, max(y1 - 6, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+        return frame
+
+    def close(self):
+        del self.sections
+        self.shm.close()
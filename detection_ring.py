@@ -0,0 +1,121 @@
+import numpy as np
+
+from shared_state import create_shared_memory, open_shared_memory
+
+# 🔹 Detection results in shared-memory rings
+#
+# Detectors used to send every result to the alert process as a pickled dict
+# on a multiprocessing queue: one put per frame, numpy scalars inside, and
+# queues that grew without bound while the alert process was busy, only for
+# most entries to be flushed unread. Now each (camera, detector) pair writes
+# fixed-size DETECTION_DTYPE records into its own ring in shared memory
+# (ivss_detections_{cam}_{detector}), created by the pipeline next to the
+# camera's view buffers:
+#   - one producer (the detector, in its own process or a pool worker) only
+#     advances head; one consumer (the alert process) only advances tail, so
+#     neither needs a lock;
+#   - the producer never waits: when the consumer falls more than CAPACITY
+#     records behind, the oldest unread records are overwritten (latest wins)
+#     and the consumer counts them in the header's dropped counter
+#     (ivss_detections_dropped_total on /metrics);
+#   - a record the producer overwrote while the consumer was copying it is
+#     detected by re-reading head afterwards and counted as dropped.
+
+CAPACITY = 256  # records per ring
+
+DETECTION_TYPES = ("motion", "object", "face")
+DETECTION_DTYPE = np.dtype([
+    ("cam_id", "<u2"),
+    ("type", "u1"),           # index into DETECTION_TYPES
+    ("reused", "u1"),         # 1 when an unchanged view was answered with the previous result
+    ("tier", "u1"),           # object model quality tier (quality_ladder.py); 0 otherwise
+    ("seq", "<u8"),           # seq of the frame the detection was made on
+    ("frame_time", "<f8"),    # grab time of that frame
+    ("class_id", "<i4"),      # YOLO class index, known-face index for faces; -1 for motion and unknown faces
+    ("confidence", "<f4"),    # YOLO confidence; motion score for motion
+    ("bbox", "<i4", (4,)),    # x1, y1, x2, y2 in frame coordinates
+    ("label", "S32"),         # class name, face name or triggered motion zones
+    ("image", "S96"),         # evidence image path, empty when none was saved
+])
+HEADER_DTYPE = np.dtype([
+    ("head", "<u8"),          # records written, by the producer
+    ("tail", "<u8"),          # records consumed, by the consumer
+    ("dropped", "<u8"),       # records overwritten before they were read, by the consumer
+])
+
+
+def detection_ring_name(cam_id, detector):
+    return f"ivss_detections_{cam_id}_{detector}"
+
+
+def create_detection_ring(cam_id, detector, capacity=CAPACITY):
+    """Create (or recreate) the empty ring of one camera's detector. Returns its SharedMemory handle."""
+    shm = create_shared_memory(detection_ring_name(cam_id, detector),
+                               HEADER_DTYPE.itemsize + capacity * DETECTION_DTYPE.itemsize)
+    shm.buf[:HEADER_DTYPE.itemsize] = bytes(HEADER_DTYPE.itemsize)
+    return shm
+
+
+def detection_record(cam_id, detection_type, frame_time, seq=0, label="", bbox=(0, 0, 0, 0), confidence=0.0,
+                     class_id=-1, image=None, reused=False, tier=0):
+    record = np.zeros((), dtype=DETECTION_DTYPE)
+    record["cam_id"] = cam_id
+    record["type"] = DETECTION_TYPES.index(detection_type)
+    record["reused"] = reused
+    record["tier"] = tier
+    record["seq"] = seq
+    record["frame_time"] = frame_time or 0.0
+    record["class_id"] = class_id
+    record["confidence"] = confidence
+    record["bbox"] = bbox
+    record["label"] = str(label).encode()[:32]
+    record["image"] = (image or "").encode()[:96]
+    return record
+
+
+class DetectionRing:
+    """One end of a detection ring: write() for the detector, read() for the alert process."""
+
+    def __init__(self, name):
+        self.name = name
+        self.shm = open_shared_memory(name)
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        self.capacity = (self.shm.size - HEADER_DTYPE.itemsize) // DETECTION_DTYPE.itemsize
+        self.records = np.ndarray((self.capacity,), dtype=DETECTION_DTYPE, buffer=self.shm.buf,
+                                  offset=HEADER_DTYPE.itemsize)
+
+    def write(self, records):
+        """Append one record or an array of them. Never blocks; unread records are overwritten when full."""
+        records = np.atleast_1d(records)
+        # Records of a batch larger than the ring are counted as written, so the consumer sees them dropped
+        head = int(self.header["head"]) + max(len(records) - self.capacity, 0)
+        for record in records[-self.capacity:]:
+            self.records[head % self.capacity] = record
+            head += 1
+            self.header["head"] = head  # after the record, so the consumer never sees it half-written
+
+    def read(self):
+        """All records written since the last read, oldest first."""
+        head = int(self.header["head"])
+        tail = int(self.header["tail"])
+        if head == tail:
+            return self.records[:0]
+        dropped = max(head - tail - self.capacity, 0)
+        tail += dropped
+        records = self.records[np.arange(tail, head) % self.capacity]
+        # Records the producer reached again while they were copied may be torn
+        overwritten = min(max(int(self.header["head"]) - self.capacity - tail, 0), len(records))
+        self.header["tail"] = head
+        if dropped or overwritten:
+            self.header["dropped"] += dropped + overwritten
+        return records[overwritten:]
+
+    def backlog(self):
+        return int(self.header["head"]) - int(self.header["tail"])
+
+    def dropped(self):
+        return int(self.header["dropped"])
+
+    def close(self):
+        del self.header, self.records
+        self.shm.close()
@@ -123,84 +123,206 @@
 
 import os
 import cv2
-import face_recognition
 import pickle
 import numpy as np
 import time
-from multiprocessing import shared_memory
 
-# Load known face encodings
-encodings_file = "encodings.pickle"
-if os.path.exists(encodings_file):
-    with open(encodings_file, "rb") as f:
-        data = pickle.load(f)
-    known_encodings = data["encodings"]
-    known_names = data["names"]
-else:
-    known_encodings = []
-    known_names = []
+from frame_views import ViewReader, compute_view
+from change_gate import ChangeGate, reuse_settings
+from detection_ring import DetectionRing, detection_record
+from detection_overlay import OverlayWriter
+from inference_scheduler import SchedulerClient
+from metrics import detector_series
+from shared_state import apply_config_updates, open_shared_memory
+from startup_report import StartupReport
+from structured_log import get_logger
+
+log = get_logger("face")
 
-def face_recognition_process(shm_name, shape, output_queue, cam_id):
-    shared_mem = shared_memory.SharedMemory(name=shm_name)
-    frame_buffer = np.ndarray(shape, dtype=np.uint8, buffer=shared_mem.buf)
+FACE_VIEW = {"name": "face", "mode": "rgb", "scale": 0.5}
 
-    print(f"[INFO] Face recognition started for Camera {cam_id}...")
+# face_recognition (dlib) and the known encodings are loaded on first use, so
+# importing this module (as the pipeline does to start face processes) is cheap
+encodings_file = "encodings.pickle"
+face_recognition = None
+known_encodings = None
+known_names = None
+
+def load_face_recognition():
+    """Import face_recognition and load the known face encodings once per process."""
+    global face_recognition, known_encodings, known_names
+    if face_recognition is None:
+        import face_recognition as module
+        face_recognition = module
+    if known_encodings is None:
+        if os.path.exists(encodings_file):
+            with open(encodings_file, "rb") as f:
+                data = pickle.load(f)
+            known_encodings = data["encodings"]
+            known_names = data["names"]
+        else:
+            known_encodings = []
+            known_names = []
+
+def match_face(encoding):
+    matches = face_recognition.compare_faces(known_encodings, encoding, tolerance=0.5)
+    name = "Unknown"
+
+    if True in matches:
+        matched_idxs = [i for (i, b) in enumerate(matches) if b]
+        counts = {}
+        for i in matched_idxs:
+            recognized_name = known_names[i]
+            counts[recognized_name] = counts.get(recognized_name, 0) + 1
+        name = max(counts, key=counts.get)
+    return name
+
+def face_identity(name):
+    """Index of a known name in the encodings file, -1 for unknown faces or when it was not loaded here."""
+    return known_names.index(name) if known_names and name in known_names else -1
+
+def recognize_faces_in_view(rgb_view, frame_shape):
+    """
+    Locate, encode and match faces on a reduced RGB view.
+    Returns a list of (name, (left, top, right, bottom)) in full-frame coordinates.
+    """
+    load_face_recognition()
+    boxes = face_recognition.face_locations(rgb_view)
+    encodings = face_recognition.face_encodings(rgb_view, boxes)
+
+    faces = []
+    scale_x, scale_y = frame_shape[1] / rgb_view.shape[1], frame_shape[0] / rgb_view.shape[0]
+    for encoding, (top, right, bottom, left) in zip(encodings, boxes):
+        name = match_face(encoding)
+        # Scale box back to original size
+        faces.append((name, (int(left * scale_x), int(top * scale_y),
+                             int(right * scale_x), int(bottom * scale_y))))
+    return faces
+
+def recognize_faces(frame):
+    """Same as recognize_faces_in_view, computing the face view from a BGR frame."""
+    return recognize_faces_in_view(compute_view(FACE_VIEW, frame), frame.shape)
+
+class FaceDetector:
+    """
+    Per-camera face recognition state. step() handles at most one new view and
+    never blocks on the scheduler, so a pool worker can interleave cameras.
+    Views that barely changed since the last run reuse its faces (see change_gate.py).
+    """
+
+    def __init__(self, shm_name, shape, ring_name, cam_id, sched=None, reuse=None):
+        self.cam_id = cam_id
+        self.shape = shape
+        self.output = DetectionRing(ring_name)
+        self.overlay = OverlayWriter(cam_id, "face")
+        self.shared_mem = open_shared_memory(shm_name)
+        self.frame_buffer = np.ndarray(shape, dtype=np.uint8, buffer=self.shared_mem.buf)
+        self.view_reader = ViewReader(cam_id, FACE_VIEW, shape)
+        self.scheduler = SchedulerClient(*sched) if sched else None
+        self.pending = None  # view waiting for a scheduler grant
+        self.pending_time = 0.0  # its capture timestamp
+        self.gate = ChangeGate(cam_id, "face", reuse)
+        self.metrics = detector_series(cam_id, "face")
+        self.last_result = None  # faces of the last run, reused for unchanged views
+
+    def step(self):
+        """Process one new view. Returns False when there was nothing to do (or no grant yet)."""
+        if self.pending is None:
+            latest = self.view_reader.read()
+            if latest is None:
+                return False
+            self.metrics["frames"].inc()
+            if self.gate.unchanged(latest[0]):
+                self.reuse_result(latest[1])
+                return True
+            self.pending, self.pending_time = latest
+
+        if self.scheduler is not None:
+            if not self.scheduler.try_turn():
+                return False
+            newer = self.view_reader.read()
+            if newer is not None:
+                self.metrics["frames"].inc()
+                self.pending, self.pending_time = newer
+
+        rgb_view, self.pending = self.pending, None
+        cpu_start = time.process_time()
+        started = time.perf_counter()
+        try:
+            faces = recognize_faces_in_view(rgb_view, self.shape)
+        finally:
+            if self.scheduler is not None:
+                self.scheduler.finish()
+        self.metrics["inference"].observe(time.perf_counter() - started)
+        self.gate.inferred(rgb_view, time.process_time() - cpu_start)
+        self.last_result = None
+        if not faces:
+            self.overlay.publish(None, self.pending_time)
+            return True
+
+        # Boxes are drawn on the full-resolution frame used as evidence
+        frame = self.frame_buffer.copy()
+        for name, (left, top, right, bottom) in faces:
+            # Draw box and label
+            cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+            cv2.putText(frame, name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+        with self.metrics["evidence"].time():
+            image_path = save_face_frame(frame, self.cam_id, name)
+        self.last_result = np.stack([
+            detection_record(self.cam_id, "face", self.pending_time, self.view_reader.last_seq, label=name, bbox=box,
+                             class_id=face_identity(name), image=image_path)
+            for name, box in faces])
+        self.output.write(self.last_result)
+        self.overlay.publish(self.last_result, self.pending_time)
+        return True
+
+    def reuse_result(self, timestamp):
+        """Answer an unchanged view with the last faces; no image is saved again."""
+        self.metrics["skipped"].inc()
+        records = None
+        if self.last_result is not None:
+            records = self.last_result.copy()
+            records["frame_time"], records["seq"], records["reused"] = timestamp, self.view_reader.last_seq, 1
+            self.output.write(records)
+        self.overlay.publish(records, timestamp)
+        if self.scheduler is not None:
+            self.scheduler.report_reuse(self.gate)
+
+    def reconfigure(self, cam_config):
+        """Only the skip settings are per camera; scheduling limits live in the scheduler table."""
+        self.gate.configure(reuse_settings(cam_config))
+
+    def close(self):
+        del self.frame_buffer
+        self.view_reader.close()
+        self.output.close()
+        self.overlay.close()
+        if self.scheduler is not None:
+            self.scheduler.close()
+        self.shared_mem.close()
+
+def face_recognition_process(shm_name, shape, ring_name, cam_id, sched=None, control_queue=None, reuse=None):
+    startup = StartupReport("face", cam_id)
+    with startup.measure("model_load"):
+        load_face_recognition()
+    detector = FaceDetector(shm_name, shape, ring_name, cam_id, sched, reuse)
+    log.info("Face recognition started for Camera %s...", cam_id)
 
     try:
         while True:
-            frame = frame_buffer.copy()
-            if frame is None or frame.size == 0:
-                continue
-
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            small_frame = cv2.resize(rgb_frame, (shape[1] // 2, shape[0] // 2))
-
-            boxes = face_recognition.face_locations(small_frame)
-            encodings = face_recognition.face_encodings(small_frame, boxes)
-
-            detected_faces = []
-            for encoding, (top, right, bottom, left) in zip(encodings, boxes):
-                matches = face_recognition.compare_faces(known_encodings, encoding, tolerance=0.5)
-                name = "Unknown"
-
-                if True in matches:
-                    matched_idxs = [i for (i, b) in enumerate(matches) if b]
-                    counts = {}
-                    for i in matched_idxs:
-                        recognized_name = known_names[i]
-                        counts[recognized_name] = counts.get(recognized_name, 0) + 1
-                    name = max(counts, key=counts.get)
-
-                # Scale box back to original size
-                scale_x, scale_y = shape[1] / (shape[1] // 2), shape[0] / (shape[0] // 2)
-                left = int(left * scale_x)
-                top = int(top * scale_y)
-                right = int(right * scale_x)
-                bottom = int(bottom * scale_y)
-
-                # Draw box and label
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                cv2.putText(frame, name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-                detected_faces.append({
-                    "cam_id": cam_id,
-                    "name": name,
-                    "bbox": (left, top, right, bottom),
-                    "detection_type": "face"
-                })
-
-            if detected_faces:
-                image_path = save_face_frame(frame, cam_id, name)
-                for face in detected_faces:
-                    face["image_path"] = image_path
-                output_queue.put(detected_faces)
+            apply_config_updates(control_queue, detector)
+            if detector.step():
+                startup.finish()
+            else:
+                time.sleep(0.005)
 
     except Exception as e:
-        print(f"[ERROR] Face recognition process encountered an issue: {str(e)}")
+        log.exception("Face recognition process encountered an issue: %s", e)
 
     finally:
-        print(f"[INFO] Face recognition shutting down for Camera {cam_id}...")
-        shared_mem.close()
+        log.info("Face recognition shutting down for Camera %s...", cam_id)
+        detector.close()
 
 # 🔹 Save Face Detection Image
 def save_face_frame(frame, cam_id, label):
@@ -211,8 +333,8 @@ def save_face_frame(frame, cam_id, label):
 
     cv2.imwrite(image_path, frame)
     if os.path.exists(image_path) and os.path.getsize(image_path) > 0:
-        print(f"[INFO] Face detection frame saved: {image_path}")
+        log.info("Face detection frame saved: %s", image_path, extra={"key": f"face-saved:{cam_id}", "cam_id": cam_id})
         return image_path
     else:
-        print(f"[ERROR] Failed to save face image for Camera {cam_id}.")
+        log.error("Failed to save face image for Camera %s.", cam_id, extra={"key": f"face-save-failed:{cam_id}"})
         return None
@@ -0,0 +1,163 @@
+import os
+import time
+import zlib
+
+import cv2
+import numpy as np
+
+from structured_log import get_logger
+
+# 🔹 Frame health: blank, frozen, blurred and moved feeds
+#
+# The preprocess process checks every new camera frame once, on a small gray
+# thumbnail, before it computes the detector views:
+#   blank    almost no contrast: black, white or a covered lens
+#   frozen   byte-identical to the previous frame (a stuck decoder), or no
+#            new frame at all
+#   blurred  edge energy (variance of the Laplacian) far below what this
+#            camera normally shows: defocused, fogged or smeared lens
+#   moved    the scene no longer correlates with the slowly updated
+#            reference view: camera turned, knocked or covered by something
+# The camera's state changes only after a condition persisted for
+# PERSIST_SECONDS (FROZEN_SECONDS for frozen, since a very still scene can
+# repeat a frame now and then), so single odd frames do not flap it. It is
+# published in the camera's FRAME_META record (ivss_capture_health on
+# /metrics), and while it is blank or frozen, frames that still are get
+# skipped by the detectors (ViewReader) without a second look: a dead
+# camera costs nothing downstream. Motion is exempt from blank, since a
+# dark scene at night can read as featureless until something lights it.
+# Blurred and moved frames are still analysed. Going unhealthy sends one "camera unhealthy" alert with a
+# snapshot, at most one per ALERT_INTERVAL per camera.
+
+OK, BLANK, FROZEN, BLURRED, MOVED = range(5)
+HEALTH_NAMES = ("ok", "blank", "frozen", "blurred", "moved")
+SKIP_STATES = (BLANK, FROZEN)  # camera states whose frames detectors do not process
+
+THUMBNAIL_WIDTH = 160
+BLANK_STD = 4.0            # gray levels; below this the frame is featureless
+BLUR_RATIO = 0.2           # blurred below this share of the camera's usual edge energy
+BLUR_FLOOR = 2.0           # blurred below this edge energy whatever the baseline
+SCENE_CORRELATION = 0.4    # moved when correlation with the reference falls below this
+REFERENCE_RATE = 0.01      # per-frame weight of the new frame in the reference view and edge baseline
+PERSIST_SECONDS = 3.0
+FROZEN_SECONDS = 10.0
+ALERT_INTERVAL = 300.0     # seconds between unhealthy alerts per camera
+SNAPSHOT_DIR = "health_alerts"
+
+log = get_logger("health")
+
+
+class FrameHealth:
+    """Per-camera health state, updated once per new frame by the preprocess process."""
+
+    def __init__(self, cam_id, health_queue=None):
+        self.cam_id = cam_id
+        self.health_queue = health_queue
+        self.last_digest = None
+        self.reference = None      # float32 gray thumbnail
+        self.sharpness = None      # running baseline of Laplacian variance
+        self.state = OK
+        self.candidate = OK
+        self.candidate_since = time.time()
+        self.last_alert = 0.0
+
+    def classify(self, frame):
+        """The state of one BGR frame."""
+        height = max(int(round(frame.shape[0] * THUMBNAIL_WIDTH / frame.shape[1])), 1)
+        thumb = cv2.cvtColor(cv2.resize(frame, (THUMBNAIL_WIDTH, height), interpolation=cv2.INTER_AREA),
+                             cv2.COLOR_BGR2GRAY)
+        _, std = cv2.meanStdDev(thumb)
+        if std[0, 0] < BLANK_STD:
+            self.last_digest = None
+            return BLANK
+
+        digest = zlib.crc32(thumb)
+        if digest == self.last_digest:
+            return FROZEN
+        self.last_digest = digest
+
+        sharpness = float(cv2.Laplacian(thumb, cv2.CV_32F).var())
+        if self.reference is None:
+            self.reference = thumb.astype(np.float32)
+            self.sharpness = sharpness
+            return OK
+        correlation = float(cv2.matchTemplate(thumb, self.reference.astype(np.uint8), cv2.TM_CCOEFF_NORMED)[0, 0])
+        cv2.accumulateWeighted(thumb, self.reference, REFERENCE_RATE)
+
+        if sharpness < BLUR_FLOOR or sharpness < BLUR_RATIO * self.sharpness:
+            return BLURRED
+        self.sharpness += REFERENCE_RATE * (sharpness - self.sharpness)
+        if correlation < SCENE_CORRELATION:
+            return MOVED
+        return OK
+
+    def update(self, frame, now=None):
+        """Classify a new frame and settle the camera state. Returns the frame's state."""
+        frame_state = self.classify(frame)
+        self.settle(frame_state, frame, time.time() if now is None else now)
+        return frame_state
+
+    def view_state(self, frame_state):
+        """
+        The state a frame's views are published under: the camera's state when
+        the frame still shows it, else OK. One repeated or dark frame is never
+        skipped, and the first good frame after an outage is analysed at once.
+        """
+        return self.state if frame_state == self.state else OK
+
+    def stale(self, last_frame_time, now=None):
+        """Called while no new frame arrives: a source that stops delivering is frozen from its last frame."""
+        now = time.time() if now is None else now
+        if not last_frame_time or self.state == FROZEN or now - last_frame_time < FROZEN_SECONDS:
+            return
+        self.candidate, self.candidate_since = FROZEN, last_frame_time
+        self.settle(FROZEN, None, now)
+
+    def settle(self, frame_state, frame, now):
+        if frame_state != self.candidate:
+            self.candidate, self.candidate_since = frame_state, now
+        persist = FROZEN_SECONDS if self.candidate == FROZEN else PERSIST_SECONDS
+        if self.candidate == self.state or now - self.candidate_since < persist:
+            return
+        previous, self.state = self.state, self.candidate
+        if self.state == OK:
+            log.info("Camera %s feed healthy again (was %s)", self.cam_id, HEALTH_NAMES[previous],
+                     extra={"cam_id": self.cam_id})
+            return
+        log.warning("Camera %s feed unhealthy: %s", self.cam_id, HEALTH_NAMES[self.state],
+                    extra={"key": f"unhealthy:{self.cam_id}", "cam_id": self.cam_id})
+        if now - self.last_alert >= ALERT_INTERVAL:
+            self.last_alert = now
+            self.send_alert(frame)
+
+    def send_alert(self, frame):
+        if self.health_queue is None:
+            return
+        self.health_queue.put({
+            "cam_id": self.cam_id,
+            "state": HEALTH_NAMES[self.state],
+            "message": f"Camera unhealthy: {describe(self.state)}",
+            "severity": "high",
+            "detection_type": "health",
+            "image_path": save_health_frame(frame, self.cam_id, self.state) if frame is not None else None,
+            "since": self.candidate_since,
+        })
+
+
+def describe(state):
+    return {
+        BLANK: "blank image (black, white or covered lens)",
+        FROZEN: "frozen image or no new frames",
+        BLURRED: "image blurred or out of focus",
+        MOVED: "view changed (camera moved or obstructed)",
+    }.get(state, HEALTH_NAMES[state])
+
+
+def save_health_frame(frame, cam_id, state):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    image_path = os.path.join(SNAPSHOT_DIR, f"health_cam{cam_id}_{HEALTH_NAMES[state]}_{timestamp}.jpg")
+    if cv2.imwrite(image_path, frame):
+        return image_path
+    log.error("Camera %s: failed to save health snapshot", cam_id, extra={"key": f"health-save-failed:{cam_id}"})
+    return None
@@ -0,0 +1,467 @@
+import argparse
+import hmac
+import json
+import multiprocessing as mp
+import os
+import select
+import socket
+import struct
+import time
+import zlib
+
+import cv2
+import numpy as np
+
+from detection_ring import DETECTION_DTYPE, DetectionRing, create_detection_ring, detection_ring_name
+from detection_overlay import OverlayWriter
+from frame_health import SKIP_STATES
+from metrics import MAX_CAMERAS, series
+from shared_state import (FRAME_META_DTYPE, apply_config_updates, attach_shared_array, copy_frame,
+                          create_shared_array, create_shared_memory, frame_meta_name, open_shared_memory,
+                          set_shm_namespace)
+from startup_report import StartupReport
+from structured_log import get_logger, run_logged, start_log_service, stop_log_service, worker_log_config
+
+# 🔹 Frame transport: local shared memory or a TCP link to a detector node
+#
+# Detectors normally read a camera's frame and views straight from the
+# pipeline's shared memory ("shm" transport), which keeps every stage on
+# one host. Object and face detection can instead run on detector nodes
+# ("tcp" transport):
+#   - on the pipeline host, one link process per remote (camera, detector)
+#     sends each new camera frame, JPEG- or zlib-compressed, with its seq,
+#     capture time and health state, and writes the detections that come
+#     back into the (camera, detector) detection ring, so the alert process
+#     cannot tell local and remote detectors apart;
+#   - a node (IVSS_NODE_TOKEN=... python frame_transport.py, on
+#     127.0.0.1:7100 by default) serves each link in its own process: it
+#     rebuilds the camera's frame, view and ring segments locally, under a
+#     per-link namespace so a node can share a host with the pipeline, and
+#     runs the unchanged detector on them.
+# --listen 0.0.0.0:7100 accepts pipelines on other hosts; links are not
+# encrypted, so only do that on a trusted network. A node only serves links
+# whose hello carries its shared token (IVSS_NODE_TOKEN on both ends), a
+# known detector and encoding and a frame no larger than MAX_FRAME_SIDE;
+# no message may exceed MAX_MESSAGE bytes.
+# Backpressure: the node acknowledges a frame once its detector has read
+# the frame's view (or a newer frame replaced it unread), and the link keeps
+# at most LINK_WINDOW frames unacknowledged. New frames arriving while the
+# window is full are skipped, so a slow node gets the newest frame next
+# rather than a growing backlog. Each link reports frames sent and skipped,
+# bytes each way and frame round trip on /metrics (ivss_link_*). Evidence
+# images are written on the node; alerts carry the node's path.
+
+REMOTE_DETECTORS = ("object", "face")
+ENCODINGS = ("jpeg", "raw")
+JPEG_QUALITY = 85
+LINK_WINDOW = 2            # frames sent but not yet acknowledged
+CONNECT_TIMEOUT = 5.0
+RETRY_SECONDS = 5.0        # between connection attempts
+HELLO_TIMEOUT = 10.0
+RECV_SIZE = 1 << 20
+DEFAULT_PORT = 7100
+DEFAULT_LISTEN = f"127.0.0.1:{DEFAULT_PORT}"
+MAX_FRAME_SIDE = 4096      # pixels, either dimension
+MAX_MESSAGE = 64 << 20     # bytes; a raw MAX_FRAME_SIDE square frame is 48 MB
+
+# kind, seq, timestamp, health, payload length
+HEADER = struct.Struct("<BQdBI")
+HELLO, FRAME, ACK, RESULTS, CONFIG = range(5)
+
+log = get_logger("transport")
+
+
+def parse_remote_detectors(value):
+    """
+    "object=host:7100,face=host2:7100,object=host3:7100" -> {"object": [(host, 7100), (host3, 7100)], "face": [...]}.
+    Raises ValueError for anything else.
+    """
+    remote = {}
+    for part in (value or "").split(","):
+        if not part.strip():
+            continue
+        detector, _, address = part.strip().partition("=")
+        host, _, port = address.rpartition(":")
+        if detector not in REMOTE_DETECTORS or not host:
+            raise ValueError(f"Invalid remote detector {part.strip()!r}; expected object=host:port or face=host:port")
+        remote.setdefault(detector, []).append((host, int(port or DEFAULT_PORT)))
+    return remote
+
+
+def node_token():
+    """Shared secret a pipeline presents to its detector nodes."""
+    return os.getenv("IVSS_NODE_TOKEN", "")
+
+
+def encode_frame(frame, encoding):
+    if encoding == "jpeg":
+        ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        return data.tobytes()
+    return zlib.compress(frame.tobytes(), 1)
+
+
+def decode_frame(payload, encoding, shape):
+    if encoding == "jpeg":
+        frame = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None or frame.shape != tuple(shape):
+            raise ValueError("Undecodable or mis-sized JPEG frame")
+        return frame
+    size = int(np.prod(shape))
+    try:
+        inflater = zlib.decompressobj()
+        data = inflater.decompress(payload, size)
+    except zlib.error as e:
+        raise ValueError(f"Undecodable raw frame: {e}")
+    if len(data) != size or inflater.unconsumed_tail:
+        raise ValueError("Mis-sized raw frame")
+    return np.frombuffer(data, dtype=np.uint8).reshape(shape)
+
+
+class Connection:
+    """Length-prefixed messages over one TCP socket, counting bytes each way."""
+
+    def __init__(self, sock):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(None)
+        self.sock = sock
+        self.buffer = bytearray()
+        self.sent = 0
+        self.received = 0
+
+    def send(self, kind, payload=b"", seq=0, timestamp=0.0, health=0):
+        message = HEADER.pack(kind, seq, timestamp, health, len(payload)) + payload
+        self.sock.sendall(message)
+        self.sent += len(message)
+
+    def receive(self, timeout=0.0):
+        """Complete messages that arrived, waiting up to timeout for the first bytes. Raises ConnectionError."""
+        while select.select([self.sock], [], [], timeout)[0]:
+            chunk = self.sock.recv(RECV_SIZE)
+            if not chunk:
+                raise ConnectionError("connection closed by peer")
+            self.buffer += chunk
+            self.received += len(chunk)
+            timeout = 0.0
+        messages = []
+        while len(self.buffer) >= HEADER.size:
+            kind, seq, timestamp, health, length = HEADER.unpack_from(self.buffer)
+            if length > MAX_MESSAGE:
+                raise ConnectionError(f"{length}-byte message exceeds {MAX_MESSAGE}")
+            end = HEADER.size + length
+            if len(self.buffer) < end:
+                break
+            messages.append((kind, seq, timestamp, health, bytes(self.buffer[HEADER.size:end])))
+            del self.buffer[:end]
+        return messages
+
+    def close(self):
+        self.sock.close()
+
+
+# 🔹 Pipeline end
+
+class FrameLink:
+    """
+    Feeds one camera's frames to a remote detector and writes its detections
+    into the local detection ring. step() never blocks for long, like a detector's.
+    """
+
+    def __init__(self, shm_name, shape, cam_id, detector, address, ring_name, cam_config, encoding="jpeg"):
+        self.cam_id = cam_id
+        self.detector = detector
+        self.address = tuple(address)
+        self.shape = shape
+        self.config = cam_config
+        self.encoding = encoding
+        self.shm = open_shared_memory(shm_name)
+        self.frame_buffer = np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.meta_shm, self.frame_meta = attach_shared_array(frame_meta_name(cam_id), FRAME_META_DTYPE)
+        self.output = DetectionRing(ring_name)
+        self.overlay = OverlayWriter(cam_id, detector)
+        self.connection = None
+        self.retry_at = 0.0
+        self.last_seq = 0
+        self.skipped_seq = 0
+        self.in_flight = {}  # seq -> time sent
+        self.counted = (0, 0)  # connection bytes already added to the metrics
+        labels = {"cam": cam_id, "detector": detector}
+        self.metrics = {
+            "frames": series("ivss_link_frames_total", **labels),
+            "skipped": series("ivss_link_frames_skipped_total", **labels),
+            "sent": series("ivss_link_sent_bytes_total", **labels),
+            "received": series("ivss_link_received_bytes_total", **labels),
+            "rtt": series("ivss_link_rtt_seconds", **labels),
+        }
+
+    def connect(self):
+        sock = socket.create_connection(self.address, timeout=CONNECT_TIMEOUT)
+        self.connection = Connection(sock)
+        self.counted = (0, 0)
+        self.in_flight.clear()
+        self.connection.send(HELLO, json.dumps({
+            "cam_id": self.cam_id, "detector": self.detector, "shape": list(self.shape),
+            "encoding": self.encoding, "config": self.config, "token": node_token(),
+        }, default=str).encode())
+        log.info("Camera %s %s linked to %s:%s", self.cam_id, self.detector, *self.address,
+                 extra={"cam_id": self.cam_id})
+
+    def disconnect(self, reason):
+        log.warning("Camera %s %s link to %s:%s lost: %s", self.cam_id, self.detector, *self.address, reason,
+                    extra={"key": f"link-lost:{self.cam_id}:{self.detector}", "cam_id": self.cam_id})
+        self.connection.close()
+        self.connection = None
+        self.in_flight.clear()
+        self.retry_at = time.time() + RETRY_SECONDS
+
+    def step(self):
+        """Exchange at most one frame and whatever came back. Returns False when there was nothing to do."""
+        if self.connection is None:
+            if time.time() < self.retry_at:
+                return False
+            try:
+                self.connect()
+            except OSError as e:
+                log.warning("Camera %s %s: cannot reach detector node %s:%s: %s", self.cam_id, self.detector,
+                            *self.address, e, extra={"key": f"link-connect:{self.cam_id}:{self.detector}",
+                                                     "cam_id": self.cam_id})
+                self.retry_at = time.time() + RETRY_SECONDS
+                return False
+        try:
+            worked = self.receive()
+            worked = self.send_frame() or worked
+        except (OSError, ValueError) as e:
+            self.disconnect(e)
+            return False
+        finally:
+            self.count_bytes()
+        return worked
+
+    def receive(self):
+        messages = self.connection.receive()
+        for kind, seq, _, _, payload in messages:
+            if kind == ACK:
+                sent = self.in_flight.pop(seq, None)
+                if sent is not None:
+                    self.metrics["rtt"].observe(time.time() - sent)
+            elif kind == RESULTS:
+                records = np.frombuffer(payload, dtype=DETECTION_DTYPE)
+                self.output.write(records)
+                if len(records):
+                    latest = records[records["seq"] == records["seq"][-1]]
+                    self.overlay.publish(latest, float(latest[0]["frame_time"]))
+        return bool(messages)
+
+    def send_frame(self):
+        seq = int(self.frame_meta["seq"][0])
+        if seq == self.last_seq:
+            return False
+        health = int(self.frame_meta["health"][0])
+        if health in SKIP_STATES:
+            self.last_seq = seq  # nothing a detector would look at
+            return False
+        if len(self.in_flight) >= LINK_WINDOW:
+            # The newest frame is sent once the node acknowledges one
+            if seq != self.skipped_seq:
+                self.skipped_seq = seq
+                self.metrics["skipped"].inc()
+            return False
+        snapshot = copy_frame(self.frame_buffer, self.frame_meta)
+        if snapshot is None:
+            return False  # being rewritten; pick up the next one
+        frame, seq, timestamp = snapshot
+        self.last_seq = seq
+        self.connection.send(FRAME, encode_frame(frame, self.encoding), seq, timestamp, health)
+        self.in_flight[seq] = time.time()
+        self.metrics["frames"].inc()
+        return True
+
+    def count_bytes(self):
+        if self.connection is None:
+            return
+        sent, received = self.connection.sent, self.connection.received
+        self.metrics["sent"].inc(sent - self.counted[0])
+        self.metrics["received"].inc(received - self.counted[1])
+        self.counted = (sent, received)
+
+    def reconfigure(self, cam_config):
+        """Thresholds and skip settings are forwarded to the remote detector."""
+        self.config = cam_config
+        if self.connection is not None:
+            try:
+                self.connection.send(CONFIG, json.dumps(cam_config, default=str).encode())
+            except OSError as e:
+                self.disconnect(e)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+        del self.frame_buffer, self.frame_meta
+        self.output.close()
+        self.overlay.close()
+        self.meta_shm.close()
+        self.shm.close()
+
+
+def frame_link_process(shm_name, shape, cam_id, detector, address, ring_name, cam_config, encoding="jpeg",
+                       control_queue=None):
+    startup = StartupReport("link", cam_id)
+    link = FrameLink(shm_name, shape, cam_id, detector, address, ring_name, cam_config, encoding)
+    log.info("Frame link started for Camera %s %s -> %s:%s", cam_id, detector, *address)
+    try:
+        while True:
+            apply_config_updates(control_queue, link)
+            if link.step():
+                startup.finish()
+            else:
+                time.sleep(0.002)
+    finally:
+        log.info("Frame link shutting down for Camera %s %s...", cam_id, detector)
+        link.close()
+
+
+# 🔹 Detector node end
+
+def receive_hello(connection):
+    deadline = time.time() + HELLO_TIMEOUT
+    while time.time() < deadline:
+        for kind, _, _, _, payload in connection.receive(timeout=0.1):
+            if kind == HELLO:
+                return json.loads(payload)
+    raise ConnectionError("no hello from the pipeline")
+
+
+def check_hello(hello, token):
+    """Raises ValueError unless hello carries token and describes a link this node can serve."""
+    if not isinstance(hello, dict):
+        raise ValueError("malformed hello")
+    if not hmac.compare_digest(str(hello.get("token", "")).encode(), token.encode()):
+        raise ValueError("wrong node token")
+    cam_id, shape = hello.get("cam_id"), hello.get("shape")
+    if type(cam_id) is not int or not 0 <= cam_id < MAX_CAMERAS:
+        raise ValueError(f"invalid camera {cam_id!r}")
+    if hello.get("detector") not in REMOTE_DETECTORS:
+        raise ValueError(f"unknown detector {hello.get('detector')!r}")
+    if hello.get("encoding") not in ENCODINGS:
+        raise ValueError(f"unknown encoding {hello.get('encoding')!r}")
+    if (not isinstance(shape, list) or len(shape) != 3 or any(type(v) is not int for v in shape)
+            or shape[2] != 3 or not (0 < shape[0] <= MAX_FRAME_SIDE and 0 < shape[1] <= MAX_FRAME_SIDE)):
+        raise ValueError(f"invalid frame shape {shape!r}")
+    if not isinstance(hello.get("config") or {}, dict):
+        raise ValueError("invalid camera config")
+
+
+def serve_link(sock, namespace, token):
+    """Run one remote (camera, detector) on the frames arriving on sock."""
+    from frame_views import ViewWriter, create_view_buffers
+    from worker_pool import create_detector, detector_task
+
+    set_shm_namespace(namespace)
+    connection = Connection(sock)
+    try:
+        hello = receive_hello(connection)
+        check_hello(hello, token)
+    except (ConnectionError, OSError, ValueError) as e:
+        log.warning("Link refused: %s", e)
+        connection.close()
+        return
+    cam_id, detector, encoding = hello["cam_id"], hello["detector"], hello["encoding"]
+    shape = tuple(hello["shape"])
+    if detector == "object":
+        from object_detection import object_view
+        spec = object_view(shape)
+    else:
+        from face_recognition_module import FACE_VIEW as spec
+    startup = StartupReport(f"node-{detector}", cam_id)
+
+    shm_name = f"video_frame_shm_{cam_id}"
+    handles = [create_shared_memory(shm_name, int(np.prod(shape)))]
+    meta_shm, frame_meta = create_shared_array(frame_meta_name(cam_id), FRAME_META_DTYPE)
+    handles += [meta_shm] + create_view_buffers(cam_id, [spec], shape) + [create_detection_ring(cam_id, detector)]
+    frame_buffer = np.ndarray(shape, dtype=np.uint8, buffer=handles[0].buf)
+    view = ViewWriter(cam_id, spec, shape)
+    task = detector_task(cam_id, detector, shm_name, shape, hello["config"] or {}, spec)
+    worker = create_detector(task, {}, startup)
+    results = DetectionRing(detection_ring_name(cam_id, detector))
+    log.info("Node serving Camera %s %s (%s frames)", cam_id, detector, encoding, extra={"cam_id": cam_id})
+    unread = None  # seq of the published view the detector has not read yet
+    try:
+        busy = False
+        while True:
+            for kind, seq, timestamp, health, payload in connection.receive(timeout=0.0 if busy else 0.005):
+                if kind == FRAME:
+                    frame_buffer[:] = decode_frame(payload, encoding, shape)
+                    frame_meta["timestamp"], frame_meta["health"] = timestamp, health
+                    frame_meta["seq"] = seq
+                    view.publish(frame_buffer, seq, timestamp, health)
+                    if unread is not None:
+                        connection.send(ACK, seq=unread)  # replaced before the detector got to it
+                    unread = seq
+                elif kind == CONFIG:
+                    worker.reconfigure(json.loads(payload))
+            busy = worker.step()
+            if busy:
+                startup.finish()
+            if unread is not None and worker.view_reader.last_seq >= unread:
+                connection.send(ACK, seq=unread)
+                unread = None
+            records = results.read()
+            if len(records):
+                connection.send(RESULTS, records.tobytes())
+    except (ConnectionError, OSError, ValueError) as e:
+        log.info("Camera %s %s link closed: %s", cam_id, detector, e, extra={"cam_id": cam_id})
+    finally:
+        worker.close()
+        results.close()
+        view.close()
+        del frame_buffer, frame_meta
+        connection.close()
+        for shm in handles:
+            shm.close()
+            shm.unlink()
+
+
+def serve(host, port, token):
+    """Accept pipeline links presenting token and serve each in its own process until interrupted."""
+    listener = socket.create_server((host, port))
+    log.info("Detector node listening on %s:%s", host, port)
+    links = []
+    index = 0
+    try:
+        while True:
+            links = [process for process in links if process.is_alive()]
+            if not select.select([listener], [], [], 1.0)[0]:
+                continue
+            sock, peer = listener.accept()
+            index += 1
+            name = f"link{index}"
+            process = mp.Process(target=run_logged, name=name,
+                                 args=(worker_log_config(name), serve_link, (sock, f"n{port}l{index}_", token)))
+            process.start()
+            sock.close()
+            links.append(process)
+            log.info("Link %s from %s:%s", index, *peer[:2])
+    finally:
+        listener.close()
+        for process in links:
+            process.terminate()
+            process.join(5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run remote object / face detectors for an IVSS pipeline.")
+    parser.add_argument("--listen", default=DEFAULT_LISTEN,
+                        help="host:port to accept pipeline links on; use 0.0.0.0:port to accept other hosts")
+    parser.add_argument("--debug", default="", help="Workers that log DEBUG, e.g. 'all'")
+    args = parser.parse_args()
+    if not node_token():
+        parser.error("set IVSS_NODE_TOKEN to the secret the pipeline's links present")
+    host, _, port = args.listen.rpartition(":")
+    start_log_service(debug=args.debug)
+    try:
+        serve(host or "127.0.0.1", int(port or DEFAULT_PORT), node_token())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_log_service()
@@ -0,0 +1,261 @@
+import cv2
+import numpy as np
+import time
+
+from frame_health import BLANK, OK, SKIP_STATES, FrameHealth
+from shared_state import (FRAME_META_DTYPE, attach_shared_array, copy_frame, create_shared_array,
+                          create_shared_memory, frame_meta_name, open_shared_memory)
+from startup_report import StartupReport
+from structured_log import get_logger
+
+log = get_logger("preprocess")
+
+# 🔹 Detector-specific views of the camera frame
+#
+# Each detector module declares the input it wants as a view spec, e.g.
+#   {"name": "motion", "mode": "gray", "width": 160}
+#   {"name": "object", "mode": "letterbox", "size": 640}
+#   {"name": "face", "mode": "rgb", "scale": 0.5}
+# The per-camera preprocess process computes every requested view once per
+# new frame and publishes it in video_view_shm_{cam}_{name}, so consumers
+# never resize or convert the same frame twice. It also checks the frame's
+# health once (frame_health.py); while the camera is blank or frozen, views
+# are not computed or read (specs with "keep_blank": True still are when blank).
+# A view is rewritten in place, so its metadata carries a version that is odd
+# while the view is being written; a reader that sees it odd, or changed
+# after copying, drops the copy instead of handing a torn view to a detector.
+# A spec with "frame": True also publishes the full-resolution frame the
+# view was computed from (video_view_frame_shm_{cam}_{name}) under the same
+# version, for detectors that crop tiles or save evidence from it.
+
+VIEW_META_DTYPE = np.dtype([
+    ("version", "<u8"),    # incremented before and after every write of the view
+    ("seq", "<u8"),        # frame seq the view was computed from
+    ("timestamp", "<f8"),  # grab timestamp of that frame
+    ("health", "u1"),      # FrameHealth.view_state of that frame
+])
+LETTERBOX_COLOR = 114
+
+
+def view_shm_name(cam_id, view_name):
+    return f"video_view_shm_{cam_id}_{view_name}"
+
+
+def view_meta_name(cam_id, view_name):
+    return f"video_view_meta_shm_{cam_id}_{view_name}"
+
+
+def view_frame_name(cam_id, view_name):
+    return f"video_view_frame_shm_{cam_id}_{view_name}"
+
+
+def view_shape(spec, frame_shape):
+    height, width = frame_shape[:2]
+    mode = spec["mode"]
+    if mode == "gray":
+        target_w = min(spec.get("width", width), width)
+        return (max(int(round(height * target_w / width)), 1), target_w)
+    if mode == "letterbox":
+        return (spec["size"], spec["size"], 3)
+    if mode in ("rgb", "bgr"):
+        scale = spec.get("scale", 1.0)
+        return (max(int(height * scale), 1), max(int(width * scale), 1), 3)
+    raise ValueError(f"Unknown view mode: {mode}")
+
+
+def letterbox_params(frame_shape, size):
+    """Returns (scale, pad_x, pad_y) used to place a frame inside a size x size square."""
+    height, width = frame_shape[:2]
+    scale = min(size / width, size / height)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    return scale, (size - new_w) // 2, (size - new_h) // 2
+
+
+def unletterbox_box(box, params):
+    """Map an (x1, y1, x2, y2) box from letterbox to frame coordinates."""
+    scale, pad_x, pad_y = params
+    x1, y1, x2, y2 = box
+    return (int((x1 - pad_x) / scale), int((y1 - pad_y) / scale),
+            int((x2 - pad_x) / scale), int((y2 - pad_y) / scale))
+
+
+def compute_view(spec, frame, out=None):
+    """Compute one view of a BGR frame, writing into out when given."""
+    shape = view_shape(spec, frame.shape)
+    if out is None:
+        out = np.empty(shape, dtype=np.uint8)
+    mode = spec["mode"]
+
+    if mode == "gray":
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if gray.shape != shape:
+            cv2.resize(gray, (shape[1], shape[0]), dst=out, interpolation=cv2.INTER_AREA)
+        else:
+            np.copyto(out, gray)
+    elif mode == "letterbox":
+        scale, pad_x, pad_y = letterbox_params(frame.shape, spec["size"])
+        new_h = int(round(frame.shape[0] * scale))
+        new_w = int(round(frame.shape[1] * scale))
+        out[...] = LETTERBOX_COLOR
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        out[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(frame, (new_w, new_h), interpolation=interpolation)
+    else:
+        resized = frame if frame.shape == shape else cv2.resize(frame, (shape[1], shape[0]), interpolation=cv2.INTER_AREA)
+        if mode == "rgb":
+            cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=out)
+        else:
+            np.copyto(out, resized)
+    return out
+
+
+def skipped(spec, state):
+    """Whether a view is neither computed nor read while the camera is in this health state."""
+    return state in SKIP_STATES and not (state == BLANK and spec.get("keep_blank"))
+
+
+def publish_view(spec, frame, view, meta, seq, timestamp, state, frame_copy=None):
+    """Compute a frame's view into its shared buffer (unless the camera is unhealthy) and publish its metadata."""
+    meta["version"] += 1
+    if not skipped(spec, state):
+        compute_view(spec, frame, out=view)
+        if frame_copy is not None:
+            np.copyto(frame_copy, frame)
+    meta["timestamp"] = timestamp
+    meta["health"] = state
+    meta["seq"] = seq
+    meta["version"] += 1
+
+
+def create_view_buffers(cam_id, view_specs, frame_shape):
+    """Create the shared memory for every view of one camera. Returns the SharedMemory handles."""
+    handles = []
+    for spec in view_specs:
+        shape = view_shape(spec, frame_shape)
+        handles.append(create_shared_memory(view_shm_name(cam_id, spec["name"]), int(np.prod(shape))))
+        meta_shm, _ = create_shared_array(view_meta_name(cam_id, spec["name"]), VIEW_META_DTYPE)
+        handles.append(meta_shm)
+        if spec.get("frame"):
+            handles.append(create_shared_memory(view_frame_name(cam_id, spec["name"]), int(np.prod(frame_shape))))
+    return handles
+
+
+class ViewWriter:
+    """Publishing end of one view: its buffer, its metadata and, for "frame" specs, the full-resolution copy."""
+
+    def __init__(self, cam_id, spec, frame_shape):
+        self.spec = spec
+        self.shm = open_shared_memory(view_shm_name(cam_id, spec["name"]))
+        self.view = np.ndarray(view_shape(spec, frame_shape), dtype=np.uint8, buffer=self.shm.buf)
+        self.meta_shm, self.meta = attach_shared_array(view_meta_name(cam_id, spec["name"]), VIEW_META_DTYPE)
+        self.frame_shm = self.frame = None
+        if spec.get("frame"):
+            self.frame_shm = open_shared_memory(view_frame_name(cam_id, spec["name"]))
+            self.frame = np.ndarray(frame_shape, dtype=np.uint8, buffer=self.frame_shm.buf)
+
+    def publish(self, frame, seq, timestamp, state):
+        publish_view(self.spec, frame, self.view, self.meta, seq, timestamp, state, self.frame)
+
+    def close(self):
+        del self.view, self.meta, self.frame
+        self.shm.close()
+        self.meta_shm.close()
+        if self.frame_shm is not None:
+            self.frame_shm.close()
+
+
+class ViewReader:
+    """
+    Reads one published view, returning only views newer than the last one
+    read. Views of blank or frozen frames are passed over. For "frame" specs,
+    frame holds the full-resolution frame of the last view read.
+    """
+
+    def __init__(self, cam_id, spec, frame_shape):
+        self.spec = spec
+        self.shape = view_shape(spec, frame_shape)
+        self.shm = open_shared_memory(view_shm_name(cam_id, spec["name"]))
+        self.buffer = np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.meta_shm, self.meta = attach_shared_array(view_meta_name(cam_id, spec["name"]), VIEW_META_DTYPE)
+        self.frame_shm = self.frame_buffer = None
+        if spec.get("frame"):
+            self.frame_shm = open_shared_memory(view_frame_name(cam_id, spec["name"]))
+            self.frame_buffer = np.ndarray(frame_shape, dtype=np.uint8, buffer=self.frame_shm.buf)
+        self.frame = None
+        self.last_seq = 0
+
+    def read(self):
+        """Returns (view_copy, timestamp) for a new view, or None if nothing new was published."""
+        version = int(self.meta["version"][0])
+        if version % 2:
+            return None  # being written; pick it up on the next call
+        seq = int(self.meta["seq"][0])
+        if seq == self.last_seq:
+            return None
+        if skipped(self.spec, self.meta["health"][0]):
+            self.last_seq = seq
+            return None
+        view = self.buffer.copy()
+        frame = self.frame_buffer.copy() if self.frame_buffer is not None else None
+        timestamp = float(self.meta["timestamp"][0])
+        if int(self.meta["version"][0]) != version:
+            return None  # overwritten while copying; pick up the next one
+        self.last_seq = seq
+        self.frame = frame
+        return view, timestamp
+
+    def close(self):
+        del self.buffer, self.meta, self.frame_buffer
+        self.shm.close()
+        self.meta_shm.close()
+        if self.frame_shm is not None:
+            self.frame_shm.close()
+
+
+def preprocess_process(shm_name, shape, cam_id, view_specs, health_queue=None):
+    """
+    Check each new camera frame's health, then compute each requested view
+    once and publish it for all consumers. Unhealthy-camera alerts go to health_queue.
+    """
+    startup = StartupReport("preprocess", cam_id)
+    shm = open_shared_memory(shm_name)
+    frame_buffer = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    frame_meta_shm, frame_meta = attach_shared_array(frame_meta_name(cam_id), FRAME_META_DTYPE)
+
+    outputs = [ViewWriter(cam_id, spec, shape) for spec in view_specs]
+
+    log.info("Preprocessing started for Camera %s: %s views", cam_id,
+             ", ".join(spec["name"] for spec in view_specs) or "no", extra={"cam_id": cam_id})
+
+    health = FrameHealth(cam_id, health_queue)
+    frame_meta["health"] = OK
+    last_seq = 0
+    timestamp = 0.0
+    try:
+        while True:
+            seq = int(frame_meta["seq"][0])
+            if seq == last_seq:
+                health.stale(timestamp)
+                frame_meta["health"] = health.state
+                time.sleep(0.002)
+                continue
+            snapshot = copy_frame(frame_buffer, frame_meta)
+            if snapshot is None:
+                continue  # being rewritten; copy it on the next pass
+            frame, seq, timestamp = snapshot
+            last_seq = seq
+            view_state = health.view_state(health.update(frame))
+            frame_meta["health"] = health.state
+
+            for output in outputs:
+                output.publish(frame, seq, timestamp, view_state)
+            startup.finish()
+    finally:
+        log.info("Preprocessing shutting down for Camera %s...", cam_id, extra={"cam_id": cam_id})
+        for output in outputs:
+            output.close()
+        frame_meta_shm.close()
+        shm.close()
+
+
+if __name__ == "__main__":
+    print("Run main.py to start the system.")
@@ -0,0 +1,215 @@
+import numpy as np
+import os
+import time
+
+from shared_state import (FRAME_META_DTYPE, attach_shared_array, create_shared_array,
+                          frame_meta_name)
+from structured_log import get_logger
+
+log = get_logger("scheduler")
+
+# 🔹 Cross-camera inference scheduler
+#
+# Every scheduled (camera, detector) worker owns one slot in a shared array.
+# A worker marks itself ready when it has a new view, then waits until the
+# scheduler grants it a run. The scheduler hands out at most
+# INFERENCE_BUDGET concurrent runs, always honouring each camera's minimum
+# FPS first and never exceeding its maximum, and otherwise prefers cameras
+# with recent motion activity, higher priority and older results.
+
+SCHEDULER_SHM_NAME = "ivss_scheduler_shm"
+SCHEDULER_CAPACITY = 64    # slots, so detectors can be added while the pipeline runs
+SCHEDULED_DETECTORS = ("object", "face")
+DEFAULT_PRIORITY = 1.0
+DEFAULT_MIN_FPS = 1.0
+DEFAULT_MAX_FPS = 10.0
+ACTIVITY_WEIGHT = 4.0      # how much recent motion raises a camera's share
+STATS_WINDOW = 5.0         # seconds over which achieved FPS is measured
+TICK = 0.002               # scheduler / worker polling interval
+
+SLOT_DTYPE = np.dtype([
+    ("cam_id", "<i4"),
+    ("detector", "S8"),
+    ("priority", "<f4"),
+    ("min_fps", "<f4"),
+    ("max_fps", "<f4"),
+    ("ready", "u1"),
+    ("request_time", "<f8"),   # when the worker became ready
+    ("grant_seq", "<u8"),      # bumped by the scheduler to grant a run
+    ("done_seq", "<u8"),       # set to grant_seq by the worker when the run ends
+    ("grant_time", "<f8"),
+    ("last_run", "<f8"),
+    ("last_duration", "<f4"),
+    ("runs", "<u8"),
+    ("achieved_fps", "<f4"),
+    ("queue_delay_ms", "<f4"),  # exponential average of request -> grant delay
+    ("skipped", "<u8"),         # views answered with the previous result (change_gate.py)
+    ("cpu_saved", "<f4"),       # estimated CPU seconds those skips saved
+])
+
+
+def default_budget():
+    return int(os.getenv("IVSS_INFERENCE_BUDGET") or max((os.cpu_count() or 2) - 1, 1))
+
+
+def slot_settings(cam_config):
+    """Scheduling parameters of one camera."""
+    return {
+        "priority": float(cam_config.get("priority") or DEFAULT_PRIORITY),
+        "min_fps": float(cam_config.get("minFps") or DEFAULT_MIN_FPS),
+        "max_fps": float(cam_config.get("maxFps") or DEFAULT_MAX_FPS),
+    }
+
+
+def create_scheduler_table(capacity=SCHEDULER_CAPACITY):
+    shm, table = create_shared_array(SCHEDULER_SHM_NAME, SLOT_DTYPE, (capacity,))
+    table["cam_id"] = -1
+    table["max_fps"] = DEFAULT_MAX_FPS
+    return shm, table
+
+
+def allocate_slot(table, cam_id, detector, cam_config):
+    """Claim a free slot for a (camera, detector) worker. Returns its index, or None if the table is full."""
+    free = np.flatnonzero(table["cam_id"] < 0)
+    if not len(free):
+        return None
+    index = int(free[0])
+    table[index] = np.zeros((), dtype=SLOT_DTYPE)
+    table["detector"][index] = detector.encode()
+    update_slot(table, index, cam_config)
+    table["cam_id"][index] = cam_id  # claimed last, the scheduler skips slots with cam_id < 0
+    return index
+
+
+def update_slot(table, index, cam_config):
+    """Apply changed priority / FPS limits to a live slot."""
+    for field, value in slot_settings(cam_config).items():
+        table[field][index] = value
+
+
+def release_slot(table, index):
+    table["cam_id"][index] = -1
+    table["ready"][index] = 0
+    table["detector"][index] = b""
+    table["max_fps"][index] = DEFAULT_MAX_FPS
+    table["done_seq"][index] = table["grant_seq"][index]
+
+
+class SchedulerClient:
+    """Worker side of a scheduler slot."""
+
+    def __init__(self, index, num_slots):
+        self.index = index
+        self.shm, self.table = attach_shared_array(SCHEDULER_SHM_NAME, SLOT_DTYPE, (num_slots,))
+        self.start = 0.0
+
+    def try_turn(self):
+        """Mark the slot ready and return True once the scheduler has granted a run."""
+        slot = self.table[self.index:self.index + 1]
+        if not slot["ready"][0]:
+            slot["request_time"] = time.time()
+            slot["ready"] = 1
+        if slot["grant_seq"][0] > slot["done_seq"][0]:
+            self.start = time.perf_counter()
+            return True
+        return False
+
+    def wait_for_turn(self):
+        while not self.try_turn():
+            time.sleep(TICK)
+
+    def finish(self):
+        slot = self.table[self.index:self.index + 1]
+        slot["last_duration"] = time.perf_counter() - self.start
+        slot["ready"] = 0
+        slot["done_seq"] = slot["grant_seq"][0]
+
+    def report_reuse(self, gate):
+        """Publish a ChangeGate's skip count and CPU saved for the stats page."""
+        slot = self.table[self.index:self.index + 1]
+        slot["skipped"] = gate.skipped
+        slot["cpu_saved"] = gate.cpu_saved
+
+    def close(self):
+        del self.table
+        self.shm.close()
+
+
+def inference_scheduler_process(num_slots, budget=None):
+    budget = budget or default_budget()
+    shm, table = attach_shared_array(SCHEDULER_SHM_NAME, SLOT_DTYPE, (num_slots,))
+    metas = {}
+    metas_refreshed = 0.0
+
+    def detach_metas():
+        stale = list(metas.values())
+        metas.clear()
+        while stale:
+            meta_shm, meta = stale.pop()
+            del meta
+            meta_shm.close()
+
+    def camera_activity(cam_id):
+        # Cameras come and go with config reloads, so attach lazily
+        if cam_id not in metas:
+            try:
+                metas[cam_id] = attach_shared_array(frame_meta_name(cam_id), FRAME_META_DTYPE)
+            except FileNotFoundError:
+                return 0.0
+        return float(metas[cam_id][1]["activity"][0])
+
+    run_times = [[] for _ in range(num_slots)]
+    log.info("Inference scheduler started: %s detector slots, budget %s concurrent runs", num_slots, budget)
+
+    try:
+        while True:
+            now = time.time()
+            if now - metas_refreshed > STATS_WINDOW:
+                # Drop mappings of cameras that may have been restarted with new shared memory
+                detach_metas()
+                metas_refreshed = now
+
+            running = table["grant_seq"] > table["done_seq"]
+            free = budget - int(running.sum())
+
+            if free > 0:
+                since_last = now - table["last_run"]
+                ready = ((table["cam_id"] >= 0) & (table["ready"] == 1) & ~running
+                         & (since_last >= 1.0 / table["max_fps"]))
+                candidates = np.flatnonzero(ready)
+                if len(candidates):
+                    activity = np.array([camera_activity(int(cam)) for cam in table["cam_id"][candidates]])
+                    overdue = since_last[candidates] * table["min_fps"][candidates]
+                    score = (table["priority"][candidates] * (1.0 + ACTIVITY_WEIGHT * activity)
+                             * np.minimum(since_last[candidates], 60.0))
+                    # Anything past its guaranteed minimum FPS goes first, most overdue first
+                    score = np.where(overdue >= 1.0, 1e6 * overdue, score)
+                    for index in candidates[np.argsort(-score)][:free]:
+                        delay_ms = 1000 * (now - table["request_time"][index])
+                        table["queue_delay_ms"][index] = 0.8 * table["queue_delay_ms"][index] + 0.2 * delay_ms
+                        table["grant_time"][index] = now
+                        table["last_run"][index] = now
+                        table["runs"][index] += 1
+                        table["grant_seq"][index] += 1
+                        run_times[index].append(now)
+
+            for index in range(num_slots):
+                times = run_times[index]
+                # Released, or released and reallocated (allocate_slot zeroes runs) between two ticks:
+                # a worker restarted after dying must not inherit its old achieved FPS
+                if table["cam_id"][index] < 0 or table["runs"][index] < len(times):
+                    times.clear()
+                while times and now - times[0] > STATS_WINDOW:
+                    times.pop(0)
+                table["achieved_fps"][index] = len(times) / STATS_WINDOW
+
+            time.sleep(TICK)
+    finally:
+        log.info("Inference scheduler shutting down...")
+        del table
+        shm.close()
+        detach_metas()
+
+
+if __name__ == "__main__":
+    print("Run main.py to start the system.")
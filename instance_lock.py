@@ -0,0 +1,50 @@
+import os
+
+# 🔹 Single pipeline instance
+#
+# main.py holds an exclusive lock on LOCK_PATH for as long as it runs and
+# writes its PID into the file, so a second pipeline refuses to start and the
+# web app can tell whether the system is running (and which process to stop).
+
+LOCK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ivss_pipeline.lock")
+
+
+def _try_lock(handle):
+    try:
+        if os.name == "nt":
+            import msvcrt
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def acquire_instance_lock(path=LOCK_PATH):
+    """Returns the open lock file (keep it open while running), or None if another pipeline holds it."""
+    handle = open(path, "a+")
+    if not _try_lock(handle):
+        handle.close()
+        return None
+    handle.seek(0)
+    handle.truncate()
+    handle.write(str(os.getpid()))
+    handle.flush()
+    return handle
+
+
+def running_pipeline_pid(path=LOCK_PATH):
+    """PID of the running pipeline, or None if no pipeline holds the lock."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "a+") as handle:
+        if _try_lock(handle):
+            return None  # lock is free; closing the file releases it again
+        handle.seek(0)
+        try:
+            return int(handle.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
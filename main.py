@@ -1,51 +1,48 @@
-import multiprocessing as mp
-from multiprocessing import shared_memory
-import numpy as np
+import argparse
 import os
-import json
+import signal
+import sys
 import time
 import cv2
 
-from video_capture import video_capture_process
-from motion_detection import motion_detection_process
-from object_detection import object_detection_process
-from face_recognition_module import face_recognition_process
-from alert_module import alert_process
-from flask import current_app
-from app import db, CameraSetting  # Replace 'your_app' with your actual app module name
-from app import app  # or whatever your Flask file is named
-
-FRAME_SHAPE = (240, 320, 3)  # (height, width, channels)
-
-def create_shared_memory(name, size):
-    try:
-        return shared_memory.SharedMemory(name=name, create=True, size=size)
-    except FileExistsError:
-        try:
-            existing_shm = shared_memory.SharedMemory(name=name)
-            existing_shm.unlink()
-        except FileNotFoundError:
-            pass
-        return shared_memory.SharedMemory(name=name, create=True, size=size)
-
+from instance_lock import acquire_instance_lock
+from pipeline import Pipeline
+from frame_transport import ENCODINGS, node_token, parse_remote_detectors
+from cpu_layout import LAYOUT_FILE, LAYOUT_MODES, plan_layout
+from inference_scheduler import default_budget
+from worker_pool import default_pool_workers
+from database import app_context
+from models import db, CameraSetting, get_config_version
+from startup_report import StartupReport
+from structured_log import get_logger, start_log_service, stop_log_service
 
+# Until start_log_service() runs, these records go straight to the console
+log = get_logger("main")
 
 def load_camera_settings():
     """Loads camera settings from database."""
     try:
-        with current_app.app_context():
-            settings = CameraSetting.query.all()
-            if settings:
-                setts = [setting.to_dict() for setting in settings]
-                return setts
-            else:
-                # Return default settings if no settings exist in database
-                return []
+        settings = CameraSetting.query.order_by(CameraSetting.id).all()
+        if settings:
+            setts = [setting.to_dict() for setting in settings]
+            return setts
+        else:
+            # Return default settings if no settings exist in database
+            return []
     except Exception as e:
-        print(f"Error loading camera settings: {e}")
-        # Return default settings on error
-        return []
+        log.error("Error loading camera settings: %s", e, extra={"key": "load-settings"})
+        # None keeps the running cameras; the pipeline retries on its next poll
+        return None
     
+def load_config_version():
+    """Current camera settings version; a new session each time so commits from the web app are seen."""
+    try:
+        db.session.remove()
+        return get_config_version()
+    except Exception as e:
+        log.error("Error loading config version: %s", e, extra={"key": "load-version"})
+        return None
+
 def save_detection_image(frame, cam_id, detection_type, label=None):
     folder = "objects_detected" if detection_type == "object" else f"{detection_type}_alerts"
     os.makedirs(folder, exist_ok=True)
@@ -57,59 +54,70 @@ def save_detection_image(frame, cam_id, detection_type, label=None):
 
     cv2.imwrite(image_path, frame)
     if os.path.exists(image_path) and os.path.getsize(image_path) > 0:
-        print(f"[INFO] {detection_type.capitalize()} detection frame saved: {image_path}")
+        log.info("%s detection frame saved: %s", detection_type.capitalize(), image_path,
+                 extra={"key": f"{detection_type}-saved:{cam_id}", "cam_id": cam_id})
         return image_path
     else:
-        print(f"[ERROR] Failed to save {detection_type} detection image for Camera {cam_id}.")
+        log.error("Failed to save %s detection image for Camera %s.", detection_type, cam_id,
+                  extra={"key": f"{detection_type}-save-failed:{cam_id}", "cam_id": cam_id})
         return None
 
-if __name__ == "__main__":
-    with app.app_context():
-        camera_settings = load_camera_settings()
-        shared_mem_list = []
-        processes = []
-
-        object_queue = mp.Queue()
-        face_queue = mp.Queue()
-        motion_queue = mp.Queue()
-
-        for i, cam_config in enumerate(camera_settings):
-            shm_name = f"video_frame_shm_{i}"
-            detections = cam_config.get("detections", [])
-
-            shm = create_shared_memory(shm_name, int(np.prod(FRAME_SHAPE)))
-            shared_mem_list.append(shm)
-
-            try:
-                source = int(cam_config["source"])  # directly use index
-            except (KeyError, ValueError):
-                print(f"[ERROR] Invalid camera source in config: {cam_config.get('source')}")
-                continue
-
-            processes.append(mp.Process(target=video_capture_process, args=(shm_name, FRAME_SHAPE, source, i)))
-
-            if "motion" in detections:
-                processes.append(mp.Process(target=motion_detection_process, args=(shm_name, FRAME_SHAPE, motion_queue, i,cam_config.get('motionThreshold'))))
-            if "object" in detections:
-                processes.append(mp.Process(target=object_detection_process, args=(shm_name, FRAME_SHAPE, object_queue, i,cam_config.get('objectThreshold'))))
-            if "face" in detections:
-                processes.append(mp.Process(target=face_recognition_process, args=(shm_name, FRAME_SHAPE, face_queue, i)))
-
-        # Add alert process once, not inside loop
-        processes.append(mp.Process(target=alert_process, args=(object_queue, face_queue, motion_queue)))
+def parse_args():
+    parser = argparse.ArgumentParser(description="Start the IVSS capture and detection pipeline.")
+    parser.add_argument("--mode", choices=("process", "pool"), default=os.getenv("IVSS_EXECUTION_MODE", "process"),
+                        help="process: one process per camera per detector; pool: a fixed pool of detector workers")
+    parser.add_argument("--workers", type=int, default=default_pool_workers(),
+                        help="Number of detector workers in pool mode")
+    parser.add_argument("--poll", type=float, default=float(os.getenv("IVSS_CONFIG_POLL", "2")),
+                        help="Seconds between checks for changed camera settings")
+    parser.add_argument("--remote", default=os.getenv("IVSS_REMOTE_DETECTORS", ""),
+                        help="Run detectors on detector nodes (python frame_transport.py --listen host:port), "
+                             "comma separated: object=host:port,face=host:port; repeat a detector to spread its cameras")
+    parser.add_argument("--link-encoding", choices=ENCODINGS, default=os.getenv("IVSS_LINK_ENCODING", "jpeg"),
+                        help="How frames are sent to detector nodes: jpeg (smaller) or raw (zlib, lossless)")
+    parser.add_argument("--cpu-layout", choices=LAYOUT_MODES, default=os.getenv("IVSS_CPU_LAYOUT", "on"),
+                        help="on: pin inference workers to core sets and size every process's thread pools; "
+                             "isolate: also keep the web app and capture on cores of their own; off: OS defaults")
+    parser.add_argument("--debug", default=os.getenv("IVSS_DEBUG", ""),
+                        help="Workers that log DEBUG, comma separated: roles (object, alerts), cameras (cam0), "
+                             "process names (cam0-object) or 'all'")
+    return parser.parse_args()
 
+if __name__ == "__main__":
+    startup = StartupReport("pipeline")
+    args = parse_args()
+    try:
+        remote = parse_remote_detectors(args.remote)
+    except ValueError as e:
+        log.error("%s", e)
+        sys.exit(2)
+    if remote and not node_token():
+        log.error("Set IVSS_NODE_TOKEN to the detector nodes' shared token to use --remote.")
+        sys.exit(2)
+    lock = acquire_instance_lock()
+    if lock is None:
+        log.error("Another IVSS pipeline is already running; not starting a second one.")
+        sys.exit(1)
+
+    # Stopping from the dashboard sends SIGTERM; turn it into a normal exit so cleanup runs
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    start_log_service(debug=args.debug)
+
+    # Pool workers each run one inference at a time; otherwise the scheduler's budget bounds concurrent runs
+    layout = plan_layout(args.cpu_layout, args.workers if args.mode == "pool" else default_budget())
+    if layout is not None:
+        log.info("CPU layout: %s (details in %s)", layout.summary(), LAYOUT_FILE)
+
+    with app_context():
+        startup.finish("ready")
+        # IVSS_SCHEDULER=0 disables the cross-camera inference scheduler
+        pipeline = Pipeline(args.mode, args.workers, scheduler=os.getenv("IVSS_SCHEDULER", "1") != "0",
+                            remote=remote, link_encoding=args.link_encoding, layout=layout)
         try:
-            for p in processes:
-                p.start()
-            for p in processes:
-                p.join()
+            pipeline.run(load_camera_settings, load_config_version, args.poll)
+        except KeyboardInterrupt:
+            pass
         finally:
-            print("\n[INFO] Shutting down all processes...")
-            for p in processes:
-                if p.is_alive():
-                    p.terminate()
-                    p.join()
-            for shm in shared_mem_list:
-                shm.close()
-                shm.unlink()
-            print("[INFO] Cleanup complete.")
+            pipeline.shutdown()
+            stop_log_service()
+            lock.close()
@@ -0,0 +1,268 @@
+import bisect
+import numpy as np
+import threading
+import time
+
+from shared_state import attach_shared_array, create_shared_array
+
+# 🔹 Pipeline metrics in shared memory
+#
+# Every pipeline process records counters, gauges and latency histograms into
+# one shared table (ivss_metrics_shm) created by the pipeline, and the web
+# app renders the table in Prometheus text format at /metrics. The layout is
+# fixed: each series (metric name + labels) has a precomputed row, and each
+# row has a single writer (one camera's detector, the alert process), so
+# updates are plain in-place additions with no locking or messaging. Rows
+# persist across worker restarts, so counters stay monotonic while the
+# pipeline runs. When the table does not exist (offline tools, web app
+# without a pipeline) a process-local table is used instead.
+#
+# Capture metrics are not duplicated here; /metrics reads them from each
+# camera's FRAME_META record.
+
+METRICS_SHM_NAME = "ivss_metrics_shm"
+MAX_CAMERAS = 64
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+
+METRIC_DTYPE = np.dtype([
+    ("value", "<f8"),                      # counters and gauges
+    ("set", "u1"),                         # gauges: 1 once a worker has set the value
+    ("count", "<u8"),                      # histograms: observations
+    ("sum", "<f8"),                        # histograms: sum of observed seconds
+    ("buckets", "<u8", (len(BUCKETS),)),   # histograms: observations per bucket (not cumulative)
+])
+
+# name -> (type, help)
+METRICS = {
+    "ivss_detector_frames_total": ("counter", "Views handled by a detector, including reused ones"),
+    "ivss_detector_skipped_total": ("counter", "Views answered with the previous result instead of inference"),
+    "ivss_inference_seconds": ("histogram", "Detector inference time per run"),
+    "ivss_evidence_write_seconds": ("histogram", "Time to write an evidence image"),
+    "ivss_alerts_total": ("counter", "Alerts stored"),
+    "ivss_alert_latency_seconds": ("histogram", "Frame capture to stored alert"),
+    "ivss_alert_queue_depth": ("gauge", "Detections waiting in the alert process queues and rings"),
+    "ivss_detections_dropped_total": ("counter", "Detections overwritten in their ring before the alert process read them"),
+    "ivss_link_frames_total": ("counter", "Frames sent to a remote detector"),
+    "ivss_link_frames_skipped_total": ("counter", "Frames not sent because the remote detector had not caught up"),
+    "ivss_link_sent_bytes_total": ("counter", "Bytes sent to a remote detector"),
+    "ivss_link_received_bytes_total": ("counter", "Bytes received from a remote detector"),
+    "ivss_link_rtt_seconds": ("histogram", "Frame sent to a remote detector until it was acknowledged"),
+    "ivss_model_tier": ("gauge", "Object model quality tier in use; 0 is the best (quality_ladder.py)"),
+    "ivss_model_tier_changes_total": ("counter", "Object model quality tier changes"),
+    "ivss_db_commit_seconds": ("histogram", "Alert database commit time"),
+    "ivss_mjpeg_clients": ("gauge", "Open live MJPEG streams"),
+    "ivss_mjpeg_bytes_total": ("counter", "Bytes sent to live MJPEG streams"),
+}
+DETECTOR_METRICS = ("ivss_detector_frames_total", "ivss_detector_skipped_total",
+                    "ivss_inference_seconds", "ivss_evidence_write_seconds", "ivss_detections_dropped_total",
+                    "ivss_link_frames_total", "ivss_link_frames_skipped_total", "ivss_link_sent_bytes_total",
+                    "ivss_link_received_bytes_total", "ivss_link_rtt_seconds")
+OBJECT_METRICS = ("ivss_model_tier", "ivss_model_tier_changes_total")  # object detectors only
+DETECTORS = ("motion", "object", "face")
+ALERT_TYPES = ("motion", "object", "face", "health")
+
+
+def _layout():
+    keys = []
+    for cam_id in range(MAX_CAMERAS):
+        for detector in DETECTORS:
+            names = DETECTOR_METRICS + (OBJECT_METRICS if detector == "object" else ())
+            keys += [(name, (("cam", str(cam_id)), ("detector", detector))) for name in names]
+    for alert_type in ALERT_TYPES:
+        labels = (("type", alert_type),)
+        keys += [("ivss_alerts_total", labels), ("ivss_alert_latency_seconds", labels),
+                 ("ivss_alert_queue_depth", labels)]
+    keys.append(("ivss_db_commit_seconds", ()))
+    return keys
+
+
+SERIES = _layout()
+SERIES_INDEX = {key: index for index, key in enumerate(SERIES)}
+
+
+def series_key(name, **labels):
+    return (name, tuple((label, str(labels[label])) for label in sorted(labels, key=_label_order)))
+
+
+def _label_order(label):
+    return ("cam", "detector", "type").index(label) if label in ("cam", "detector", "type") else 3
+
+
+def create_metrics_table():
+    return create_shared_array(METRICS_SHM_NAME, METRIC_DTYPE, (len(SERIES),))
+
+
+def attach_metrics_table(track=True):
+    """(shm, table) of the running pipeline. Raises FileNotFoundError if there is none."""
+    return attach_shared_array(METRICS_SHM_NAME, METRIC_DTYPE, (len(SERIES),), track)
+
+
+class Series:
+    """One row of the metrics table, updated by a single process."""
+
+    def __init__(self, row):
+        self.row = row
+
+    def inc(self, amount=1):
+        self.row["value"] += amount
+
+    def set(self, value):
+        self.row["value"] = value
+        self.row["set"] = 1
+
+    def observe(self, seconds):
+        row = self.row
+        row["count"] += 1
+        row["sum"] += seconds
+        index = bisect.bisect_left(BUCKETS, seconds)
+        if index < len(BUCKETS):
+            row["buckets"][0, index] += 1
+
+    def time(self):
+        """Context manager observing the duration of its block."""
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, series):
+        self.series = series
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.series.observe(time.perf_counter() - self.start)
+        return False
+
+
+_table = None
+_shm = None
+
+
+def _process_table():
+    global _table, _shm
+    if _table is None:
+        try:
+            _shm, _table = attach_metrics_table()
+        except FileNotFoundError:
+            _table = np.zeros(len(SERIES), dtype=METRIC_DTYPE)
+    return _table
+
+
+def series(name, **labels):
+    """
+    The Series for a metric and its labels in this process, e.g.
+    series("ivss_inference_seconds", cam=0, detector="object"). Look it up once
+    and keep it; updates are then a few numpy operations.
+    """
+    key = series_key(name, **labels)
+    index = SERIES_INDEX.get(key)
+    if index is None:
+        # Outside the fixed layout (e.g. cam_id >= MAX_CAMERAS): count into a private row
+        return Series(np.zeros(1, dtype=METRIC_DTYPE))
+    return Series(_process_table()[index:index + 1])
+
+
+def detector_series(cam_id, detector):
+    """The per-detector series: frames, skipped, inference and evidence."""
+    labels = {"cam": cam_id, "detector": detector}
+    return {
+        "frames": series("ivss_detector_frames_total", **labels),
+        "skipped": series("ivss_detector_skipped_total", **labels),
+        "inference": series("ivss_inference_seconds", **labels),
+        "evidence": series("ivss_evidence_write_seconds", **labels),
+    }
+
+
+# 🔹 Web process metrics
+#
+# The Flask app may run without a pipeline, so its own series live in this
+# process and are rendered next to the shared table. Request threads update
+# them under a lock.
+
+class LocalMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def add(self, name, amount=1, **labels):
+        key = series_key(name, **labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def items(self):
+        with self.lock:
+            return list(self.values.items())
+
+
+web_metrics = LocalMetrics()
+
+
+# 🔹 Prometheus text exposition
+
+def _labels(pairs, extra=()):
+    pairs = tuple(pairs) + tuple(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_metrics(table, capture=(), local=()):
+    """
+    Prometheus text for the shared table, per-camera capture records
+    [(cam_id, FRAME_META record)] and local [(series_key, value)] values.
+    Series that never recorded anything, and gauges no worker has set, are left out.
+    """
+    lines = []
+    written = set()
+
+    def header(name, kind, help_text):
+        if name not in written:
+            written.add(name)
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    now = time.time()
+    capture_metrics = (
+        ("ivss_capture_fps", "gauge", "Frames decoded per second", lambda r: float(r["decode_fps"])),
+        ("ivss_capture_frames_total", "counter", "Frames published to shared memory", lambda r: int(r["seq"])),
+        ("ivss_capture_frames_decoded_total", "counter", "Frames decoded", lambda r: int(r["frames_decoded"])),
+        ("ivss_capture_frames_dropped_total", "counter", "Frames decoded but overwritten before being published",
+         lambda r: int(r["frames_dropped"])),
+        ("ivss_capture_reconnects_total", "counter", "Source reconnects", lambda r: int(r["reconnects"])),
+        ("ivss_capture_connected", "gauge", "1 while the source delivers frames", lambda r: int(r["connected"])),
+        ("ivss_capture_health", "gauge", "Feed health: 0 ok, 1 blank, 2 frozen, 3 blurred, 4 moved",
+         lambda r: int(r["health"])),
+        ("ivss_capture_frame_age_seconds", "gauge", "Age of the newest frame",
+         lambda r: round(now - float(r["timestamp"]), 3) if r["seq"] else float("nan")),
+    )
+    for name, kind, help_text, value in capture_metrics:
+        for cam_id, record in capture:
+            header(name, kind, help_text)
+            lines.append(f"{name}{_labels([('cam', cam_id)])} {value(record)}")
+
+    for name, (kind, help_text) in METRICS.items():
+        for index, (series_name, labels) in enumerate(SERIES):
+            if series_name != name:
+                continue
+            row = table[index]
+            if kind == "histogram":
+                count = int(row["count"])
+                if not count:
+                    continue
+                header(name, kind, help_text)
+                cumulative = np.cumsum(row["buckets"])
+                for bound, total in zip(BUCKETS, cumulative):
+                    lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {int(total)}")
+                lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {float(row['sum']):.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+            elif row["value"] or (kind == "gauge" and row["set"]):
+                header(name, kind, help_text)
+                lines.append(f"{name}{_labels(labels)} {float(row['value']):g}")
+        for (series_name, labels), value in local:
+            if series_name == name:
+                header(name, kind, help_text)
+                lines.append(f"{name}{_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
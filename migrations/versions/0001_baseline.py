@@ -0,0 +1,70 @@
+"""Baseline schema: users, alerts and camera settings as created by db.create_all()
+
+Installs that were set up with db.create_all() already have these tables;
+mark them with `flask --app app db stamp 0001_baseline` before upgrading.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=80), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=True),
+        sa.Column('password_hash', sa.String(length=255), nullable=False),
+        sa.Column('first_name', sa.String(length=50), nullable=True),
+        sa.Column('last_name', sa.String(length=50), nullable=True),
+        sa.Column('contact', sa.String(length=20), nullable=True),
+        sa.Column('role', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('username'),
+    )
+    op.create_table(
+        'alert',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('camera', sa.String(length=50), nullable=True),
+        sa.Column('location', sa.String(length=100), nullable=True),
+        sa.Column('time', sa.String(length=100), nullable=True),
+        sa.Column('message', sa.String(length=200), nullable=True),
+        sa.Column('severity', sa.String(length=20), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('is_true_detection', sa.Boolean(), nullable=True),
+        sa.Column('reviewed_by', sa.String(length=50), nullable=True),
+        sa.Column('reviewed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'camera_settings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(length=50), nullable=False),
+        sa.Column('detections', sa.JSON(), nullable=False),
+        sa.Column('object_threshold', sa.Float(), nullable=False),
+        sa.Column('motion_threshold', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source'),
+    )
+
+
+def downgrade():
+    op.drop_table('camera_settings')
+    op.drop_table('alert')
+    op.drop_table('users')
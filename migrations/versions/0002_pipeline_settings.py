@@ -0,0 +1,75 @@
+"""Pipeline settings per camera, alert clip and model tier, config version table
+
+Adds the camera_settings columns the pipeline reads (motion, scheduling,
+skipping, clips, recording, object model), Alert.clip_path and
+Alert.model_tier, and the config_version row the pipeline polls. Existing
+camera rows get the same defaults a new camera gets.
+
+Revision ID: 0002_pipeline_settings
+Revises: 0001_baseline
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_pipeline_settings'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+# (column, type, server default) added to camera_settings, all NOT NULL
+CAMERA_COLUMNS = (
+    ('motion_width', sa.Integer(), '160'),
+    ('motion_zones', sa.JSON(), '[]'),
+    ('motion_engine', sa.String(length=20), 'mog2'),
+    ('source_pacing', sa.String(length=20), 'realtime'),
+    ('object_mode', sa.String(length=20), 'full'),
+    ('object_latency_target', sa.Float(), '1000'),
+    ('frame_width', sa.Integer(), '320'),
+    ('frame_height', sa.Integer(), '240'),
+    ('priority', sa.Float(), '1.0'),
+    ('min_fps', sa.Float(), '1.0'),
+    ('max_fps', sa.Float(), '10.0'),
+    ('skip_change_threshold', sa.Float(), '0.002'),
+    ('skip_refresh_seconds', sa.Float(), '5'),
+    ('clip_pre_seconds', sa.Float(), '5'),
+    ('clip_post_seconds', sa.Float(), '5'),
+    ('clip_fps', sa.Float(), '10'),
+    ('clip_quality', sa.Integer(), '70'),
+    ('clip_buffer_mb', sa.Float(), '16'),
+    ('record_continuous', sa.Boolean(), sa.false()),
+    ('record_segment_seconds', sa.Float(), '60'),
+    ('record_fps', sa.Float(), '5'),
+    ('record_quality', sa.Integer(), '70'),
+    ('record_retention_hours', sa.Float(), '24'),
+    ('record_quota_gb', sa.Float(), '10'),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('camera_settings') as batch_op:
+        for name, column_type, default in CAMERA_COLUMNS:
+            batch_op.add_column(sa.Column(name, column_type, nullable=False, server_default=default))
+    with op.batch_alter_table('alert') as batch_op:
+        batch_op.add_column(sa.Column('clip_path', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('model_tier', sa.String(length=30), nullable=True))
+    op.create_table(
+        'config_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade():
+    op.drop_table('config_version')
+    with op.batch_alter_table('alert') as batch_op:
+        batch_op.drop_column('model_tier')
+        batch_op.drop_column('clip_path')
+    with op.batch_alter_table('camera_settings') as batch_op:
+        for name, _, _ in reversed(CAMERA_COLUMNS):
+            batch_op.drop_column(name)
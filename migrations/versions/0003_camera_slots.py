@@ -0,0 +1,38 @@
+"""Stable camera slots
+
+Cameras used to be identified by their position in the settings list.
+Existing rows get their current position as slot, so shared memory names,
+recordings and analytics stay with the same physical camera.
+
+Revision ID: 0003_camera_slots
+Revises: 0002_pipeline_settings
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_camera_slots'
+down_revision = '0002_pipeline_settings'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('camera_settings') as batch_op:
+        batch_op.add_column(sa.Column('slot', sa.Integer(), nullable=True))
+    connection = op.get_bind()
+    ids = connection.execute(sa.text('SELECT id FROM camera_settings ORDER BY id')).scalars().all()
+    for slot, row_id in enumerate(ids):
+        connection.execute(sa.text('UPDATE camera_settings SET slot = :slot WHERE id = :id'),
+                           {'slot': slot, 'id': row_id})
+    with op.batch_alter_table('camera_settings') as batch_op:
+        batch_op.create_unique_constraint('uq_camera_settings_slot', ['slot'])
+
+
+def downgrade():
+    with op.batch_alter_table('camera_settings') as batch_op:
+        batch_op.drop_constraint('uq_camera_settings_slot', type_='unique')
+        batch_op.drop_column('slot')
@@ -0,0 +1,125 @@
+import os
+import struct
+
+# 🔹 Minimal Motion-JPEG AVI writer
+#
+# Frames are already JPEG-compressed in the recorders, so we mux the bytes
+# straight into an AVI container instead of decoding them again for
+# cv2.VideoWriter. The writer returns the byte offset of every JPEG it writes,
+# which is what the recording index uses for seeking.
+
+AVIF_HASINDEX = 0x10
+AVIIF_KEYFRAME = 0x10
+
+HEADER_SIZE = 224          # RIFF + hdrl + LIST movi header, frames start here
+MOVI_FOURCC_OFFSET = 220   # idx1 offsets are relative to the 'movi' fourcc
+AVIH_TOTAL_FRAMES_OFFSET = 48
+STRH_LENGTH_OFFSET = 140
+MOVI_SIZE_OFFSET = 216
+
+
+class MjpegAviWriter:
+    def __init__(self, path, width, height, fps):
+        self.path = path
+        self.width = int(width)
+        self.height = int(height)
+        self.fps = float(fps) if fps else 10.0
+        self.frame_count = 0
+        self.max_frame_size = 0
+        self._index = []  # (offset relative to movi, size)
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._file = open(path, "wb")
+        self._file.write(self._build_header())
+
+    def _build_header(self):
+        usec_per_frame = int(1_000_000 / self.fps)
+        avih = struct.pack(
+            "<IIIIIIIIII16x",
+            usec_per_frame, 0, 0, AVIF_HASINDEX,
+            0, 0, 1, 0, self.width, self.height,
+        )
+        strh = struct.pack(
+            "<4s4sIHHIIIIIIiIhhhh",
+            b"vids", b"MJPG", 0, 0, 0, 0,
+            1000, int(self.fps * 1000), 0, 0, 0, -1, 0,
+            0, 0, self.width, self.height,
+        )
+        strf = struct.pack(
+            "<IiiHH4sIiiII",
+            40, self.width, self.height, 1, 24, b"MJPG",
+            self.width * self.height * 3, 0, 0, 0, 0,
+        )
+        strl = b"strl" + _chunk(b"strh", strh) + _chunk(b"strf", strf)
+        hdrl = b"hdrl" + _chunk(b"avih", avih) + _chunk(b"LIST", strl)
+        header = b"RIFF" + struct.pack("<I", 0) + b"AVI " + _chunk(b"LIST", hdrl)
+        header += b"LIST" + struct.pack("<I", 4) + b"movi"
+        assert len(header) == HEADER_SIZE
+        return header
+
+    def write_frame(self, jpeg_bytes):
+        """Append one JPEG frame. Returns (data_offset, size) in the file."""
+        size = len(jpeg_bytes)
+        chunk_start = self._file.tell()
+        self._file.write(b"00dc" + struct.pack("<I", size))
+        self._file.write(jpeg_bytes)
+        if size % 2:
+            self._file.write(b"\0")
+
+        self._index.append((chunk_start - MOVI_FOURCC_OFFSET, size))
+        self.frame_count += 1
+        self.max_frame_size = max(self.max_frame_size, size)
+        return chunk_start + 8, size
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if self._file is None:
+            return
+        movi_end = self._file.tell()
+        idx1 = b"".join(
+            b"00dc" + struct.pack("<III", AVIIF_KEYFRAME, offset, size)
+            for offset, size in self._index
+        )
+        self._file.write(_chunk(b"idx1", idx1))
+        file_end = self._file.tell()
+
+        self._patch(4, file_end - 8)
+        self._patch(AVIH_TOTAL_FRAMES_OFFSET, self.frame_count)
+        self._patch(AVIH_TOTAL_FRAMES_OFFSET + 12, self.max_frame_size)
+        self._patch(STRH_LENGTH_OFFSET, self.frame_count)
+        self._patch(STRH_LENGTH_OFFSET + 4, self.max_frame_size)
+        self._patch(MOVI_SIZE_OFFSET, movi_end - MOVI_SIZE_OFFSET - 4)
+        self._file.close()
+        self._file = None
+
+    def _patch(self, offset, value):
+        self._file.seek(offset)
+        self._file.write(struct.pack("<I", value))
+        self._file.seek(0, os.SEEK_END)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _chunk(fourcc, payload):
+    data = fourcc + struct.pack("<I", len(payload)) + payload
+    if len(payload) % 2:
+        data += b"\0"
+    return data
+
+
+def read_frame_at(path, offset, size):
+    """Read one JPEG frame straight out of a recording without parsing the AVI."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
@@ -0,0 +1,206 @@
+from datetime import datetime
+from flask_login import UserMixin
+from flask_sqlalchemy import SQLAlchemy
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from metrics import MAX_CAMERAS
+
+# 🔹 Data models
+#
+# The models and the db handle live here rather than in app.py so pipeline
+# processes can use them without importing the web app. The handle is bound
+# to an application by database.init_db(): app.py binds it to the website,
+# database.app_context() to a bare app for everything else.
+
+db = SQLAlchemy()
+
+
+# ================================================================
+# DATABASE MODELS
+# ================================================================
+
+class User(UserMixin, db.Model):
+    __tablename__ = 'users'
+    
+    # id = db.Column(db.Integer, primary_key=True)
+    # username = db.Column(db.String(80), unique=True, nullable=False)
+    # email = db.Column(db.String(120), unique=True)
+    # password_hash = db.Column(db.String(255), nullable=False)
+    # role = db.Column(db.String(20), nullable=False, default='moderator')
+    # created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # is_active = db.Column(db.Boolean, default=True)
+
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=True, info={'unique_constraint_name': 'uq_users_email'})
+    password_hash = db.Column(db.String(255), nullable=False)
+    first_name = db.Column(db.String(50), nullable=True)
+    last_name = db.Column(db.String(50), nullable=True)
+    contact = db.Column(db.String(20), nullable=True)
+    role = db.Column(db.String(20), nullable=False, default='moderator')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_active = db.Column(db.Boolean, default=True)
+
+
+    def set_password(self, password):
+        """Hash and set password"""
+        self.password_hash = generate_password_hash(password)
+
+    def check_password(self, password):
+        """Check if provided password matches hash"""
+        return check_password_hash(self.password_hash, password)
+
+    def is_admin(self):
+        """Check if user is admin"""
+        return self.role == 'admin'
+
+    def is_moderator(self):
+        """Check if user is moderator or admin"""
+        return self.role in ['admin', 'moderator']
+
+    def __repr__(self):
+        return f'<User {self.username}>'
+
+
+# Updated Alert Model
+class Alert(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    camera = db.Column(db.String(50))
+    location = db.Column(db.String(100))
+    time = db.Column(db.String(100))
+    message = db.Column(db.String(200))
+    severity = db.Column(db.String(20))
+    status = db.Column(db.String(20), default='New')  # New, Acknowledged, Resolved
+    is_true_detection = db.Column(db.Boolean, default=None)  # True, False, or None (unreviewed)
+    reviewed_by = db.Column(db.String(50))
+    reviewed_at = db.Column(db.DateTime)
+    clip_path = db.Column(db.String(255))  # Pre/post-event clip written by the clip recorder
+    model_tier = db.Column(db.String(30))  # Object model and input size that made the detection, e.g. yolo11s@480
+
+
+class CameraSetting(db.Model):
+    __tablename__ = 'camera_settings'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(50), unique=True, nullable=False)
+    # Stable camera id (shared memory, recordings, analytics, metric labels); see assign_camera_slots()
+    slot = db.Column(db.Integer, unique=True)
+    detections = db.Column(db.JSON, nullable=False)
+    object_threshold = db.Column(db.Float, nullable=False, default=0.5)
+    motion_threshold = db.Column(db.Integer, nullable=False, default=30)
+    # Motion: width of the downscaled gray frame and polygon include/exclude zones (see motion_zones.py)
+    motion_width = db.Column(db.Integer, nullable=False, default=160)
+    motion_zones = db.Column(db.JSON, nullable=False, default=list)
+    motion_engine = db.Column(db.String(20), nullable=False, default='mog2')  # mog2 or blockdiff
+    source_pacing = db.Column(db.String(20), nullable=False, default='realtime')  # File sources: realtime or fast
+    object_mode = db.Column(db.String(20), nullable=False, default='full')  # full or tiled (motion-region tiles)
+    object_latency_target = db.Column(db.Float, nullable=False, default=1000)  # ms; 0 always uses the best model
+    frame_width = db.Column(db.Integer, nullable=False, default=320)  # Capture resolution in shared memory
+    frame_height = db.Column(db.Integer, nullable=False, default=240)
+    # Inference scheduling: share of the global budget and guaranteed/capped detector FPS
+    priority = db.Column(db.Float, nullable=False, default=1.0)
+    min_fps = db.Column(db.Float, nullable=False, default=1.0)
+    max_fps = db.Column(db.Float, nullable=False, default=10.0)
+    # Near-duplicate skipping: changed fraction below which results are reused, and the forced refresh
+    skip_change_threshold = db.Column(db.Float, nullable=False, default=0.002)  # 0 disables skipping
+    skip_refresh_seconds = db.Column(db.Float, nullable=False, default=5)
+    # Pre/post-event clip recording
+    clip_pre_seconds = db.Column(db.Float, nullable=False, default=5)
+    clip_post_seconds = db.Column(db.Float, nullable=False, default=5)
+    clip_fps = db.Column(db.Float, nullable=False, default=10)
+    clip_quality = db.Column(db.Integer, nullable=False, default=70)
+    clip_buffer_mb = db.Column(db.Float, nullable=False, default=16)  # 0 disables clips
+    # Continuous segmented recording
+    record_continuous = db.Column(db.Boolean, nullable=False, default=False)
+    record_segment_seconds = db.Column(db.Float, nullable=False, default=60)
+    record_fps = db.Column(db.Float, nullable=False, default=5)
+    record_quality = db.Column(db.Integer, nullable=False, default=70)
+    record_retention_hours = db.Column(db.Float, nullable=False, default=24)
+    record_quota_gb = db.Column(db.Float, nullable=False, default=10)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # JSON key -> column name, shared by to_dict() and apply_dict()
+    FIELDS = {
+        'detections': 'detections',
+        'objectThreshold': 'object_threshold',
+        'motionThreshold': 'motion_threshold',
+        'motionWidth': 'motion_width',
+        'motionZones': 'motion_zones',
+        'motionEngine': 'motion_engine',
+        'objectMode': 'object_mode',
+        'objectLatencyTarget': 'object_latency_target',
+        'sourcePacing': 'source_pacing',
+        'frameWidth': 'frame_width',
+        'frameHeight': 'frame_height',
+        'priority': 'priority',
+        'minFps': 'min_fps',
+        'maxFps': 'max_fps',
+        'skipChangeThreshold': 'skip_change_threshold',
+        'skipRefreshSeconds': 'skip_refresh_seconds',
+        'clipPreSeconds': 'clip_pre_seconds',
+        'clipPostSeconds': 'clip_post_seconds',
+        'clipFps': 'clip_fps',
+        'clipQuality': 'clip_quality',
+        'clipBufferMb': 'clip_buffer_mb',
+        'recordContinuous': 'record_continuous',
+        'recordSegmentSeconds': 'record_segment_seconds',
+        'recordFps': 'record_fps',
+        'recordQuality': 'record_quality',
+        'recordRetentionHours': 'record_retention_hours',
+        'recordQuotaGb': 'record_quota_gb',
+    }
+
+    def to_dict(self):
+        """Convert model to dictionary for JSON serialization"""
+        data = {'source': self.source, 'slot': self.slot}
+        for key, column in self.FIELDS.items():
+            data[key] = getattr(self, column)
+        return data
+
+    def apply_dict(self, data):
+        """Update columns from a JSON dictionary, leaving missing keys untouched"""
+        for key, column in self.FIELDS.items():
+            if key in data and data[key] is not None:
+                setattr(self, column, data[key])
+
+    def __repr__(self):
+        return f'<CameraSetting {self.source}>'
+
+class ConfigVersion(db.Model):
+    """Single row bumped on every camera settings change; the running pipeline polls it to reload."""
+    __tablename__ = 'config_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+def assign_camera_slots():
+    """
+    Give each new camera a slot no other camera holds. A camera keeps its slot
+    for life, so removing or reordering cameras never renumbers the others.
+    Slots of removed cameras (and their recordings and analytics) are only
+    handed out again once the MAX_CAMERAS metric slots are used up.
+    """
+    settings = CameraSetting.query.order_by(CameraSetting.id).all()
+    used = {setting.slot for setting in settings if setting.slot is not None}
+    for setting in settings:
+        if setting.slot is None:
+            slot = max(used, default=-1) + 1
+            if slot >= MAX_CAMERAS:
+                slot = min(set(range(MAX_CAMERAS + len(settings))) - used)
+            setting.slot = slot
+            used.add(slot)
+
+def bump_config_version():
+    """Mark the camera settings as changed. Commit together with the settings change."""
+    assign_camera_slots()
+    row = ConfigVersion.query.get(1)
+    if row is None:
+        row = ConfigVersion(id=1, version=0)
+        db.session.add(row)
+    row.version += 1
+
+def get_config_version():
+    row = ConfigVersion.query.get(1)
+    return row.version if row else 0
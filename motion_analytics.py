@@ -0,0 +1,138 @@
+import cv2
+import numpy as np
+import os
+import time
+
+# 🔹 Motion heatmaps and activity timelines
+#
+# The motion detector feeds every foreground mask into MotionAnalytics, which
+# keeps a low-resolution, exponentially decayed heatmap of where motion
+# happens and per-minute counts of when it happens. Both are written to
+# analytics/cam{N}/ at intervals:
+#   heatmap.npy   float32 grid, decayed to the file's modification time
+#   activity.bin  append-only ACTIVITY_DTYPE records, one per finished minute
+# The web app reads these files directly, so nothing is recomputed from footage.
+
+ANALYTICS_FOLDER = "analytics"
+HEATMAP_WIDTH = 64
+HEATMAP_HALF_LIFE = 6 * 3600  # seconds for old activity to fade to half
+PERSIST_INTERVAL = 60         # seconds between heatmap writes
+
+ACTIVITY_DTYPE = np.dtype([
+    ("minute", "<i8"),          # epoch seconds at the start of the minute
+    ("frames", "<u4"),          # motion views analysed
+    ("motion_frames", "<u4"),   # views with motion in at least one zone
+    ("activity", "<f4"),        # mean moving fraction of the view
+])
+
+
+def camera_analytics_dir(cam_id):
+    return os.path.join(ANALYTICS_FOLDER, f"cam{cam_id}")
+
+
+def heatmap_shape(view_shape):
+    height, width = view_shape[:2]
+    grid_w = min(HEATMAP_WIDTH, width)
+    return (max(int(round(height * grid_w / width)), 1), grid_w)
+
+
+def decay_factor(seconds):
+    return 0.5 ** (max(seconds, 0.0) / HEATMAP_HALF_LIFE)
+
+
+class MotionAnalytics:
+    """Incremental heatmap and per-minute activity for one camera."""
+
+    def __init__(self, cam_id, view_shape):
+        self.dir = camera_analytics_dir(cam_id)
+        os.makedirs(self.dir, exist_ok=True)
+        self.heatmap_path = os.path.join(self.dir, "heatmap.npy")
+        self.activity_path = os.path.join(self.dir, "activity.bin")
+
+        self.shape = heatmap_shape(view_shape)
+        self.heat = load_heatmap(cam_id)
+        if self.heat is None or self.heat.shape != self.shape:
+            self.heat = np.zeros(self.shape, dtype=np.float32)
+
+        self.last_update = time.time()
+        self.last_persist = self.last_update
+        self.minute = None
+        self.bucket = np.zeros(1, dtype=ACTIVITY_DTYPE)
+
+    def update(self, fg_mask, motion, activity, timestamp=None):
+        """Fold one foreground mask into the heatmap and the current minute's counts."""
+        now = timestamp or time.time()
+        # Downscaling the 0/255 mask with INTER_AREA gives the moving fraction of each cell
+        small = cv2.resize(fg_mask, (self.shape[1], self.shape[0]), interpolation=cv2.INTER_AREA)
+        self.heat *= decay_factor(now - self.last_update)
+        self.heat += small * np.float32(1.0 / 255.0)
+        self.last_update = now
+
+        minute = int(now // 60) * 60
+        if minute != self.minute:
+            self._close_minute()
+            self.minute = minute
+        record = self.bucket[0]
+        record["frames"] += 1
+        record["motion_frames"] += bool(motion)
+        record["activity"] += activity
+
+        if now - self.last_persist >= PERSIST_INTERVAL:
+            self.persist()
+
+    def _close_minute(self):
+        record = self.bucket[0]
+        if self.minute is not None and record["frames"]:
+            record["minute"] = self.minute
+            record["activity"] /= record["frames"]
+            with open(self.activity_path, "ab") as f:
+                f.write(self.bucket.tobytes())
+        self.bucket[0] = np.zeros((), dtype=ACTIVITY_DTYPE)
+
+    def persist(self):
+        tmp_path = self.heatmap_path + ".tmp.npy"
+        np.save(tmp_path, self.heat)
+        os.replace(tmp_path, self.heatmap_path)
+        os.utime(self.heatmap_path, (self.last_update, self.last_update))
+        self.last_persist = time.time()
+
+    def close(self):
+        self._close_minute()
+        self.persist()
+
+
+def load_heatmap(cam_id, now=None):
+    """The camera's heatmap decayed to now, or None if nothing was recorded yet."""
+    path = os.path.join(camera_analytics_dir(cam_id), "heatmap.npy")
+    try:
+        heat = np.load(path)
+        saved_at = os.path.getmtime(path)
+    except (OSError, ValueError):
+        return None
+    return heat.astype(np.float32) * decay_factor((now or time.time()) - saved_at)
+
+
+def load_activity(cam_id, since=0):
+    """Per-minute activity records at or after since (epoch seconds)."""
+    path = os.path.join(camera_analytics_dir(cam_id), "activity.bin")
+    try:
+        raw = np.fromfile(path, dtype=np.uint8)
+    except OSError:
+        return np.zeros(0, dtype=ACTIVITY_DTYPE)
+    # Ignore a record that is still being appended
+    usable = len(raw) - len(raw) % ACTIVITY_DTYPE.itemsize
+    records = raw[:usable].view(ACTIVITY_DTYPE)
+    return records[records["minute"] >= since]
+
+
+def heatmap_overlay(heat, size):
+    """Colour a heatmap into a BGRA image of size (width, height) whose alpha follows the heat."""
+    peak = float(heat.max()) if heat is not None and heat.size else 0.0
+    if peak <= 0:
+        return np.zeros((size[1], size[0], 4), dtype=np.uint8)
+    norm = np.sqrt(heat / peak)  # sqrt keeps quieter areas visible next to hot spots
+    norm = cv2.resize(norm, size, interpolation=cv2.INTER_LINEAR)
+    level = np.clip(norm * 255, 0, 255).astype(np.uint8)
+    overlay = cv2.cvtColor(cv2.applyColorMap(level, cv2.COLORMAP_JET), cv2.COLOR_BGR2BGRA)
+    overlay[..., 3] = np.clip(level.astype(np.float32) * 0.8, 0, 255).astype(np.uint8)
+    return overlay
@@ -1,40 +1,165 @@
 import cv2
 import numpy as np
-from multiprocessing import shared_memory
 import os
 import time
 
-def motion_detection_process(shm_name, shape, motion_queue, cam_id,varThreshold):
-    shared_mem = shared_memory.SharedMemory(name=shm_name)
-    frame_buffer = np.ndarray(shape, dtype=np.uint8, buffer=shared_mem.buf)
-    bg_subtractor = cv2.createBackgroundSubtractorMOG2(history=50, varThreshold=varThreshold)
-    
-    while True:
-        frame = frame_buffer.copy()
+from block_motion import BlockDiffSubtractor
+from detection_ring import DetectionRing, detection_record
+from frame_views import ViewReader
+from metrics import detector_series
+from motion_analytics import MotionAnalytics
+from motion_zones import MotionZones
+from shared_state import FRAME_META_DTYPE, apply_config_updates, attach_shared_array, frame_meta_name, open_shared_memory
+from startup_report import StartupReport
+from structured_log import get_logger
+
+log = get_logger("motion")
+
+MOTION_SCORE_THRESHOLD = 100  # foreground pixels needed to call it motion on a 320x240 frame
+MOTION_VIEW = {"name": "motion", "mode": "gray", "width": 160, "keep_blank": True}  # dark scenes still move
+MOTION_ENGINES = ("mog2", "blockdiff")  # blockdiff: block-average differencing for low-power nodes
+MOTION_HISTORY = 50  # frames the background model adapts over; zones ignore the first ones while it settles
+
+def motion_view(cam_config):
+    """Motion view spec for a camera; motionWidth sets how far frames are downscaled before MOG2."""
+    width = (cam_config or {}).get("motionWidth") or MOTION_VIEW["width"]
+    return dict(MOTION_VIEW, width=int(width))
+
+def create_motion_detector(varThreshold, engine="mog2"):
+    if engine == "blockdiff":
+        return BlockDiffSubtractor(varThreshold)
+    return cv2.createBackgroundSubtractorMOG2(history=MOTION_HISTORY, varThreshold=varThreshold)
+
+def compute_motion_score(bg_subtractor, frame):
+    """Returns (motion_score, fg_mask) for one BGR frame or an already gray view."""
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    fg_mask = bg_subtractor.apply(gray)
+    return cv2.countNonZero(fg_mask), fg_mask
+
+class MotionScorer:
+    """
+    A camera's background model and motion zones. MOG2 calls the whole first
+    view foreground, so zone triggers are ignored until the model has seen
+    MOTION_HISTORY views; otherwise every start or engine change would raise a
+    full-view alert and hold the zones active over real motion that follows.
+    """
+
+    def __init__(self, varThreshold, engine, zones, view_shape):
+        self.view_shape = view_shape
+        self.engine = engine
+        self.zone_config = zones
+        self.bg_subtractor = create_motion_detector(varThreshold, engine)
+        self.zones = MotionZones(zones, view_shape)
+        self.seen = 0
+
+    @property
+    def settled(self):
+        return self.seen > MOTION_HISTORY
 
-        # ✅ Ensure the frame is valid before processing
-        if frame is None or frame.size == 0:
-            print(f"[ERROR] Camera {cam_id}: Invalid frame received.")
-            continue
+    def update(self, view):
+        """(fg_mask, scores, triggered) for one gray view; nothing triggers while the model settles."""
+        fg_mask = self.bg_subtractor.apply(view)
+        self.seen += 1
+        if not self.settled:
+            return fg_mask, np.zeros(len(self.zones.names), dtype=np.float32), []
+        scores, _, triggered = self.zones.update(fg_mask)
+        return fg_mask, scores, triggered
 
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        fg_mask = bg_subtractor.apply(gray)
-        motion_score = cv2.countNonZero(fg_mask)
+    def reconfigure(self, varThreshold, engine, zones):
+        """Apply changed settings, keeping the background model and zone episodes where they still hold."""
+        if engine != self.engine:
+            self.engine = engine
+            self.bg_subtractor = create_motion_detector(varThreshold, engine)
+            self.seen = 0
+        elif engine == "blockdiff":
+            self.bg_subtractor.set_var_threshold(varThreshold)
+        elif varThreshold:
+            self.bg_subtractor.setVarThreshold(varThreshold)
+        if zones != self.zone_config:
+            self.zone_config = zones
+            self.zones = MotionZones(zones, self.view_shape)
 
-        if motion_score > 100:  # Adjust threshold if needed
-            image_path = save_motion_frame(frame, cam_id)
+
+class MotionDetector:
+    """
+    Per-camera motion state (view reader, background model, zones, activity). step()
+    handles at most one new view so the same object can run in its own process
+    or be multiplexed with other cameras inside a pool worker.
+    """
+
+    def __init__(self, shm_name, shape, ring_name, cam_id, varThreshold, zones=None, view_spec=MOTION_VIEW, engine="mog2"):
+        self.cam_id = cam_id
+        self.output = DetectionRing(ring_name)
+        self.shared_mem = open_shared_memory(shm_name)
+        self.frame_buffer = np.ndarray(shape, dtype=np.uint8, buffer=self.shared_mem.buf)
+        self.view_reader = ViewReader(cam_id, view_spec, shape)
+        self.motion = MotionScorer(varThreshold, engine, zones, self.view_reader.shape)
+        self.analytics = MotionAnalytics(cam_id, self.view_reader.shape)
+        # Activity is shared with the inference scheduler through the camera's metadata record
+        self.meta_shm, self.frame_meta = attach_shared_array(frame_meta_name(cam_id), FRAME_META_DTYPE)
+        self.activity = 0.0
+        self.metrics = detector_series(cam_id, "motion")
+
+    def step(self):
+        """Process one new view. Returns False when there was nothing to do."""
+        latest = self.view_reader.read()
+        if latest is None:
+            return False
+        gray, timestamp = latest
+        self.metrics["frames"].inc()
+
+        started = time.perf_counter()
+        fg_mask, scores, triggered = self.motion.update(gray)
+        self.metrics["inference"].observe(time.perf_counter() - started)
+        if not self.motion.settled:
+            return True
+        zones = self.motion.zones
+        moving = zones.activity(fg_mask)
+        self.activity = 0.9 * self.activity + 0.1 * moving
+        self.frame_meta["activity"] = self.activity
+        self.analytics.update(fg_mask, zones.active.any(), moving, timestamp)
+
+        if triggered:
+            motion_score = int(max(scores[zones.names.index(name)] for name in triggered))
+            # Evidence is saved from the full-resolution frame
+            with self.metrics["evidence"].time():
+                image_path = save_motion_frame(self.frame_buffer.copy(), self.cam_id)
 
             if image_path:
-                alert_data = {
-                    "cam_id": cam_id,
-                    "message": f"Motion detected with score {motion_score}",
-                    "severity": "medium",
-                    "detection_type": "motion",
-                    "image_path": image_path
-                }
-                motion_queue.put(alert_data)
+                label = "" if zones.whole_frame else ", ".join(triggered)
+                self.output.write(detection_record(self.cam_id, "motion", timestamp, self.view_reader.last_seq,
+                                                   label=label, confidence=motion_score, image=image_path))
+            else:
+                log.error("Camera %s: Failed to save motion frame.", self.cam_id,
+                          extra={"key": f"motion-save-failed:{self.cam_id}"})
+        return True
+
+    def reconfigure(self, cam_config):
+        """Apply changed threshold, engine or zones in place, keeping the background model where possible."""
+        self.motion.reconfigure(cam_config.get("motionThreshold"), cam_config.get("motionEngine") or "mog2",
+                                cam_config.get("motionZones"))
+
+    def close(self):
+        self.analytics.close()
+        self.output.close()
+        del self.frame_buffer, self.frame_meta
+        self.view_reader.close()
+        self.meta_shm.close()
+        self.shared_mem.close()
+
+def motion_detection_process(shm_name, shape, ring_name, cam_id,varThreshold, zones=None, view_spec=MOTION_VIEW, engine="mog2", control_queue=None):
+    startup = StartupReport("motion", cam_id)
+    detector = MotionDetector(shm_name, shape, ring_name, cam_id, varThreshold, zones, view_spec, engine)
+    try:
+        while True:
+            apply_config_updates(control_queue, detector)
+            if detector.step():
+                startup.finish()
             else:
-                print(f"[ERROR] Camera {cam_id}: Failed to save motion frame.")
+                time.sleep(0.005)
+    finally:
+        # Persist the heatmap and the current minute's activity
+        detector.close()
 
 # 🔹 Save Motion Frame with Timestamp and Folder
 def save_motion_frame(frame, cam_id):
@@ -44,10 +169,10 @@ def save_motion_frame(frame, cam_id):
     
     cv2.imwrite(image_path, frame)
     if os.path.exists(image_path) and os.path.getsize(image_path) > 0:
-        print(f"[INFO] Motion frame saved: {image_path}")
+        log.info("Motion frame saved: %s", image_path, extra={"key": f"motion-saved:{cam_id}", "cam_id": cam_id})
         return image_path
     else:
-        print(f"[ERROR] Failed to save motion image for Camera {cam_id}.")
+        log.error("Failed to save motion image for Camera %s.", cam_id, extra={"key": f"motion-save-failed:{cam_id}"})
         return None
 
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+
+# 🔹 Per-camera motion zones
+#
+# Zones are stored with the camera settings (CameraSetting.motion_zones) as
+#   {"name": "driveway", "type": "include", "points": [[0.1, 0.5], [0.9, 0.5], [0.9, 1.0], [0.1, 1.0]],
+#    "threshold": 0.02}
+# Points are normalised (0..1) image coordinates, so zones survive changes of
+# capture or motion resolution. "exclude" zones (trees, roads, timestamps)
+# are removed from the foreground mask before anything is scored. Each
+# include zone triggers when the fraction of its pixels in motion reaches
+# its threshold and is released only once the fraction drops below
+# threshold * HYSTERESIS_RATIO, so flickering motion does not re-trigger.
+
+DEFAULT_ZONE_THRESHOLD = 100 / (320 * 240)  # the old 100-pixel rule at 320x240
+HYSTERESIS_RATIO = 0.5
+
+
+def polygon_mask(points, view_shape):
+    """Rasterise normalised polygon points into a boolean mask of view_shape."""
+    height, width = view_shape[:2]
+    mask = np.zeros((height, width), dtype=np.uint8)
+    pts = np.array([[x * (width - 1), y * (height - 1)] for x, y in points], dtype=np.float32)
+    if len(pts) >= 3:
+        cv2.fillPoly(mask, [np.round(pts).astype(np.int32)], 1)
+    return mask.astype(bool)
+
+
+class MotionZones:
+    """Precomputed zone masks for one camera's motion view, plus each zone's trigger state."""
+
+    def __init__(self, zones, view_shape):
+        zones = zones or []
+        height, width = view_shape[:2]
+
+        self.allowed = np.ones((height, width), dtype=bool)
+        for zone in zones:
+            if zone.get("type") == "exclude":
+                self.allowed &= ~polygon_mask(zone.get("points", []), view_shape)
+
+        include = [z for z in zones if z.get("type", "include") == "include"]
+        self.whole_frame = not include
+        if not include:
+            include = [{"name": "full", "points": [[0, 0], [1, 0], [1, 1], [0, 1]]}]
+
+        self.names = [z.get("name") or f"zone{n}" for n, z in enumerate(include)]
+        masks = [polygon_mask(z.get("points", []), view_shape) & self.allowed for z in include]
+        # One row per zone, so all zone scores come out of a single matrix-vector product
+        self.matrix = np.stack([m.ravel() for m in masks]).astype(np.float32)
+        self.areas = np.maximum(self.matrix.sum(axis=1), 1.0)
+        self.on_thresholds = np.array([float(z.get("threshold") or DEFAULT_ZONE_THRESHOLD) for z in include],
+                                      dtype=np.float32)
+        self.off_thresholds = self.on_thresholds * HYSTERESIS_RATIO
+        self.active = np.zeros(len(include), dtype=bool)
+        self.allowed_pixels = max(int(self.allowed.sum()), 1)
+
+    def update(self, fg_mask):
+        """
+        Score a foreground mask (non-zero = motion). Returns (scores, fractions,
+        triggered) where scores are moving pixels per zone, fractions are scores
+        over zone area and triggered lists the zones that just became active.
+        """
+        moving = (fg_mask > 0) & self.allowed
+        scores = self.matrix @ moving.ravel().astype(np.float32)
+        fractions = scores / self.areas
+
+        rising = ~self.active & (fractions >= self.on_thresholds)
+        falling = self.active & (fractions < self.off_thresholds)
+        self.active = (self.active | rising) & ~falling
+        triggered = [self.names[i] for i in np.flatnonzero(rising)]
+        return scores, fractions, triggered
+
+    def activity(self, fg_mask):
+        """Fraction of the non-excluded view that is moving."""
+        return np.count_nonzero((fg_mask > 0) & self.allowed) / self.allowed_pixels
@@ -1,96 +1,289 @@
 import cv2
-from ultralytics import YOLO
-from multiprocessing import shared_memory
+import logging
 import numpy as np
 import time
 import os
 
-def object_detection_process(shm_name, shape, output_queue, cam_id,objectThreshold):
+from frame_views import ViewReader, letterbox_params, unletterbox_box
+from detection_ring import DetectionRing, detection_record
+from detection_overlay import OverlayWriter
+from change_gate import ChangeGate, reuse_settings
+from inference_scheduler import SchedulerClient
+from metrics import detector_series, series
+from tiled_inference import TiledInference, result_detections, tiling_useful
+from quality_ladder import MAX_VIEW_SIZE, QualityLadder, tier_name, tier_settings
+from shared_state import apply_config_updates
+from startup_report import StartupReport
+from structured_log import get_logger
+
+log = get_logger("object")
+
+OBJECT_MODEL = "yolo11m.pt"
+OBJECT_IMGSZ = 320
+# The full-resolution frame is published with the view, for tiles and evidence images
+OBJECT_VIEW = {"name": "object", "mode": "letterbox", "size": MAX_VIEW_SIZE, "frame": True}
+
+
+def object_view(frame_shape):
     """
-    Continuously reads frames from shared memory, runs YOLO object detection,
-    and outputs detections via the output_queue. Also draws bounding boxes and
-    saves the processed frame with object label in filename.
+    The letterboxed YOLO view for a camera: OBJECT_VIEW, shrunk to the frame's
+    long side (a multiple of 32) for smaller frames so they are never upscaled.
     """
-    shm = shared_memory.SharedMemory(name=shm_name)
-    frame_buffer = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    long_side = max(frame_shape[:2])
+    return dict(OBJECT_VIEW, size=max(min(OBJECT_VIEW["size"], long_side // 32 * 32), 32))
 
-    # model = YOLO('best.pt')
-    model = YOLO("yolo11m.pt")
+def load_object_model(weights=OBJECT_MODEL):
+    # ultralytics pulls in torch; import it only in processes that actually run YOLO
+    from ultralytics import YOLO
+    return YOLO(weights)
 
-    while True:
-        time.sleep(0.01)
+def parse_results(model, results):
+    """Turn YOLO results into one list of {label, confidence, bbox} dicts per input frame."""
+    all_objects = []
+    for result in results:
+        boxes = result.boxes.cpu().numpy()
+        objects = []
+        for box in boxes:
+            x1, y1, x2, y2 = box.xyxy[0].astype(int)
+            objects.append({
+                "label": model.names[int(box.cls[0])],
+                "confidence": float(box.conf[0]),
+                "bbox": (x1, y1, x2, y2)
+            })
+        all_objects.append(objects)
+    return all_objects
 
-        frame = np.copy(frame_buffer)
+def detect_objects(model, frames, objectThreshold, imgsz=OBJECT_IMGSZ, device=None):
+    """Run YOLO on a batch of BGR frames. Returns one detection list per frame."""
+    kwargs = {"imgsz": imgsz, "verbose": False, "conf": objectThreshold}
+    if device:
+        kwargs["device"] = device
+    results = model.predict(list(frames), **kwargs)
+    return parse_results(model, results)
 
-        if frame is None or frame.shape != shape or np.all(frame == 0):
-            print(f"[ERROR] Camera {cam_id}: Invalid or empty frame. Saving for inspection...")
+class ObjectDetector:
+    """
+    Per-camera YOLO state. Loaded models can be shared (models, weights -> YOLO)
+    so that a pool worker serving several cameras loads each only once. The
+    model and input size follow the camera's quality tier (see
+    quality_ladder.py). step() handles at most one
+    new view and never blocks on the scheduler. Views that barely changed since
+    the last YOLO run reuse its detections (see change_gate.py). In "tiled"
+    mode, native-resolution tiles around motion are batched with the view
+    (see tiled_inference.py).
+    """
 
-            os.makedirs("invalid_frames", exist_ok=True)
-            timestamp = time.strftime("%Y%m%d_%H%M%S")
-            invalid_path = os.path.join("invalid_frames", f"invalid_cam{cam_id}_{timestamp}.jpg")
-            try:
-                cv2.imwrite(invalid_path, frame)
-                print(f"[INFO] Invalid frame saved to: {invalid_path}")
-            except Exception as e:
-                print(f"[ERROR] Failed to save invalid frame: {e}")
-            continue
+    def __init__(self, shm_name, shape, ring_name, cam_id, objectThreshold, sched=None, models=None, reuse=None,
+                 mode="full", latency_target=None):
+        self.cam_id = cam_id
+        self.output = DetectionRing(ring_name)
+        self.overlay = OverlayWriter(cam_id, "object")
+        self.objectThreshold = objectThreshold
+        self.view_reader = ViewReader(cam_id, object_view(shape), shape)
+        self.size = self.view_reader.spec["size"]
+        self.params = letterbox_params(shape, self.size)
+        self.shape = shape
+        self.tiler = None
+        self.set_mode(mode)
 
-        print(f"[DEBUG] Camera {cam_id}: Frame mean pixel value: {frame.mean():.2f}")
+        # model = YOLO('best.pt')
+        self.models = models if models is not None else {}
+        self.ladder = QualityLadder(latency_target, self.size)
+        self.tier_model()  # the top tier's weights are loaded up front
+        self.scheduler = SchedulerClient(*sched) if sched else None
+        self.pending = None  # view waiting for a scheduler grant
+        self.pending_time = 0.0  # its capture timestamp
+        self.pending_frame = None  # the full-resolution frame it was computed from
+        self.gate = ChangeGate(cam_id, "object", reuse)
+        self.metrics = detector_series(cam_id, "object")
+        self.metrics["tier"] = series("ivss_model_tier", cam=cam_id, detector="object")
+        self.metrics["tier_changes"] = series("ivss_model_tier_changes_total", cam=cam_id, detector="object")
+        self.metrics["tier"].set(0)
+        self.last_result = None  # detections of the last YOLO run, reused for unchanged views
 
-        try:
-            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        except Exception as e:
-            print(f"[ERROR] Camera {cam_id}: Failed to convert color space: {e}")
-            continue
+    def step(self):
+        """Process one new view. Returns False when there was nothing to do (or no grant yet)."""
+        cam_id = self.cam_id
+        if self.pending is None:
+            latest = self.view_reader.read()
+            if latest is None:
+                return False
+            view, timestamp = latest
+            self.metrics["frames"].inc()
 
+            # Blank and frozen frames never get here: the preprocess health check flags them (frame_health.py)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Camera %s: Frame mean pixel value: %.2f", cam_id, view.mean())
+            if self.tiler is not None:
+                self.tiler.observe(self.view_reader.frame)
+            # Small moving objects may not move the gate's thumbnail, so tiled mode never skips on motion
+            if (self.tiler is None or not self.tiler.moving) and self.gate.unchanged(view):
+                self.reuse_result(timestamp)
+                return True
+            self.pending, self.pending_time, self.pending_frame = view, timestamp, self.view_reader.frame
+
+        if self.scheduler is not None:
+            if not self.scheduler.try_turn():
+                return False
+            # Run on the newest view published while we were queued
+            newer = self.view_reader.read()
+            if newer is not None:
+                self.metrics["frames"].inc()
+                self.pending, self.pending_time = newer
+                self.pending_frame = self.view_reader.frame
+
+        view, self.pending = self.pending, None
+        full_frame, self.pending_frame = self.pending_frame, None
+        model, imgsz = self.tier_model()
+        tier = self.ladder.tier
+        cpu_start = time.process_time()
+        started = time.perf_counter()
         try:
-            # print(frame)
-            results = model.predict(frame, imgsz=320, verbose=False,conf=objectThreshold)
+            if self.tiler is not None:
+                detected_objects = self.tiler.detect(model, view, full_frame, self.params, self.objectThreshold)
+            else:
+                # Lower tiers let YOLO scale the letterboxed view down to their size
+                results = model.predict(view, imgsz=imgsz, verbose=False,conf=self.objectThreshold)
+                detected_objects = []
+                for result in results:
+                    detected_objects += result_detections(model, result,
+                                                          lambda xyxy: unletterbox_box(xyxy, self.params))
         except Exception as e:
-            print(f"[ERROR] YOLO prediction failed for camera {cam_id}: {e}")
-            continue
+            log.error("YOLO prediction failed for camera %s: %s", cam_id, e,
+                      extra={"key": f"predict-failed:{cam_id}", "cam_id": cam_id})
+            return True
+        finally:
+            if self.scheduler is not None:
+                self.scheduler.finish()
+        elapsed = time.perf_counter() - started
+        self.metrics["inference"].observe(elapsed)
+        self.gate.inferred(view, time.process_time() - cpu_start)
+        if self.ladder.observe(elapsed):
+            self.tier_changed(tier)
+
+        # Boxes are drawn on the full-resolution frame the view was computed from
+        frame = full_frame.copy() if detected_objects else None
+        filepath = None
+        for obj in detected_objects:
+            x1, y1, x2, y2 = obj["bbox"]
+            label, confidence = obj["label"], obj["confidence"]
+
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(frame, f"{label}: {confidence:.2f}", (x1, y1 - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
 
-        detected_objects = []
-        for result in results:
+            # 🔻 Save frame with label in filename
+            os.makedirs("objects_detected", exist_ok=True)
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            filename = f"detected_cam{cam_id}_{label}_{timestamp}.jpg"
+            filepath = os.path.join("objects_detected", filename)
             try:
-                boxes = result.boxes.cpu().numpy()
+                with self.metrics["evidence"].time():
+                    cv2.imwrite(filepath, frame)
+                log.info("Saved detected object: %s", filepath, extra={"key": f"object-saved:{cam_id}", "cam_id": cam_id})
             except Exception as e:
-                print(f"[ERROR] Camera {cam_id}: Failed to get bounding boxes: {e}")
-                continue
+                log.error("Failed to save detection image: %s", e, extra={"key": f"object-save-failed:{cam_id}"})
+                filepath = None
+
+        self.last_result = None
+        if detected_objects:
+            self.last_result = np.stack([
+                detection_record(cam_id, "object", self.pending_time, self.view_reader.last_seq, label=obj["label"],
+                                 bbox=obj["bbox"], confidence=obj["confidence"], class_id=obj.get("class_id", -1),
+                                 image=filepath, tier=tier)
+                for obj in detected_objects])
+            self.output.write(self.last_result)
+        self.overlay.publish(self.last_result, self.pending_time)
+        return True
 
-            for box in boxes:
+    def reuse_result(self, timestamp):
+        """Answer an unchanged view with the last detections; no image is saved again."""
+        self.metrics["skipped"].inc()
+        records = None
+        if self.last_result is not None:
+            records = self.last_result.copy()
+            records["frame_time"], records["seq"], records["reused"] = timestamp, self.view_reader.last_seq, 1
+            self.output.write(records)
+        self.overlay.publish(records, timestamp)
+        if self.scheduler is not None:
+            self.scheduler.report_reuse(self.gate)
+
+    def tier_model(self):
+        """(model, imgsz) of the current tier, loading its weights on first use."""
+        while True:
+            weights, imgsz = tier_settings(self.ladder.tier, self.size)
+            if weights not in self.models:
                 try:
-                    x1, y1, x2, y2 = box.xyxy[0].astype(int)
-                    label = model.names[int(box.cls[0])]
-                    confidence = float(box.conf[0])
+                    self.models[weights] = load_object_model(weights)
                 except Exception as e:
-                    print(f"[ERROR] Camera {cam_id}: Error parsing bounding box: {e}")
+                    if self.ladder.tier == 0:
+                        raise
+                    log.error("Camera %s: cannot load %s, tier %s disabled: %s", self.cam_id, weights,
+                              tier_name(self.ladder.tier, self.size), e, extra={"cam_id": self.cam_id})
+                    self.ladder.disable(self.ladder.tier)
                     continue
+            return self.models[weights], imgsz
 
-                detected_objects.append({
-                    "label": label,
-                    "confidence": confidence,
-                    "bbox": (x1, y1, x2, y2)
-                })
-
-                # Draw bounding box
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(frame, f"{label}: {confidence:.2f}", (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-                # 🔻 Save frame with label in filename
-                os.makedirs("objects_detected", exist_ok=True)
-                timestamp = time.strftime("%Y%m%d_%H%M%S")
-                filename = f"detected_cam{cam_id}_{label}_{timestamp}.jpg"
-                filepath = os.path.join("objects_detected", filename)
-                try:
-                    cv2.imwrite(filepath, frame)
-                    print(f"[INFO] Saved detected object: {filepath}")
-                except Exception as e:
-                    print(f"[ERROR] Failed to save detection image: {e}")
+    def tier_changed(self, previous):
+        tier = self.ladder.tier
+        log.info("Camera %s: object model %s -> %s (smoothed latency %.0f ms, target %.0f ms)", self.cam_id,
+                 tier_name(previous, self.size), tier_name(tier, self.size), 1000 * self.ladder.measured[previous][0],
+                 1000 * self.ladder.target, extra={"cam_id": self.cam_id})
+        self.metrics["tier"].set(tier)
+        self.metrics["tier_changes"].inc()
+        self.gate.invalidate()  # cached detections came from the previous model
 
-        if detected_objects:
-            output_queue.put({"cam_id": cam_id, "detections": detected_objects})
+    def reconfigure(self, cam_config):
+        """Confidence threshold and skip settings take effect on the next view; the model is kept."""
+        threshold = cam_config.get("objectThreshold") or self.objectThreshold
+        if threshold != self.objectThreshold:
+            self.gate.invalidate()  # cached detections were filtered with the old threshold
+        self.objectThreshold = threshold
+        self.gate.configure(reuse_settings(cam_config))
+        previous = self.ladder.tier
+        self.ladder.configure(cam_config.get("objectLatencyTarget"))
+        if self.ladder.tier != previous:
+            self.tier_changed(previous)
+        if (cam_config.get("objectMode") or "full") != self.mode:
+            self.set_mode(cam_config.get("objectMode") or "full")
+            self.gate.invalidate()
+
+    def set_mode(self, mode):
+        """full: letterboxed view only; tiled: view plus motion tiles, when the frame is larger than the view."""
+        self.mode = mode
+        if mode == "tiled" and tiling_useful(self.shape, self.size):
+            self.tiler = TiledInference(self.shape, self.size)
+        else:
+            if mode == "tiled":
+                log.info("Camera %s: frame is no larger than the %spx view; tiling has no effect", self.cam_id, self.size)
+            self.tiler = None
+
+    def close(self):
+        self.view_reader.close()
+        self.output.close()
+        self.overlay.close()
+        if self.scheduler is not None:
+            self.scheduler.close()
+
+def object_detection_process(shm_name, shape, ring_name, cam_id,objectThreshold, sched=None, control_queue=None, reuse=None,
+                             mode="full", latency_target=None):
+    """
+    Continuously reads the letterboxed YOLO view from shared memory, runs YOLO
+    object detection, and writes detections to the camera's detection ring. Boxes are
+    mapped back to frame coordinates and drawn on the full-resolution frame,
+    which is saved with the object label in the filename.
+    """
+    startup = StartupReport("object", cam_id)
+    with startup.measure("model_load"):
+        models = {OBJECT_MODEL: load_object_model()}
+    detector = ObjectDetector(shm_name, shape, ring_name, cam_id, objectThreshold, sched, models=models, reuse=reuse,
+                              mode=mode, latency_target=latency_target)
+    while True:
+        apply_config_updates(control_queue, detector)
+        if detector.step():
+            startup.finish()
+        else:
+            time.sleep(0.005)
 
 if __name__ == "__main__":
     print("Run main.py to start the system.")
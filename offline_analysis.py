@@ -0,0 +1,337 @@
+"""
+Offline bulk analysis of archived video.
+
+Runs the same motion / object / face stages as the live pipeline over every
+video file in a directory, spread across a process pool, and writes
+detections to JSON-lines files and alerts to the Alert table.
+
+    python offline_analysis.py /path/to/videos --workers 4 --stride 5 --batch 8
+
+Progress is checkpointed per file, so re-running the same command after an
+interruption resumes where it stopped.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mkv", ".mov", ".m4v", ".mpg", ".mpeg", ".ts", ".webm"}
+ANALYSIS_SHAPE = (240, 320, 3)  # same frame size the live pipeline works on
+CHECKPOINT_EVERY = 500          # processed frames between checkpoints
+ALERT_INTERVAL = 10             # seconds of video between alerts of the same type
+STAGES = ("decode", "motion", "object", "face")
+
+# Per-worker state, created once by init_worker
+_worker = {}
+
+
+def find_videos(video_dir):
+    videos = []
+    for root, dirs, files in os.walk(video_dir):
+        for file in files:
+            if os.path.splitext(file)[1].lower() in VIDEO_EXTENSIONS:
+                videos.append(os.path.join(root, file))
+    return sorted(videos)
+
+
+def output_name(video_dir, video_path):
+    rel = os.path.relpath(video_path, video_dir)
+    return rel.replace(os.sep, "__")
+
+
+def init_worker(options):
+    # Keep every worker on a single core's worth of threads; the pool is the parallelism
+    cv2.setNumThreads(1)
+    _worker["options"] = options
+    _worker["model"] = None
+    if "object" in options["detections"]:
+        from object_detection import load_object_model
+        _worker["model"] = load_object_model(options["model"])
+
+
+def analyze_file(task):
+    """Process one video file from its last checkpoint. Runs inside a pool worker."""
+    from frame_views import compute_view, view_shape
+    from motion_detection import MotionScorer, motion_view
+
+    video_path, out_base = task
+    options = _worker["options"]
+    detections = options["detections"]
+    stride = options["stride"]
+    timings = dict.fromkeys(STAGES, 0.0)
+
+    part_path = out_base + ".jsonl.part"
+    checkpoint_path = out_base + ".checkpoint.json"
+    checkpoint = {"frame": 0, "bytes": 0, "processed": 0, "alerts": []}
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+    if checkpoint["bytes"] is None and os.path.exists(out_base + ".jsonl"):
+        # Finished before an interruption, only the completion marker is missing
+        return {"video": video_path, "frames": checkpoint["frame"], "processed": 0,
+                "duration": 0.0, "timings": timings, "alerts": checkpoint["alerts"]}
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return {"video": video_path, "error": "could not open file"}
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    start_time = datetime.fromtimestamp(os.path.getmtime(video_path))
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    # The file's mtime is when recording ended; use it to put detections on the wall clock
+    if frame_count:
+        start_time -= timedelta(seconds=frame_count / fps)
+
+    frame_index = checkpoint["frame"]
+    if frame_index:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+
+    out = open(part_path, "a+b")
+    out.truncate(checkpoint["bytes"])
+    out.seek(checkpoint["bytes"])
+
+    alerts = checkpoint["alerts"]
+    last_alert = {}
+    for alert in alerts:
+        last_alert[alert["detection_type"]] = alert["video_time"]
+
+    motion = None
+    if "motion" in detections:
+        # Same view, engine and zones as the live motion detector, so a file scores like the camera did
+        motion_spec = motion_view({"motionWidth": options["motion_width"]})
+        motion_frame = np.empty(view_shape(motion_spec, ANALYSIS_SHAPE), dtype=np.uint8)
+        motion = MotionScorer(options["motion_threshold"], options["motion_engine"], options["motion_zones"],
+                              motion_frame.shape)
+    processed = checkpoint["processed"]
+    batch = []
+
+    def emit(record):
+        out.write((json.dumps(record) + "\n").encode("utf-8"))
+
+    def maybe_alert(detection_type, video_time, message, severity):
+        if video_time - last_alert.get(detection_type, -ALERT_INTERVAL) < ALERT_INTERVAL:
+            return
+        last_alert[detection_type] = video_time
+        alerts.append({
+            "detection_type": detection_type,
+            "video_time": video_time,
+            "time": (start_time + timedelta(seconds=video_time)).strftime("%Y-%m-%d %H:%M:%S"),
+            "message": message,
+            "severity": severity,
+        })
+
+    def record(detection_type, index, **fields):
+        video_time = round(index / fps, 3)
+        emit({"source_file": video_path, "frame": index, "video_time": video_time,
+              "detection_type": detection_type, **fields})
+        return video_time
+
+    def flush_batch():
+        if not batch:
+            return
+        if _worker["model"] is not None:
+            from object_detection import detect_objects
+            start = time.perf_counter()
+            results = detect_objects(_worker["model"], [f for _, f in batch],
+                                     options["object_threshold"], device=options["device"])
+            timings["object"] += time.perf_counter() - start
+            for (index, _), objects in zip(batch, results):
+                for obj in objects:
+                    video_time = record("object", index, label=obj["label"],
+                                        confidence=round(obj["confidence"], 3),
+                                        bbox=[int(v) for v in obj["bbox"]])
+                    maybe_alert("object", video_time, f"Object detected: {obj['label']}", "high")
+        batch.clear()
+
+    try:
+        while True:
+            start = time.perf_counter()
+            # Skip strided frames with grab(), which avoids the decode cost
+            skipped = 0
+            while skipped < stride - 1 and cap.grab():
+                skipped += 1
+            frame_index += skipped
+            ret, frame = cap.read()
+            timings["decode"] += time.perf_counter() - start
+            if not ret:
+                break
+            index = frame_index
+            frame_index += 1
+            if frame.shape != ANALYSIS_SHAPE:
+                frame = cv2.resize(frame, (ANALYSIS_SHAPE[1], ANALYSIS_SHAPE[0]), interpolation=cv2.INTER_AREA)
+
+            if motion is not None:
+                start = time.perf_counter()
+                compute_view(motion_spec, frame, out=motion_frame)
+                _, scores, triggered = motion.update(motion_frame)
+                timings["motion"] += time.perf_counter() - start
+                if triggered:
+                    motion_score = int(max(scores[motion.zones.names.index(name)] for name in triggered))
+                    fields = {} if motion.zones.whole_frame else {"zones": triggered}
+                    video_time = record("motion", index, score=motion_score, **fields)
+                    maybe_alert("motion", video_time, f"Motion detected with score {motion_score}", "medium")
+
+            if "object" in detections:
+                batch.append((index, frame))
+                if len(batch) >= options["batch"]:
+                    flush_batch()
+
+            if "face" in detections and processed % options["face_stride"] == 0:
+                from face_recognition_module import recognize_faces
+                start = time.perf_counter()
+                faces = recognize_faces(frame)
+                timings["face"] += time.perf_counter() - start
+                for name, bbox in faces:
+                    video_time = record("face", index, name=name, bbox=[int(v) for v in bbox])
+                    maybe_alert("face", video_time, f"Face detected: {name}", "high")
+
+            processed += 1
+            if processed % CHECKPOINT_EVERY == 0:
+                flush_batch()
+                out.flush()
+                save_checkpoint(checkpoint_path, frame_index, out.tell(), processed, alerts)
+        flush_batch()
+    finally:
+        cap.release()
+        out.close()
+
+    os.replace(part_path, out_base + ".jsonl")
+    save_checkpoint(checkpoint_path, frame_index, None, processed, alerts)
+    return {
+        "video": video_path,
+        "frames": frame_index,
+        "processed": processed - checkpoint["processed"],
+        "duration": frame_index / fps,
+        "timings": timings,
+        "alerts": alerts,
+    }
+
+
+def save_checkpoint(path, frame, byte_offset, processed, alerts):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"frame": frame, "bytes": byte_offset, "processed": processed, "alerts": alerts}, f)
+    os.replace(tmp_path, path)
+
+
+# 🔹 Store Alerts for a Finished File
+def store_file_alerts(video_path, alerts):
+    from database import app_context
+    from models import db, Alert
+
+    with app_context():
+        for alert in alerts:
+            db.session.add(Alert(
+                camera=f"File {os.path.basename(video_path)}",
+                location=f"Offline {alert['detection_type'].capitalize()} Detection",
+                time=alert["time"],
+                message=f"{alert['message']} at {alert['video_time']:.1f}s",
+                severity=alert["severity"],
+                status='New',
+                is_true_detection=None
+            ))
+        db.session.commit()
+
+
+def load_zones(path):
+    """Motion zones from a JSON file in the camera settings' motionZones format, or None for the whole frame."""
+    if not path:
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_done(done_path):
+    if os.path.exists(done_path):
+        with open(done_path) as f:
+            return set(json.load(f))
+    return set()
+
+
+def run(args):
+    videos = find_videos(args.video_dir)
+    os.makedirs(args.output, exist_ok=True)
+    done_path = os.path.join(args.output, "completed.json")
+    done = load_done(done_path)
+    tasks = [(v, os.path.join(args.output, output_name(args.video_dir, v)))
+             for v in videos if v not in done]
+    print(f"[INFO] {len(videos)} video(s) found, {len(videos) - len(tasks)} already analysed, "
+          f"{len(tasks)} to go with {args.workers} worker(s)")
+    if not tasks:
+        return
+
+    options = {
+        "detections": set(args.detections.split(",")),
+        "stride": max(args.stride, 1),
+        "face_stride": max(args.face_stride, 1),
+        "batch": max(args.batch, 1),
+        "object_threshold": args.object_threshold,
+        "motion_threshold": args.motion_threshold,
+        "motion_engine": args.motion_engine,
+        "motion_width": args.motion_width,
+        "motion_zones": load_zones(args.motion_zones),
+        "model": args.model,
+        "device": args.device,
+    }
+
+    totals = dict.fromkeys(STAGES, 0.0)
+    frames = processed = 0
+    video_seconds = 0.0
+    wall_start = time.time()
+
+    with mp.Pool(args.workers, initializer=init_worker, initargs=(options,)) as pool:
+        for result in pool.imap_unordered(analyze_file, tasks):
+            if "error" in result:
+                print(f"[ERROR] {result['video']}: {result['error']}")
+                continue
+            if not args.no_db and result["alerts"]:
+                store_file_alerts(result["video"], result["alerts"])
+            done.add(result["video"])
+            with open(done_path, "w") as f:
+                json.dump(sorted(done), f)
+
+            frames += result["frames"]
+            processed += result["processed"]
+            video_seconds += result["duration"]
+            for stage in STAGES:
+                totals[stage] += result["timings"][stage]
+            elapsed = time.time() - wall_start
+            print(f"[INFO] Done {result['video']}: {len(result['alerts'])} alert(s), "
+                  f"{processed / elapsed:.1f} analysed frames/s overall")
+
+    elapsed = time.time() - wall_start
+    print("\n[INFO] Offline analysis complete")
+    print(f"  wall time        : {elapsed:.1f}s")
+    print(f"  video analysed   : {video_seconds:.1f}s ({video_seconds / max(elapsed, 1e-6):.1f}x real time)")
+    print(f"  frames           : {frames} in files, {processed} analysed ({processed / max(elapsed, 1e-6):.1f}/s)")
+    for stage in STAGES:
+        per_frame = 1000 * totals[stage] / max(processed, 1)
+        print(f"  {stage:<17}: {totals[stage]:.1f}s worker time ({per_frame:.2f} ms/frame)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run IVSS detection over archived video files.")
+    parser.add_argument("video_dir", help="Directory searched recursively for video files")
+    parser.add_argument("--output", default="offline_results", help="Where detections and checkpoints are written")
+    parser.add_argument("--workers", type=int, default=max(mp.cpu_count() - 1, 1))
+    parser.add_argument("--detections", default="motion,object,face", help="Comma-separated stages to run")
+    parser.add_argument("--stride", type=int, default=5, help="Analyse every Nth frame")
+    parser.add_argument("--face-stride", type=int, default=2, help="Run faces on every Nth analysed frame")
+    parser.add_argument("--batch", type=int, default=8, help="Frames per YOLO batch")
+    parser.add_argument("--object-threshold", type=float, default=0.5)
+    parser.add_argument("--motion-threshold", type=int, default=30)
+    parser.add_argument("--motion-engine", choices=("mog2", "blockdiff"), default="mog2")
+    parser.add_argument("--motion-width", type=int, help="Width of the gray view motion runs on (default 160)")
+    parser.add_argument("--motion-zones", help="JSON file of motion zones, as saved in a camera's motionZones")
+    parser.add_argument("--model", default="yolo11m.pt")
+    parser.add_argument("--device", default="cpu", help="Torch device for YOLO (cpu, 0, ...)")
+    parser.add_argument("--no-db", action="store_true", help="Only write JSON-lines exports")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
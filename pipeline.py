@@ -0,0 +1,470 @@
+import multiprocessing as mp
+import numpy as np
+import time
+
+from video_capture import video_capture_process, parse_source
+from shared_state import (FRAME_META_DTYPE, camera_frame_shape, cameras_by_id, create_shared_array,
+                          create_shared_memory, frame_meta_name)
+from frame_views import create_view_buffers, preprocess_process
+from motion_detection import motion_detection_process, motion_view
+from object_detection import object_detection_process, object_view
+from face_recognition_module import face_recognition_process, FACE_VIEW
+from alert_module import alert_process
+from detection_ring import create_detection_ring, detection_ring_name
+from detection_overlay import create_detection_overlay
+from frame_transport import frame_link_process
+from inference_scheduler import (SCHEDULED_DETECTORS, SCHEDULER_CAPACITY, allocate_slot, create_scheduler_table,
+                                 inference_scheduler_process, release_slot, slot_settings, update_slot)
+from worker_pool import TASK_COST, detector_pool_process, detector_task, pick_worker
+from clip_recorder import clip_recorder_process, clip_settings
+from segment_recorder import segment_recorder_process, recording_settings
+from change_gate import reuse_settings
+from cpu_layout import apply_placement, process_kind
+from metrics import create_metrics_table
+from structured_log import get_logger, run_logged, worker_log_config
+from worker_profiler import ProfileWatcher, create_profile_table
+
+# 🔹 Capture / detection pipeline with live reconfiguration
+#
+# The pipeline owns every worker process and shared-memory segment. When the
+# camera settings change, reconcile() compares them camera by camera with
+# what is running and touches only what changed:
+#   source / resolution / pacing / motion width  -> the camera is restarted
+#   detections                                   -> detectors started or stopped
+#   clip or recording settings                   -> that recorder is restarted
+#   priority / min / max FPS                     -> scheduler slot updated in place
+#   thresholds / motion zones / motion engine /
+#   frame skipping / object tiling mode          -> sent to the running detector
+# so models are never reloaded for a threshold change. Detectors listed in
+# remote run on detector nodes behind a frame link (frame_transport.py)
+# instead of a local process or pool worker.
+
+log = get_logger("pipeline")
+#
+# A detector worker that dies is restarted on the next check: its scheduler
+# slot is released first, so a grant it held when it died goes back to the
+# budget. One that dies RESTART_LIMIT times within RESTART_WINDOW is left
+# stopped and its camera marked failed until its settings change.
+
+DETECTORS = ("motion", "object", "face")
+CAMERA_KEYS = ("source", "frameWidth", "frameHeight", "sourcePacing", "motionWidth")
+REUSE_KEYS = ("skipChangeThreshold", "skipRefreshSeconds")
+DETECTOR_KEYS = {"motion": ("motionThreshold", "motionZones", "motionEngine"),
+                 "object": ("objectThreshold", "objectMode", "objectLatencyTarget") + REUSE_KEYS, "face": REUSE_KEYS}
+STOP_TIMEOUT = 5  # seconds a worker gets to exit before it is killed
+RESTART_LIMIT = 3      # restarts of one detector within RESTART_WINDOW before its camera is marked failed
+RESTART_WINDOW = 600   # seconds
+
+
+def stage_views(cam_config):
+    """Input view each detector reads, computed once per frame by the preprocess process."""
+    return {"motion": motion_view(cam_config), "object": object_view(camera_frame_shape(cam_config)),
+            "face": FACE_VIEW}
+
+
+def changed(old, new, keys):
+    return any(old.get(key) != new.get(key) for key in keys)
+
+
+def worker_main(name, log_config, target, args, placement=None):
+    """Entry point of every pipeline process: CPU placement, logging, the on-demand profiler, then the worker itself."""
+    if placement is not None:
+        apply_placement(placement)
+    ProfileWatcher(name).start()
+    run_logged(log_config, target, args)
+
+
+def start_worker(name, target, args, placement=None):
+    process = mp.Process(target=worker_main, args=(name, worker_log_config(name), target, args, placement),
+                         name=name)
+    process.start()
+    return process
+
+
+def stop_process(process):
+    if process.is_alive():
+        process.terminate()
+        process.join(STOP_TIMEOUT)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+
+def release_shared_memory(handles):
+    for shm in handles:
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class Camera:
+    """Processes, shared memory and scheduler slots belonging to one camera."""
+
+    def __init__(self, cam_id, cam_config, layout=None):
+        self.cam_id = cam_id
+        self.layout = layout     # CpuLayout, or None to leave placement to the OS
+        self.config = cam_config
+        self.shm_name = f"video_frame_shm_{cam_id}"
+        self.frame_shape = camera_frame_shape(cam_config)
+        self.views = stage_views(cam_config)
+        self.failed = False
+        self.handles = []        # frame buffer, metadata and detection overlay
+        self.view_handles = {}   # detector -> its view's shared memory
+        self.processes = {}      # role -> Process
+        self.controls = {}       # detector -> control queue (process mode)
+        self.pool_workers = {}   # detector -> pool worker index (pool mode)
+        self.links = {}          # detector -> detector node address (remote detectors)
+        self.slots = {}          # detector -> scheduler slot
+        self.rings = {}          # detector -> its detection ring's shared memory
+        self.running = set()     # detectors currently running
+        self.clip_queue = None
+
+    def detectors(self):
+        detections = self.config.get("detections") or []
+        return [d for d in DETECTORS if d in detections]
+
+    def start(self, role, target, args, kind=None):
+        name = f"cam{self.cam_id}-{role}"
+        placement = self.layout.assign(name, kind or process_kind(role)) if self.layout else None
+        self.processes[role] = start_worker(name, target, args, placement)
+
+    def stop(self, role):
+        process = self.processes.pop(role, None)
+        if process is not None:
+            stop_process(process)
+            if self.layout:
+                self.layout.release(process.name)
+
+
+class Pipeline:
+    def __init__(self, mode="process", workers=1, scheduler=True, remote=None, link_encoding="jpeg", layout=None):
+        self.mode = mode
+        self.layout = layout
+        self.remote = remote or {}  # detector -> detector node addresses
+        self.remote_loads = {address: 0 for addresses in self.remote.values() for address in addresses}
+        self.link_encoding = link_encoding
+        self.queues = {"health": mp.Queue()}
+        self.cameras = {}
+        self.processes = {}  # pipeline-wide workers: scheduler, alerts, pool workers
+        self.shared = []
+        self.actions = []
+        self.alert_state = None
+        self.reported_exits = set()
+        self.restarts = {}  # detector worker name -> times it was restarted
+        # Every process records into one metrics table, rendered by the web app at /metrics
+        shm, _ = create_metrics_table()
+        self.shared.append(shm)
+        # Profile requests from the diagnostics page, picked up by each worker's ProfileWatcher
+        shm, _ = create_profile_table()
+        self.shared.append(shm)
+
+        self.table = None
+        if scheduler:
+            # Object and face runs are granted by one scheduler across all cameras
+            shm, self.table = create_scheduler_table()
+            self.shared.append(shm)
+            self._start("scheduler", inference_scheduler_process, (SCHEDULER_CAPACITY,))
+
+        self.pool_controls = []
+        self.pool_loads = []
+        if mode == "pool":
+            for w in range(max(workers, 1)):
+                control = mp.Queue()
+                self.pool_controls.append(control)
+                self.pool_loads.append(0)
+                self._start(f"pool{w}", detector_pool_process, (w, [], control))
+
+    def _start(self, name, target, args):
+        placement = self.layout.assign(name, process_kind(name)) if self.layout else None
+        self.processes[name] = start_worker(name, target, args, placement)
+
+    # 🔹 Reconciliation
+
+    def reconcile(self, camera_settings):
+        """Bring the running workers in line with camera_settings. Returns the actions taken."""
+        self.actions = []
+        wanted = cameras_by_id(camera_settings)
+        for cam_id in sorted(set(self.cameras) - set(wanted)):
+            self.stop_camera(cam_id)
+        for cam_id, cam_config in wanted.items():
+            cam = self.cameras.get(cam_id)
+            if cam is None:
+                self.start_camera(cam_id, cam_config)
+            elif cam_config != cam.config:
+                self.update_camera(cam, cam_config)
+        self.sync_alerts()
+        if self.layout:
+            self.layout.write_report()
+        return self.actions
+
+    def start_camera(self, cam_id, cam_config):
+        cam = Camera(cam_id, cam_config, self.layout)
+        self.cameras[cam_id] = cam
+        try:
+            source, _ = parse_source(cam_config["source"])  # device index, video file or stream URL
+        except (KeyError, ValueError):
+            log.error("Invalid camera source in config: %s", cam_config.get("source"), extra={"cam_id": cam_id})
+            cam.failed = True
+            return
+
+        shm = create_shared_memory(cam.shm_name, int(np.prod(cam.frame_shape)))
+        meta_shm, _ = create_shared_array(frame_meta_name(cam_id), FRAME_META_DTYPE)
+        cam.handles = [shm, meta_shm, create_detection_overlay(cam_id)]
+
+        pacing = cam_config.get("sourcePacing") or "realtime"
+        cam.start("capture", video_capture_process, (cam.shm_name, cam.frame_shape, source, cam_id, pacing))
+        for detector in self.local_detectors(cam):
+            cam.view_handles[detector] = create_view_buffers(cam_id, [cam.views[detector]], cam.frame_shape)
+        self.start_preprocess(cam)
+        self.start_clip_recorder(cam)
+        self.start_segment_recorder(cam)
+        for detector in cam.detectors():
+            self.start_detector(cam, detector)
+        self.actions.append(f"camera {cam_id} started")
+
+    def stop_camera(self, cam_id):
+        cam = self.cameras.pop(cam_id)
+        for detector in list(cam.running):
+            self.stop_detector(cam, detector)
+        for role in list(cam.processes):
+            cam.stop(role)
+        release_shared_memory(cam.handles)
+        for handles in cam.view_handles.values():
+            release_shared_memory(handles)
+        self.actions.append(f"camera {cam_id} stopped")
+
+    def update_camera(self, cam, cam_config):
+        old = cam.config
+        if cam.failed or changed(old, cam_config, CAMERA_KEYS):
+            self.stop_camera(cam.cam_id)
+            self.start_camera(cam.cam_id, cam_config)
+            return
+
+        cam.config = cam_config
+        wanted = set(cam.detectors())
+        removed, added = cam.running - wanted, wanted - cam.running
+        for detector in removed:
+            self.stop_detector(cam, detector)
+            release_shared_memory(cam.view_handles.pop(detector, []))
+        for detector in added - set(self.remote):
+            cam.view_handles[detector] = create_view_buffers(cam.cam_id, [cam.views[detector]], cam.frame_shape)
+        if removed or added:
+            cam.stop("preprocess")
+            self.start_preprocess(cam)
+        for detector in added:
+            self.start_detector(cam, detector)
+
+        if clip_settings(old) != clip_settings(cam_config):
+            cam.stop("clip")
+            cam.clip_queue = None
+            self.start_clip_recorder(cam)
+            self.actions.append(f"camera {cam.cam_id} clip recorder restarted")
+        if recording_settings(old) != recording_settings(cam_config):
+            cam.stop("record")
+            self.start_segment_recorder(cam)
+            self.actions.append(f"camera {cam.cam_id} segment recorder restarted")
+        if self.table is not None and slot_settings(old) != slot_settings(cam_config):
+            for index in cam.slots.values():
+                update_slot(self.table, index, cam_config)
+            self.actions.append(f"camera {cam.cam_id} scheduling updated")
+        for detector in cam.running - added:
+            if changed(old, cam_config, DETECTOR_KEYS.get(detector, ())):
+                self.update_detector(cam, detector)
+
+    def local_detectors(self, cam):
+        """The camera's detectors that read views from this host's shared memory."""
+        return [d for d in cam.detectors() if d not in self.remote]
+
+    def start_preprocess(self, cam):
+        # Runs without detectors too: it is also the camera's frame health check
+        view_specs = [cam.views[d] for d in self.local_detectors(cam)]
+        cam.start("preprocess", preprocess_process,
+                  (cam.shm_name, cam.frame_shape, cam.cam_id, view_specs, self.queues["health"]))
+
+    def start_clip_recorder(self, cam):
+        if clip_settings(cam.config)["buffer_mb"] > 0:
+            cam.clip_queue = mp.Queue()
+            cam.start("clip", clip_recorder_process, (cam.shm_name, cam.frame_shape, cam.clip_queue, cam.cam_id, cam.config))
+
+    def start_segment_recorder(self, cam):
+        if recording_settings(cam.config)["enabled"]:
+            cam.start("record", segment_recorder_process, (cam.shm_name, cam.frame_shape, cam.cam_id, cam.config))
+
+    def start_detector(self, cam, detector):
+        cfg = cam.config
+        sched = None
+        # The scheduler shares out this host's CPU; remote detectors run on their node's
+        if self.table is not None and detector in SCHEDULED_DETECTORS and detector not in self.remote:
+            index = allocate_slot(self.table, cam.cam_id, detector, cfg)
+            if index is None:
+                log.error("Scheduler table full; Camera %s %s runs unscheduled", cam.cam_id, detector,
+                          extra={"cam_id": cam.cam_id})
+            else:
+                cam.slots[detector] = index
+                sched = (index, len(self.table))
+
+        cam.rings[detector] = create_detection_ring(cam.cam_id, detector)
+        ring_name = detection_ring_name(cam.cam_id, detector)
+        cam.running.add(detector)
+        self.actions.append(f"camera {cam.cam_id} {detector} started")
+        if detector in self.remote:
+            address = min(self.remote[detector], key=lambda a: self.remote_loads[a])
+            self.remote_loads[address] += TASK_COST.get(detector, 1)
+            cam.links[detector] = address
+            control = mp.Queue()
+            cam.controls[detector] = control
+            cam.start(detector, frame_link_process,
+                      (cam.shm_name, cam.frame_shape, cam.cam_id, detector, address, ring_name, cfg,
+                       self.link_encoding, control), kind="light")
+            return
+        if self.mode == "pool":
+            worker = pick_worker(self.pool_loads, detector)
+            cam.pool_workers[detector] = worker
+            task = detector_task(cam.cam_id, detector, cam.shm_name, cam.frame_shape, cfg, cam.views[detector], sched)
+            self.pool_controls[worker].put(("add", task))
+            return
+
+        control = mp.Queue()
+        cam.controls[detector] = control
+        if detector == "motion":
+            cam.start(detector, motion_detection_process,
+                      (cam.shm_name, cam.frame_shape, ring_name, cam.cam_id, cfg.get('motionThreshold'),
+                       cfg.get('motionZones'), cam.views["motion"], cfg.get('motionEngine') or "mog2", control))
+        elif detector == "object":
+            cam.start(detector, object_detection_process,
+                      (cam.shm_name, cam.frame_shape, ring_name, cam.cam_id, cfg.get('objectThreshold'),
+                       sched, control, reuse_settings(cfg), cfg.get('objectMode') or "full",
+                       cfg.get('objectLatencyTarget')))
+        elif detector == "face":
+            cam.start(detector, face_recognition_process,
+                      (cam.shm_name, cam.frame_shape, ring_name, cam.cam_id, sched, control,
+                       reuse_settings(cfg)))
+
+    def stop_detector(self, cam, detector):
+        cam.running.discard(detector)
+        if detector in cam.pool_workers:
+            worker = cam.pool_workers.pop(detector)
+            self.pool_controls[worker].put(("remove", cam.cam_id, detector))
+            self.pool_loads[worker] -= TASK_COST.get(detector, 1)
+        else:
+            cam.stop(detector)
+            cam.controls.pop(detector, None)
+        if detector in cam.links:
+            self.remote_loads[cam.links.pop(detector)] -= TASK_COST.get(detector, 1)
+        if detector in cam.slots:
+            release_slot(self.table, cam.slots.pop(detector))
+        if detector in cam.rings:
+            release_shared_memory([cam.rings.pop(detector)])
+            self.alert_state = None  # a new ring may reuse the old one's id(); the alert process must reattach
+        self.actions.append(f"camera {cam.cam_id} {detector} stopped")
+
+    def update_detector(self, cam, detector):
+        message = ("update", cam.cam_id, cam.config, detector)
+        if detector in cam.pool_workers:
+            self.pool_controls[cam.pool_workers[detector]].put(message)
+        elif detector in cam.controls:
+            cam.controls[detector].put(message)
+        self.actions.append(f"camera {cam.cam_id} {detector} reconfigured")
+
+    def restart_pool_worker(self, worker, process):
+        """Replace a dead pool worker and restart the tasks it was running."""
+        log.error("Worker %s exited with code %s", process.name, process.exitcode)
+        tasks = [(cam, detector) for cam in self.cameras.values()
+                 for detector, index in cam.pool_workers.items() if index == worker]
+        for cam, detector in tasks:
+            self.stop_detector(cam, detector)
+        if self.layout:
+            self.layout.release(process.name)
+        control = mp.Queue()
+        self.pool_controls[worker] = control
+        self.pool_loads[worker] = 0
+        self._start(process.name, detector_pool_process, (worker, [], control))
+        self.actions.append(f"{process.name} restarted")
+        for cam, detector in tasks:
+            self.restart_detector(cam, detector)
+
+    def restart_detector(self, cam, detector):
+        """Start a detector again after its worker died, or mark the camera failed if it keeps dying."""
+        name = f"cam{cam.cam_id}-{detector}"
+        now = time.time()
+        recent = [t for t in self.restarts.get(name, []) if now - t < RESTART_WINDOW]
+        if len(recent) >= RESTART_LIMIT:
+            cam.failed = True
+            self.restarts.pop(name, None)
+            log.error("Camera %s %s exited %s times in %ss; camera marked failed until its settings change",
+                      cam.cam_id, detector, RESTART_LIMIT, RESTART_WINDOW, extra={"cam_id": cam.cam_id})
+            return
+        self.restarts[name] = recent + [now]
+        self.start_detector(cam, detector)
+
+    def sync_alerts(self):
+        """(Re)start the alert process when the cameras, their detection rings or their clip queues changed."""
+        state = {cam_id: (tuple((d, id(shm)) for d, shm in cam.rings.items()), id(cam.clip_queue))
+                 for cam_id, cam in self.cameras.items()}
+        if state == self.alert_state:
+            return
+        self.alert_state = state
+        if "alerts" in self.processes:
+            stop_process(self.processes.pop("alerts"))
+            if self.layout:
+                self.layout.release("alerts")
+        clip_queues = {cam_id: cam.clip_queue for cam_id, cam in self.cameras.items() if cam.clip_queue is not None}
+        rings = {(cam_id, detector): detection_ring_name(cam_id, detector)
+                 for cam_id, cam in self.cameras.items() for detector in cam.rings}
+        self._start("alerts", alert_process, (rings, clip_queues, self.queues["health"]))
+        self.actions.append("alert process restarted")
+
+    # 🔹 Running
+
+    def check_processes(self):
+        """Restart detector workers that died and report any other worker that exited on its own (once each)."""
+        self.actions = []
+        for worker in range(len(self.pool_controls)):
+            process = self.processes[f"pool{worker}"]
+            if not process.is_alive():
+                self.restart_pool_worker(worker, process)
+        for cam in list(self.cameras.values()):
+            for detector in sorted(cam.running & set(cam.processes)):
+                process = cam.processes[detector]
+                if not process.is_alive():
+                    log.error("Worker %s exited with code %s", process.name, process.exitcode)
+                    self.stop_detector(cam, detector)
+                    self.restart_detector(cam, detector)
+        if self.actions:
+            self.sync_alerts()
+            log.info("Recovered from worker exits: %s", ", ".join(self.actions))
+
+        workers = list(self.processes.values())
+        for cam in self.cameras.values():
+            workers.extend(cam.processes.values())
+        for process in workers:
+            if not process.is_alive() and process.pid not in self.reported_exits:
+                self.reported_exits.add(process.pid)
+                log.error("Worker %s exited with code %s", process.name, process.exitcode)
+
+    def run(self, load_settings, load_version, poll_interval=2.0):
+        """Apply the settings, then reconcile again whenever load_version() changes."""
+        version = None
+        while True:
+            current = load_version()
+            if current is not None and current != version:
+                camera_settings = load_settings()
+                if camera_settings is not None:
+                    version = current
+                    actions = self.reconcile(camera_settings)
+                    log.info("Config version %s applied: %s", version, ", ".join(actions) or "no changes")
+            self.check_processes()
+            time.sleep(poll_interval)
+
+    def shutdown(self):
+        log.info("Shutting down all processes...")
+        for cam_id in list(self.cameras):
+            self.stop_camera(cam_id)
+        for process in self.processes.values():
+            stop_process(process)
+        self.processes.clear()
+        self.table = None
+        release_shared_memory(self.shared)
+        log.info("Cleanup complete.")
@@ -0,0 +1,125 @@
+import time
+
+# 🔹 Adaptive model quality for object detection
+#
+# Each camera's object detector climbs down a ladder of (weights, imgsz)
+# tiers when its inference gets slower than the camera's latency target
+# (objectLatencyTarget, ms; 0 keeps the top tier) and back up when there
+# is room again, instead of falling further and further behind on an
+# overloaded box. Tier 0 is the best and the starting point.
+#   - latency is smoothed over recent runs (SMOOTHING);
+#   - after a change the tier is held for HOLD_SECONDS so the new model's
+#     latency can be measured before deciding again;
+#   - down: the smoothed latency exceeds the target;
+#   - up: the next tier up is expected to stay below UP_MARGIN of the
+#     target, judged by what it measured when it was last left (within
+#     MEMORY_SECONDS) or otherwise by its relative cost. The gap between
+#     the two thresholds is the hysteresis that keeps a camera near the
+#     boundary from flapping.
+# The tier in use is on /metrics (ivss_model_tier) and on every object
+# alert (Alert.model_tier).
+
+# (weights, imgsz), best first. Tier 0 is OBJECT_MODEL at the largest object
+# view. A camera's view is never larger than its frame (object_view()), and
+# YOLO only ever scales it down: on a smaller view, imgsz is capped at the
+# view size and tiers that end up the same as a better one are skipped.
+LADDER = (
+    ("yolo11m.pt", 640),
+    ("yolo11m.pt", 480),
+    ("yolo11s.pt", 480),
+    ("yolo11s.pt", 320),
+    ("yolo11n.pt", 320),
+    ("yolo11n.pt", 256),
+)
+MODEL_GFLOPS = {"yolo11n.pt": 6.5, "yolo11s.pt": 21.5, "yolo11m.pt": 68.0}  # at 640x640
+DEFAULT_LATENCY_TARGET_MS = 1000
+SMOOTHING = 0.2          # weight of the newest run in the smoothed latency
+HOLD_SECONDS = 10.0
+UP_MARGIN = 0.6
+MEMORY_SECONDS = 120.0   # how long a tier's measured latency is trusted; load changes
+
+
+MAX_VIEW_SIZE = LADDER[0][1]
+
+
+def tier_settings(tier, view_size=MAX_VIEW_SIZE):
+    """(weights, imgsz) of a tier on a letterboxed view of view_size."""
+    weights, imgsz = LADDER[tier]
+    return weights, min(imgsz, view_size)
+
+
+def tier_name(tier, view_size=MAX_VIEW_SIZE):
+    weights, imgsz = tier_settings(tier, view_size)
+    return f"{weights.rsplit('.', 1)[0]}@{imgsz}"
+
+
+def tier_cost(tier, view_size=MAX_VIEW_SIZE):
+    weights, imgsz = tier_settings(tier, view_size)
+    return MODEL_GFLOPS.get(weights, 1.0) * (imgsz / 640) ** 2
+
+
+class QualityLadder:
+    """One camera's tier controller: observe() every inference, use tier for the next one."""
+
+    def __init__(self, target_ms=DEFAULT_LATENCY_TARGET_MS, view_size=MAX_VIEW_SIZE):
+        self.tier = 0
+        self.target = 0.0
+        self.view_size = view_size
+        self.latency = None      # smoothed seconds at the current tier
+        self.measured = {}       # tier -> (smoothed seconds, when) from when it was last left
+        # Tiers whose weights could not be loaded, or that match a better tier on this view size
+        settings = [tier_settings(tier, view_size) for tier in range(len(LADDER))]
+        self.unavailable = {tier for tier in range(1, len(LADDER)) if settings[tier] in settings[:tier]}
+        self.changed_at = time.monotonic()
+        self.configure(target_ms)
+
+    def configure(self, target_ms):
+        """Latency target in ms; None means DEFAULT_LATENCY_TARGET_MS and 0 pins the top tier."""
+        target_ms = DEFAULT_LATENCY_TARGET_MS if target_ms is None else target_ms
+        self.target = max(float(target_ms), 0.0) / 1000
+        if not self.target and self.tier:
+            self.move(0)
+
+    def observe(self, seconds, now=None):
+        """Record one inference time. Returns True when the tier changed."""
+        if not self.target:
+            return False
+        now = time.monotonic() if now is None else now
+        self.latency = seconds if self.latency is None else self.latency + SMOOTHING * (seconds - self.latency)
+        if now - self.changed_at < HOLD_SECONDS:
+            return False
+        if self.latency > self.target:
+            lower = self.next_tier(+1)
+            if lower is not None:
+                return self.move(lower, now)
+        higher = self.next_tier(-1)
+        if higher is not None:
+            expected = self.latency * tier_cost(higher, self.view_size) / tier_cost(self.tier, self.view_size)
+            if higher in self.measured and now - self.measured[higher][1] < MEMORY_SECONDS:
+                expected = self.measured[higher][0]
+            if expected < UP_MARGIN * self.target:
+                return self.move(higher, now)
+        return False
+
+    def next_tier(self, step):
+        tier = self.tier + step
+        while 0 <= tier < len(LADDER):
+            if tier not in self.unavailable:
+                return tier
+            tier += step
+        return None
+
+    def move(self, tier, now=None):
+        now = time.monotonic() if now is None else now
+        if self.latency is not None:
+            self.measured[self.tier] = (self.latency, now)
+        self.tier = tier
+        self.latency = None
+        self.changed_at = now
+        return True
+
+    def disable(self, tier):
+        """Weights of tier could not be loaded: never use it, falling back to the closest better tier."""
+        self.unavailable.add(tier)
+        if self.tier == tier:
+            self.move(self.next_tier(-1) or 0)
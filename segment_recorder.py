@@ -0,0 +1,202 @@
+import cv2
+import numpy as np
+import os
+import time
+
+from mjpeg_avi import MjpegAviWriter, read_frame_at
+from shared_state import open_shared_memory
+from structured_log import get_logger
+
+log = get_logger("recorder")
+
+# 🔹 Default recording settings (overridable per camera from CameraSetting)
+RECORDING_FOLDER = "recordings"
+DEFAULT_SEGMENT_SECONDS = 60
+DEFAULT_RECORD_FPS = 5
+DEFAULT_RECORD_QUALITY = 70
+DEFAULT_RETENTION_HOURS = 24
+DEFAULT_QUOTA_GB = 10
+INDEX_FLUSH_INTERVAL = 1.0  # seconds
+
+# One record per stored frame. Segments are named seg_<segment>.avi where
+# <segment> is the epoch second the segment was opened.
+INDEX_DTYPE = np.dtype([
+    ("ts", "<f8"),
+    ("segment", "<i8"),
+    ("frame", "<u4"),
+    ("offset", "<u8"),
+    ("size", "<u4"),
+])
+
+
+def recording_settings(cam_config):
+    cam_config = cam_config or {}
+    return {
+        "enabled": bool(cam_config.get("recordContinuous")),
+        "segment_seconds": float(cam_config.get("recordSegmentSeconds") or DEFAULT_SEGMENT_SECONDS),
+        "fps": float(cam_config.get("recordFps") or DEFAULT_RECORD_FPS),
+        "quality": int(cam_config.get("recordQuality") or DEFAULT_RECORD_QUALITY),
+        "retention_hours": float(cam_config.get("recordRetentionHours") or DEFAULT_RETENTION_HOURS),
+        "quota_gb": float(cam_config.get("recordQuotaGb") or DEFAULT_QUOTA_GB),
+    }
+
+
+def camera_recording_dir(cam_id, root=RECORDING_FOLDER):
+    return os.path.join(root, f"cam{cam_id}")
+
+
+def segment_path(cam_dir, segment):
+    return os.path.join(cam_dir, f"seg_{int(segment)}.avi")
+
+
+def index_path(cam_dir):
+    return os.path.join(cam_dir, "index.bin")
+
+
+def load_index(cam_dir):
+    """Memory-map the time index. A partially written trailing record is ignored."""
+    path = index_path(cam_dir)
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=INDEX_DTYPE)
+    count = os.path.getsize(path) // INDEX_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=INDEX_DTYPE)
+    return np.memmap(path, dtype=INDEX_DTYPE, mode="r", shape=(count,))
+
+
+def find_frame(cam_dir, ts, index=None):
+    """
+    Binary-search the index for the last frame at or before ts.
+    Returns (position, record) or (None, None) when nothing was recorded by ts.
+    """
+    index = load_index(cam_dir) if index is None else index
+    pos = int(np.searchsorted(index["ts"], ts, side="right")) - 1
+    if pos < 0:
+        return None, None  # empty, or ts is before the oldest recorded frame
+    return pos, index[pos]
+
+
+def read_recorded_frame(cam_dir, record):
+    return read_frame_at(segment_path(cam_dir, record["segment"]),
+                         int(record["offset"]), int(record["size"]))
+
+
+def list_segments(cam_dir):
+    """Summarise the index per segment: start/end timestamps and frame counts."""
+    index = load_index(cam_dir)
+    if len(index) == 0:
+        return []
+    segments, starts, counts = np.unique(index["segment"], return_index=True, return_counts=True)
+    return [
+        {
+            "segment": int(seg),
+            "start": float(index["ts"][first]),
+            "end": float(index["ts"][first + count - 1]),
+            "frames": int(count),
+        }
+        for seg, first, count in zip(segments, starts, counts)
+    ]
+
+
+def segment_recorder_process(shm_name, shape, cam_id, cam_config=None):
+    """
+    Reads frames from shared memory at the recording frame rate and writes
+    fixed-length MJPEG segments plus an append-only time index. Runs at low
+    priority and only copies one frame per recorded tick so it stays out of
+    the detectors' way.
+    """
+    settings = recording_settings(cam_config)
+    cam_dir = camera_recording_dir(cam_id)
+    os.makedirs(cam_dir, exist_ok=True)
+
+    if hasattr(os, "nice"):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+
+    shm = open_shared_memory(shm_name)
+    frame_buffer = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), settings["quality"]]
+    interval = 1.0 / settings["fps"]
+
+    writer = None
+    segment = None
+    index_file = open(index_path(cam_dir), "ab")
+    last_flush = time.time()
+
+    log.info("Segment recorder started for Camera %s: %.0fs segments at %.0f fps", cam_id,
+             settings["segment_seconds"], settings["fps"], extra={"cam_id": cam_id})
+
+    try:
+        next_tick = time.time()
+        while True:
+            now = time.time()
+            if now < next_tick:
+                time.sleep(next_tick - now)
+                now = time.time()
+            next_tick += interval
+            if next_tick < now:
+                next_tick = now + interval
+
+            if writer is None or now - segment >= settings["segment_seconds"]:
+                if writer is not None:
+                    writer.close()
+                    index_file.flush()
+                    index_file.close()
+                    enforce_retention(cam_dir, settings, now)
+                    index_file = open(index_path(cam_dir), "ab")
+                segment = int(now)
+                writer = MjpegAviWriter(segment_path(cam_dir, segment), shape[1], shape[0], settings["fps"])
+
+            frame = frame_buffer.copy()
+            ret, jpeg = cv2.imencode(".jpg", frame, encode_params)
+            if not ret:
+                continue
+
+            frame_no = writer.frame_count
+            offset, size = writer.write_frame(jpeg.tobytes())
+            record = np.array([(now, segment, frame_no, offset, size)], dtype=INDEX_DTYPE)
+            index_file.write(record.tobytes())
+
+            if now - last_flush >= INDEX_FLUSH_INTERVAL:
+                writer.flush()
+                index_file.flush()
+                last_flush = now
+    finally:
+        log.info("Segment recorder shutting down for Camera %s...", cam_id, extra={"cam_id": cam_id})
+        if writer is not None:
+            writer.close()
+        index_file.close()
+        shm.close()
+
+
+# 🔹 Retention by Age and Quota
+def enforce_retention(cam_dir, settings, now):
+    segments = sorted(
+        int(name[4:-4]) for name in os.listdir(cam_dir)
+        if name.startswith("seg_") and name.endswith(".avi")
+    )
+    sizes = {seg: os.path.getsize(segment_path(cam_dir, seg)) for seg in segments}
+    total = sum(sizes.values())
+    quota = settings["quota_gb"] * 1024 ** 3
+    max_age = settings["retention_hours"] * 3600
+
+    removed = set()
+    for seg in segments[:-1]:  # never delete the segment that was just closed
+        if now - seg > max_age or total > quota:
+            os.remove(segment_path(cam_dir, seg))
+            total -= sizes[seg]
+            removed.add(seg)
+
+    if removed:
+        index = np.fromfile(index_path(cam_dir), dtype=INDEX_DTYPE)
+        kept = index[~np.isin(index["segment"], list(removed))]
+        tmp_path = index_path(cam_dir) + ".tmp"
+        kept.tofile(tmp_path)
+        os.replace(tmp_path, index_path(cam_dir))
+        log.info("Retention removed %s segment(s) from %s", len(removed), cam_dir)
+
+
+if __name__ == "__main__":
+    print("Run main.py to start the system.")
@@ -0,0 +1,123 @@
+import numpy as np
+from multiprocessing import shared_memory
+from queue import Empty
+
+DEFAULT_FRAME_SHAPE = (240, 320, 3)  # (height, width, channels)
+
+# 🔹 Per-camera capture metadata, published next to video_frame_shm_{i}
+#
+# The frame buffer itself carries no header, so consumers that need to know
+# whether a frame is new (or how old it is) read this small record instead.
+# The capture process rewrites the buffer in place, so the record's version
+# is odd while a frame is being written; copy_frame() retries until a copy
+# did not overlap a write.
+FRAME_META_DTYPE = np.dtype([
+    ("seq", "<u8"),             # incremented after every frame written to shared memory
+    ("timestamp", "<f8"),       # time.time() when the frame was grabbed
+    ("decode_fps", "<f4"),
+    ("frames_decoded", "<u8"),
+    ("frames_dropped", "<u8"),  # decoded but overwritten before being published
+    ("reconnects", "<u4"),
+    ("connected", "u1"),
+    ("activity", "<f4"),        # smoothed foreground fraction, written by the motion detector
+    ("health", "u1"),           # feed health state (frame_health.py), written by the preprocess process
+    ("version", "<u8"),         # incremented before and after every write of the frame buffer
+])
+
+
+def copy_frame(frame_buffer, meta, attempts=3):
+    """(frame, seq, timestamp) copied while no write was in progress, or None when the buffer kept changing."""
+    for _ in range(attempts):
+        version = int(meta["version"][0])
+        if version % 2:
+            continue
+        seq, timestamp = int(meta["seq"][0]), float(meta["timestamp"][0])
+        frame = frame_buffer.copy()
+        if int(meta["version"][0]) == version:
+            return frame, seq, timestamp
+    return None
+
+
+# 🔹 Segment names
+#
+# A detector node (frame_transport.py --listen) recreates a camera's frame, view and
+# detection-ring segments under the names the pipeline uses, possibly on the
+# pipeline's own host. Each of its links therefore sets a namespace that is
+# put in front of every segment name the process creates or opens.
+_namespace = ""
+
+
+def set_shm_namespace(namespace):
+    global _namespace
+    _namespace = namespace
+
+
+def open_shared_memory(name, create=False, size=0):
+    """SharedMemory for a segment name in this process's namespace."""
+    return shared_memory.SharedMemory(name=_namespace + name, create=create, size=size)
+
+
+def frame_meta_name(cam_id):
+    return f"video_meta_shm_{cam_id}"
+
+
+def cameras_by_id(camera_settings):
+    """{cam_id: cam_config}, keyed by each camera's stable slot (by position for configs without one)."""
+    return {cam_config["slot"] if cam_config.get("slot") is not None else index: cam_config
+            for index, cam_config in enumerate(camera_settings)}
+
+
+def camera_frame_shape(cam_config):
+    """Shared-memory frame shape for a camera, from its configured capture resolution."""
+    cam_config = cam_config or {}
+    width = int(cam_config.get("frameWidth") or DEFAULT_FRAME_SHAPE[1])
+    height = int(cam_config.get("frameHeight") or DEFAULT_FRAME_SHAPE[0])
+    return (height, width, 3)
+
+
+def create_shared_memory(name, size):
+    try:
+        return open_shared_memory(name, create=True, size=size)
+    except FileExistsError:
+        try:
+            existing_shm = open_shared_memory(name)
+            existing_shm.unlink()
+        except FileNotFoundError:
+            pass
+        return open_shared_memory(name, create=True, size=size)
+
+
+def create_shared_array(name, dtype, shape=(1,)):
+    """Create (or recreate) a zeroed numpy array backed by named shared memory."""
+    dtype = np.dtype(dtype)
+    size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+    shm = create_shared_memory(name, size)
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    array[...] = np.zeros((), dtype=dtype)
+    return shm, array
+
+
+def attach_shared_array(name, dtype, shape=(1,), track=True):
+    """
+    Attach to an array created by create_shared_array. Raises FileNotFoundError if missing.
+    Processes outside the pipeline (web app, CLI tools) pass track=False: otherwise
+    their resource tracker unlinks the pipeline's segment when they exit.
+    """
+    shm = open_shared_memory(name)
+    if not track:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def apply_config_updates(control_queue, detector):
+    """Drain ("update", cam_id, cam_config, detector) messages from the pipeline and reconfigure the detector in place."""
+    if control_queue is None:
+        return
+    while True:
+        try:
+            message = control_queue.get_nowait()
+        except Empty:
+            return
+        if message[0] == "update":
+            detector.reconfigure(message[2])
@@ -0,0 +1,86 @@
+import json
+import os
+import time
+
+from structured_log import get_logger
+
+# 🔹 Per-process startup timing
+#
+# Every pipeline process reports how long it took to become useful, measured
+# from the moment the OS created it (so interpreter start-up and module
+# imports are included):
+#   imports      process creation -> its main function starts running
+#   model_load   time spent loading models / encodings, where there are any
+#   first_frame  process creation -> first frame actually handled
+# Each report is logged and appended to STARTUP_LOG as one JSON line, so
+# cold-start and restart times can be compared across versions and machines.
+
+STARTUP_LOG = "startup_times.jsonl"
+
+log = get_logger("startup")
+
+_IMPORTED_AT = time.time()
+
+
+def process_start_time():
+    """Wall-clock time this process was created; falls back to when this module was imported."""
+    try:
+        # Field 22 of /proc/self/stat is the start time in clock ticks after boot
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+        return time.time() - max(age, 0.0)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return _IMPORTED_AT
+
+
+class StartupReport:
+    """Collects one process's startup stages and writes them once it is ready."""
+
+    def __init__(self, role, cam_id=None):
+        self.role = role
+        self.cam_id = cam_id
+        self.started = process_start_time()
+        self.stages = {}
+        self.written = False
+        self.mark("imports")
+
+    def mark(self, stage):
+        """Record the seconds from process creation to now, the first time a stage is reached."""
+        self.stages.setdefault(stage, round(time.time() - self.started, 3))
+
+    def measure(self, stage):
+        """Context manager recording how long the enclosed block took."""
+        return _StageTimer(self, stage)
+
+    def finish(self, stage="first_frame"):
+        """Mark the final stage and write the report; later calls do nothing."""
+        if self.written:
+            return
+        self.mark(stage)
+        self.written = True
+        label = self.role if self.cam_id is None else f"{self.role} cam{self.cam_id}"
+        log.info("Startup %s: %s", label, ", ".join(f"{name} {secs:.2f}s" for name, secs in self.stages.items()),
+                 extra={"cam_id": self.cam_id})
+        record = {"time": time.time(), "pid": os.getpid(), "role": self.role, "cam_id": self.cam_id}
+        record.update(self.stages)
+        try:
+            with open(STARTUP_LOG, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            log.error("Could not write startup report: %s", e)
+
+
+class _StageTimer:
+    def __init__(self, report, stage):
+        self.report = report
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = round(time.time() - self.t0, 3)
+        self.report.stages[self.stage] = self.report.stages.get(self.stage, 0) + elapsed
+        return False
@@ -0,0 +1,180 @@
+import json
+import logging
+import logging.handlers
+import multiprocessing as mp
+import os
+import sys
+import threading
+
+# 🔹 Structured, rate-limited logging for the pipeline
+#
+# Workers used to print() on hot paths, so stdout I/O grew with the frame
+# rate. Pipeline processes now log through the standard logging module:
+#   - every worker puts its records on one multiprocessing queue, so it never
+#     writes to a file or the terminal itself;
+#   - a listener thread in the pipeline process writes them as JSON lines to
+#     LOG_DIR/ivss.jsonl (rotated at LOG_MAX_BYTES, LOG_BACKUPS files kept)
+#     and echoes INFO and above to the console as "[INFO] ...";
+#   - records logged with extra={"key": ...} are rate-limited inside the
+#     worker, before they reach the queue: one per RATE_INTERVAL seconds per
+#     key, and the next one let through carries how many were suppressed;
+#   - DEBUG is off unless the worker is listed in IVSS_DEBUG (or main.py
+#     --debug), e.g. "object,alerts", "cam0" or "all". When it is off, debug
+#     calls return before any formatting.
+
+LOG_DIR = os.getenv("IVSS_LOG_DIR", "logs")
+LOG_FILE = "ivss.jsonl"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+RATE_INTERVAL = 30.0  # seconds between records with the same key
+
+_listener = None
+_queue = None
+_debug = frozenset()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record, with the optional cam_id / key / suppressed extras."""
+
+    EXTRAS = ("cam_id", "key", "suppressed")
+
+    def format(self, record):
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "process": record.processName,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in self.EXTRAS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """The "[LEVEL] message" lines the pipeline has always printed."""
+
+    def format(self, record):
+        line = f"[{record.levelname}] {record.getMessage()}"
+        if getattr(record, "suppressed", 0):
+            line += f" ({record.suppressed} similar suppressed)"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets a keyed record through at most once per interval; unkeyed records always pass."""
+
+    def __init__(self, interval=RATE_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self.last = {}
+        self.suppressed = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, "key", None)
+        if key is None:
+            return True
+        with self.lock:
+            last = self.last.get(key)
+            if last is not None and record.created - last < self.interval:
+                self.suppressed[key] = self.suppressed.get(key, 0) + 1
+                return False
+            self.last[key] = record.created
+            suppressed = self.suppressed.pop(key, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+def debug_workers(value=None):
+    """Parse a comma-separated IVSS_DEBUG value into a set of worker names / roles."""
+    value = os.getenv("IVSS_DEBUG", "") if value is None else value
+    return frozenset(part.strip() for part in value.split(",") if part.strip())
+
+
+def debug_enabled(process_name, workers):
+    """
+    Whether a process gets DEBUG output. Matches "all", the full process name
+    ("cam0-object"), its camera ("cam0") or its role ("object", "alerts", "pool").
+    """
+    if not workers:
+        return False
+    camera, _, role = process_name.rpartition("-")
+    return bool({"all", process_name, camera, role, role.rstrip("0123456789")} & workers)
+
+
+def _install(handler, debug, logger=""):
+    """Make handler the only one on logger ("" is the root); other handlers were inherited through fork."""
+    for name in ("", "ivss"):
+        for existing in list(logging.getLogger(name).handlers):
+            logging.getLogger(name).removeHandler(existing)
+    handler.addFilter(RateLimitFilter())
+    logging.getLogger(logger).addHandler(handler)
+    if logger == "":
+        logging.getLogger().setLevel(logging.INFO)
+    # Only our own loggers go to DEBUG; third-party libraries stay at INFO
+    logging.getLogger("ivss").setLevel(logging.DEBUG if debug else logging.INFO)
+
+
+def start_log_service(log_dir=LOG_DIR, debug=None):
+    """Start the listener in the pipeline process. debug overrides IVSS_DEBUG."""
+    global _listener, _queue, _debug
+    os.makedirs(log_dir, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, LOG_FILE), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+    file_handler.setFormatter(JsonLinesFormatter())
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(logging.INFO)
+    console.setFormatter(ConsoleFormatter())
+
+    _queue = mp.Queue()
+    _debug = debug_workers(debug)
+    _listener = logging.handlers.QueueListener(_queue, file_handler, console, respect_handler_level=True)
+    _listener.start()
+    _install(logging.handlers.QueueHandler(_queue), debug_enabled("pipeline", _debug))
+
+
+def stop_log_service():
+    """Write out everything still queued and close the log file."""
+    global _listener, _queue
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = _queue = None
+
+
+def worker_log_config(process_name):
+    """What a child process needs to log through the service; None when no service is running."""
+    if _queue is None:
+        return None
+    return _queue, debug_enabled(process_name, _debug)
+
+
+def run_logged(log_config, target, args):
+    """Process entry point: route this process's logging to the service, then run target(*args)."""
+    if log_config is not None:
+        queue, debug = log_config
+        _install(logging.handlers.QueueHandler(queue), debug)
+    return target(*args)
+
+
+def get_logger(name):
+    """
+    Logger for a pipeline module. In a process without the service (offline
+    tools, the web app) our records go straight to the console, still
+    rate-limited, and the process's own logging setup is left alone.
+    """
+    if not logging.getLogger().handlers and not logging.getLogger("ivss").handlers:
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(ConsoleFormatter())
+        _install(console, debug_enabled(mp.current_process().name, debug_workers()), logger="ivss")
+    return logging.getLogger(f"ivss.{name}")
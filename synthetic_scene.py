@@ -0,0 +1,151 @@
+import math
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+import numpy as np
+
+# 🔹 Synthetic camera scenes
+#
+# Deterministic stand-in for a camera when there is no footage: a textured
+# static background (so compression and background models have real work),
+# a few objects moving across it at constant speed, and sensor noise. The
+# same seed gives the same frames on every machine, so benchmark and soak
+# runs are comparable between commits. Noise planes are generated once and
+# cycled, so producing a frame costs little more than the copy.
+#
+# Optionally the first `faces` objects carry a drawn face, and `lighting`
+# swings the overall brightness by that fraction over LIGHTING_PERIOD frames
+# (clouds, lights dimming), which motion detection has to ride out.
+#
+# As a camera source, "synthetic://640x480?fps=15&objects=3&faces=1&lighting=0.3&seed=2"
+# plays such a scene in real time (see SyntheticCapture and video_capture.py).
+
+NOISE_PLANES = 8
+LIGHTING_PERIOD = 600  # frames per brightness cycle
+SKIN = (120, 160, 215)
+
+
+class SyntheticScene:
+    def __init__(self, width=640, height=480, objects=3, noise=3.0, seed=0, faces=0, lighting=0.0):
+        self.width, self.height = width, height
+        self.faces = faces
+        self.lighting = lighting
+        rng = np.random.default_rng(seed)
+
+        # Background: smooth gradient plus blurred texture, like walls and floor
+        y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+        base = 60 + 90 * (y / max(height - 1, 1)) + 30 * np.sin(x / max(width, 1) * 6.0)
+        texture = cv2.GaussianBlur(rng.normal(0, 25, (height, width)).astype(np.float32), (0, 0), 3)
+        tint = np.array([1.0, 0.95, 0.9], dtype=np.float32)
+        self.background = np.clip((base + texture)[..., None] * tint, 0, 255).astype(np.uint8)
+
+        self.objects = []
+        for _ in range(objects):
+            w = int(rng.integers(max(width // 20, 4), max(width // 6, 5)))
+            h = int(w * rng.uniform(1.2, 2.5))  # upright, person-like proportions
+            self.objects.append({
+                "size": (w, min(h, height - 1)),
+                "start": (float(rng.uniform(0, width - w)), float(rng.uniform(0, max(height - h, 1)))),
+                "velocity": (float(rng.uniform(-6, 6)), float(rng.uniform(-2, 2))),
+                "color": tuple(int(c) for c in rng.integers(20, 235, 3)),
+            })
+        self.noise = [rng.normal(0, noise, (height, width, 1)).astype(np.int16) for _ in range(NOISE_PLANES)] \
+            if noise > 0 else None
+
+    def object_boxes(self, index):
+        """(x1, y1, x2, y2) of every object in frame index; objects bounce off the edges."""
+        boxes = []
+        for obj in self.objects:
+            (w, h), (x0, y0), (vx, vy) = obj["size"], obj["start"], obj["velocity"]
+            x = _bounce(x0 + vx * index, self.width - w)
+            y = _bounce(y0 + vy * index, self.height - h)
+            boxes.append((int(x), int(y), int(x) + w, int(y) + h))
+        return boxes
+
+    def frame(self, index):
+        """BGR frame number index."""
+        frame = self.background.copy()
+        for number, (obj, (x1, y1, x2, y2)) in enumerate(zip(self.objects, self.object_boxes(index))):
+            cv2.rectangle(frame, (x1, y1 + (y2 - y1) // 4), (x2, y2), obj["color"], -1)
+            head = ((x1 + x2) // 2, y1 + (y2 - y1) // 8)
+            radius = max((x2 - x1) // 3, 1)
+            if number < self.faces:
+                _draw_face(frame, head, radius)
+            else:
+                cv2.circle(frame, head, radius, obj["color"], -1)
+        if self.noise is not None:
+            frame = np.clip(frame + self.noise[index % NOISE_PLANES], 0, 255).astype(np.uint8)
+        if self.lighting:
+            gain = 1.0 + self.lighting * math.sin(2 * math.pi * index / LIGHTING_PERIOD)
+            frame = cv2.convertScaleAbs(frame, alpha=gain)
+        return frame
+
+    def frames(self, count, start=0):
+        return [self.frame(index) for index in range(start, start + count)]
+
+
+class SyntheticCapture:
+    """
+    The subset of cv2.VideoCapture that FrameGrabber uses, backed by a
+    SyntheticScene. read() returns the next frame immediately; the grabber
+    paces it at get(cv2.CAP_PROP_FPS) like a file.
+    """
+
+    def __init__(self, url):
+        self.scene, self.fps = parse_synthetic_source(url)
+        self.index = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        frame = self.scene.frame(self.index)
+        self.index += 1
+        return True, frame
+
+    def get(self, prop):
+        return self.fps if prop == cv2.CAP_PROP_FPS else 0
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        pass
+
+
+def parse_synthetic_source(url):
+    """(SyntheticScene, fps) for a synthetic://WxH?fps=&objects=&faces=&lighting=&noise=&seed= URL."""
+    parts = urlsplit(url)
+    size = parts.netloc or "640x480"
+    try:
+        width, height = (int(v) for v in size.lower().split("x"))
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        fps = float(query.pop("fps", 15))
+        options = {key: float(query.pop(key)) for key in ("noise", "lighting") if key in query}
+        options.update({key: int(query.pop(key)) for key in ("objects", "faces", "seed") if key in query})
+    except ValueError:
+        raise ValueError(f"Invalid synthetic source: {url!r}")
+    if query:
+        raise ValueError(f"Unknown synthetic source options: {', '.join(sorted(query))}")
+    return SyntheticScene(width, height, **options), fps
+
+
+def _draw_face(frame, center, radius):
+    """A frontal cartoon face: skin-toned oval, eyes, brows and mouth."""
+    x, y = center
+    axes = (radius, max(int(radius * 1.25), 1))
+    cv2.ellipse(frame, center, axes, 0, 0, 360, SKIN, -1)
+    eye = max(radius // 6, 1)
+    for side in (-1, 1):
+        eye_center = (x + side * radius // 2 - side * eye, y - radius // 4)
+        cv2.circle(frame, eye_center, eye, (40, 30, 30), -1)
+        cv2.line(frame, (eye_center[0] - eye * 2, eye_center[1] - eye * 2),
+                 (eye_center[0] + eye * 2, eye_center[1] - eye * 2), (50, 40, 40), max(eye // 2, 1))
+    cv2.ellipse(frame, (x, y + radius // 2), (max(radius // 3, 1), max(radius // 8, 1)), 0, 0, 180, (60, 60, 150), -1)
+
+
+def _bounce(position, limit):
+    if limit <= 0:
+        return 0
+    position = abs(position) % (2 * limit)
+    return position if position <= limit else 2 * limit - position
@@ -0,0 +1,42 @@
+import numpy as np
+
+from frame_health import BLANK, FROZEN, OK, PERSIST_SECONDS, FROZEN_SECONDS, FrameHealth
+from frame_views import skipped
+from motion_detection import MOTION_VIEW
+from object_detection import OBJECT_VIEW
+
+DARK = np.full((240, 320, 3), 10, dtype=np.uint8)
+
+
+def scene(seed):
+    return np.random.default_rng(seed).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+
+
+def test_single_repeated_frame_is_not_skipped():
+    health = FrameHealth(0)
+    frame = scene(0)
+    health.update(frame, now=0.0)
+    state = health.update(frame, now=0.1)
+    assert state == FROZEN
+    assert health.view_state(state) == OK
+
+
+def test_blank_is_skipped_only_after_it_persisted_and_not_by_motion():
+    health = FrameHealth(0)
+    health.update(scene(0), now=0.0)
+    assert health.view_state(health.update(DARK, now=1.0)) == OK
+    state = health.view_state(health.update(DARK, now=1.0 + PERSIST_SECONDS))
+    assert state == BLANK
+    assert skipped(OBJECT_VIEW, state)
+    assert not skipped(MOTION_VIEW, state)
+    # The first frame with content again is analysed straight away
+    assert health.view_state(health.update(scene(1), now=2.0 + PERSIST_SECONDS)) == OK
+
+
+def test_frozen_feed_is_skipped_by_every_detector():
+    health = FrameHealth(0)
+    frame = scene(0)
+    for now in (0.0, 1.0, 1.0 + FROZEN_SECONDS):
+        state = health.view_state(health.update(frame, now=now))
+    assert state == FROZEN
+    assert skipped(MOTION_VIEW, state) and skipped(OBJECT_VIEW, state)
@@ -0,0 +1,65 @@
+import numpy as np
+
+from motion_detection import MOTION_HISTORY, MotionScorer
+
+VIEW_SHAPE = (120, 160)
+ZONES = [{"name": "left", "type": "include", "points": [[0, 0], [0.5, 0], [0.5, 1], [0, 1]]}]
+
+
+def scene(rng, box=None):
+    """A fixed textured background with a little sensor noise, and a bright square at box=(x, y)."""
+    background = np.random.default_rng(0).integers(40, 200, VIEW_SHAPE).astype(np.int16)
+    view = np.clip(background + rng.normal(0, 1.5, VIEW_SHAPE), 0, 255).astype(np.uint8)
+    if box is not None:
+        x, y = box
+        view[y:y + 30, x:x + 30] = 255
+    return view
+
+
+def run(scorer, rng, frames, moving=False):
+    triggered = []
+    for i in range(frames):
+        _, _, fired = scorer.update(scene(rng, (5 + 2 * i, 40) if moving else None))
+        triggered += fired
+    return triggered
+
+
+def test_start_raises_no_full_view_alert():
+    rng = np.random.default_rng(1)
+    scorer = MotionScorer(30, "mog2", None, VIEW_SHAPE)
+    # MOG2 calls the whole first view foreground
+    fg_mask, _, triggered = scorer.update(scene(rng))
+    assert np.count_nonzero(fg_mask) > 0.9 * fg_mask.size
+    assert triggered == []
+    assert run(scorer, rng, MOTION_HISTORY + 20) == []
+    assert scorer.settled
+
+
+def test_motion_after_warmup_triggers_once():
+    rng = np.random.default_rng(2)
+    scorer = MotionScorer(30, "mog2", ZONES, VIEW_SHAPE)
+    run(scorer, rng, MOTION_HISTORY + 5)
+    assert run(scorer, rng, 20, moving=True) == ["left"]
+
+
+def test_engine_change_warms_up_again():
+    rng = np.random.default_rng(3)
+    scorer = MotionScorer(30, "mog2", None, VIEW_SHAPE)
+    run(scorer, rng, MOTION_HISTORY + 5)
+    scorer.reconfigure(30, "blockdiff", None)
+    assert not scorer.settled
+    assert run(scorer, rng, MOTION_HISTORY + 5) == []
+
+
+def test_reconfigure_keeps_zone_episodes_unless_zones_change():
+    rng = np.random.default_rng(4)
+    scorer = MotionScorer(30, "mog2", ZONES, VIEW_SHAPE)
+    run(scorer, rng, MOTION_HISTORY + 5)
+    assert run(scorer, rng, 10, moving=True) == ["left"]
+    zones = scorer.zones
+    # A settings save that only changes the threshold neither resets the episode nor re-fires it
+    scorer.reconfigure(40, "mog2", [dict(zone) for zone in ZONES])
+    assert scorer.zones is zones and zones.active.any()
+    assert run(scorer, rng, 5, moving=True) == []
+    scorer.reconfigure(40, "mog2", [dict(ZONES[0], name="door")])
+    assert scorer.zones is not zones
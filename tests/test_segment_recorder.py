@@ -0,0 +1,26 @@
+import numpy as np
+
+from segment_recorder import INDEX_DTYPE, find_frame
+
+
+def make_index(timestamps):
+    index = np.zeros(len(timestamps), dtype=INDEX_DTYPE)
+    index["ts"] = timestamps
+    index["frame"] = np.arange(len(timestamps))
+    return index
+
+
+def test_find_frame_returns_last_frame_at_or_before_ts():
+    index = make_index([100.0, 100.2, 100.4])
+    assert find_frame(None, 100.2, index)[0] == 1
+    assert find_frame(None, 100.3, index)[0] == 1
+    assert find_frame(None, 500.0, index)[0] == 2
+
+
+def test_find_frame_before_first_frame_finds_nothing():
+    index = make_index([100.0, 100.2, 100.4])
+    assert find_frame(None, 99.9, index) == (None, None)
+
+
+def test_find_frame_in_empty_index_finds_nothing():
+    assert find_frame(None, 100.0, make_index([])) == (None, None)
@@ -0,0 +1,154 @@
+import cv2
+import numpy as np
+
+from block_motion import BlockDiffSubtractor
+from frame_views import unletterbox_box
+
+# 🔹 Motion-region tiled inference
+#
+# The letterboxed object view shrinks a high-resolution frame to 640 pixels,
+# so a distant person may be only a few pixels tall by the time YOLO sees it.
+# Raising imgsz for the whole frame costs far more. In "tiled" mode the
+# object detector also crops TILE_SIZE x TILE_SIZE tiles from the full-
+# resolution frame around moving regions and around small objects found in
+# the previous run, and sends them through YOLO in one batch with the
+# letterboxed view. Tiles are at native resolution, so YOLO does no resizing
+# and small objects keep all their pixels. Boxes from every tile are mapped
+# back to frame coordinates and merged by cross-tile NMS, which also joins an
+# object cut by a tile border with its full-view detection.
+
+OBJECT_MODES = ("full", "tiled")
+TILE_SIZE = 640
+MAX_TILES = 4            # tiles per run, besides the full view
+REGION_WIDTH = 160       # width of the gray thumbnail moving regions are found on
+REGION_BLOCK = 4
+MIN_REGION_BLOCKS = 2    # connected moving blocks needed to count as a region
+NMS_IOU = 0.5
+NMS_CONTAINMENT = 0.8    # a box mostly inside a higher-scoring one of the same label is a duplicate
+FOLLOW_VIEW_PIXELS = 32  # objects smaller than this in the view keep being tiled after they stop moving
+
+
+def tiling_useful(frame_shape, view_size):
+    """Tiles only add detail when the letterboxed view is smaller than the frame."""
+    return max(frame_shape[:2]) > view_size
+
+
+class MotionRegions:
+    """Finds moving regions of a full-resolution frame on a small block-difference thumbnail."""
+
+    def __init__(self, frame_shape, width=REGION_WIDTH):
+        height, frame_w = frame_shape[:2]
+        self.size = (width, max(int(round(height * width / frame_w)), 1))
+        self.scale = frame_w / width
+        self.subtractor = BlockDiffSubtractor(block=REGION_BLOCK)
+
+    def update(self, frame):
+        """Feed one BGR frame. Returns moving regions as (x1, y1, x2, y2) in frame coordinates."""
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        mask = self.subtractor.apply(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        regions = []
+        for x, y, w, h, area in stats[1:count]:
+            if area >= MIN_REGION_BLOCKS * REGION_BLOCK * REGION_BLOCK:
+                regions.append(tuple(int(round(v * self.scale)) for v in (x, y, x + w, y + h)))
+        return regions
+
+
+def plan_tiles(regions, frame_shape, tile=TILE_SIZE, max_tiles=MAX_TILES):
+    """
+    Place up to max_tiles tile x tile windows (x, y) so that each region is
+    inside one. Smallest regions go first, since those are the ones the full
+    view loses; regions larger than a tile are left to the full view.
+    """
+    height, width = frame_shape[:2]
+    tile_w, tile_h = min(tile, width), min(tile, height)
+    tiles = []
+    for x1, y1, x2, y2 in sorted(regions, key=lambda r: (r[2] - r[0]) * (r[3] - r[1])):
+        if x2 - x1 > tile_w or y2 - y1 > tile_h:
+            continue
+        if any(tx <= x1 and ty <= y1 and x2 <= tx + tile_w and y2 <= ty + tile_h for tx, ty in tiles):
+            continue
+        cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+        tiles.append((min(max(cx - tile_w // 2, 0), width - tile_w), min(max(cy - tile_h // 2, 0), height - tile_h)))
+        if len(tiles) == max_tiles:
+            break
+    return tiles, (tile_w, tile_h)
+
+
+def crop_tiles(frame, tiles, tile_size):
+    tile_w, tile_h = tile_size
+    return [np.ascontiguousarray(frame[y:y + tile_h, x:x + tile_w]) for x, y in tiles]
+
+
+def merge_detections(detections, iou=NMS_IOU, containment=NMS_CONTAINMENT):
+    """Class-wise NMS over {label, confidence, bbox} dicts gathered from several tiles."""
+    kept = []
+    for det in sorted(detections, key=lambda d: d["confidence"], reverse=True):
+        x1, y1, x2, y2 = det["bbox"]
+        area = max(x2 - x1, 1) * max(y2 - y1, 1)
+        duplicate = False
+        for other in kept:
+            if other["label"] != det["label"]:
+                continue
+            ox1, oy1, ox2, oy2 = other["bbox"]
+            inter = max(min(x2, ox2) - max(x1, ox1), 0) * max(min(y2, oy2) - max(y1, oy1), 0)
+            other_area = max(ox2 - ox1, 1) * max(oy2 - oy1, 1)
+            if inter / (area + other_area - inter) >= iou or inter / min(area, other_area) >= containment:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(det)
+    return kept
+
+
+def result_detections(model, result, to_frame):
+    """Detections of one YOLO result, with boxes mapped to frame coordinates by to_frame."""
+    detections = []
+    for box in result.boxes.cpu().numpy():
+        detections.append({
+            "label": model.names[int(box.cls[0])],
+            "class_id": int(box.cls[0]),
+            "confidence": float(box.conf[0]),
+            "bbox": to_frame(box.xyxy[0]),
+        })
+    return detections
+
+
+class TiledInference:
+    """Per-camera tiling state: the moving-region model and small objects to keep following."""
+
+    def __init__(self, frame_shape, tile=TILE_SIZE, max_tiles=MAX_TILES):
+        self.frame_shape = frame_shape
+        self.tile = tile
+        self.max_tiles = max_tiles
+        self.regions = MotionRegions(frame_shape)
+        self.moving = []
+        self.followed = []  # small boxes from the last run, tiled again even if they stop moving
+        self.last_tiles = 0
+
+    def observe(self, frame):
+        """Update the moving regions; call for every new frame, including skipped ones."""
+        self.moving = self.regions.update(frame)
+
+    def detect(self, model, view, frame, params, conf):
+        """
+        Run YOLO on the letterboxed view plus motion tiles of frame in one batch.
+        params are the view's letterbox_params. Returns merged detections in frame coordinates.
+        """
+        tiles, tile_size = plan_tiles(self.followed + self.moving, frame.shape, self.tile, self.max_tiles)
+        self.last_tiles = len(tiles)
+        results = model.predict([view] + crop_tiles(frame, tiles, tile_size), imgsz=self.tile,
+                                verbose=False, conf=conf)
+
+        mappers = [lambda xyxy: unletterbox_box(xyxy, params)]
+        mappers += [lambda xyxy, tx=tx, ty=ty: tuple(int(v) + o for v, o in zip(xyxy, (tx, ty, tx, ty)))
+                    for tx, ty in tiles]
+        detections = []
+        for to_frame, result in zip(mappers, results):
+            detections += result_detections(model, result, to_frame)
+        detections = merge_detections(detections)
+
+        scale = params[0]
+        self.followed = [d["bbox"] for d in detections
+                         if max(d["bbox"][2] - d["bbox"][0], d["bbox"][3] - d["bbox"][1]) * scale < FOLLOW_VIEW_PIXELS]
+        return detections
@@ -0,0 +1,235 @@
+import cv2
+import numpy as np
+import os
+import threading
+import time
+
+from shared_state import FRAME_META_DTYPE, attach_shared_array, frame_meta_name, open_shared_memory
+from startup_report import StartupReport
+from structured_log import get_logger
+
+log = get_logger("capture")
+
+# 🔹 Capture settings
+PACING_REALTIME = "realtime"
+PACING_FAST = "fast"
+INITIAL_BACKOFF = 1.0    # seconds before the first reconnect attempt
+MAX_BACKOFF = 30.0
+STATS_INTERVAL = 10      # seconds between capture reports
+STREAM_PREFIXES = ("rtsp://", "rtmp://", "http://", "https://", "udp://", "tcp://")
+SYNTHETIC_PREFIX = "synthetic://"  # generated scene, see synthetic_scene.py
+PACED_KINDS = ("file", "synthetic")  # sources that produce frames faster than real time
+
+
+def parse_source(source):
+    """
+    Turn a CameraSetting source into something cv2.VideoCapture accepts.
+    Returns (source, kind) where kind is "device", "file", "stream" or "synthetic".
+    """
+    if isinstance(source, int):
+        return source, "device"
+    source = str(source).strip()
+    if source.isdigit():
+        return int(source), "device"
+    if source.lower().startswith(STREAM_PREFIXES):
+        return source, "stream"
+    if source.lower().startswith(SYNTHETIC_PREFIX):
+        from synthetic_scene import parse_synthetic_source
+        parse_synthetic_source(source)  # raises ValueError for bad options
+        return source, "synthetic"
+    if os.path.exists(source):
+        return source, "file"
+    raise ValueError(f"Unsupported camera source: {source!r}")
+
+
+class FrameGrabber(threading.Thread):
+    """
+    Decodes frames in a dedicated thread and keeps only the latest one.
+    Failed opens and reads trigger a reconnect with exponential backoff.
+    In "fast" pacing (file and synthetic sources only) the thread waits for
+    every frame to be consumed instead of dropping it, so files are processed
+    as quickly as the consumer allows without skipping frames.
+    """
+
+    def __init__(self, source, kind, pacing=PACING_REALTIME, loop_files=True):
+        super().__init__(daemon=True)
+        self.source = source
+        self.kind = kind
+        self.pacing = pacing if kind in PACED_KINDS else PACING_REALTIME
+        self.loop_files = loop_files
+
+        self.lock = threading.Lock()
+        self.consumed = threading.Event()
+        self.consumed.set()
+        self.stopped = threading.Event()
+
+        self.frame = None
+        self.frame_time = 0.0
+        self.seq = 0
+        self.last_taken_seq = 0
+        self.frames_decoded = 0
+        self.frames_dropped = 0
+        self.reconnects = 0
+        self.connected = False
+        self.finished = False
+
+    def _open(self):
+        if self.kind == "synthetic":
+            from synthetic_scene import SyntheticCapture
+            return SyntheticCapture(self.source)
+        if self.kind == "device" and os.name == "nt":
+            cap = cv2.VideoCapture(self.source, cv2.CAP_DSHOW)
+        else:
+            cap = cv2.VideoCapture(self.source)
+        if self.kind == "stream":
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def run(self):
+        backoff = INITIAL_BACKOFF
+        cap = None
+        while not self.stopped.is_set():
+            if cap is None:
+                cap = self._open()
+                if not cap.isOpened():
+                    cap.release()
+                    cap = None
+                    self.connected = False
+                    log.error("Could not open source %r, retrying in %.0fs", self.source, backoff,
+                              extra={"key": f"capture-open:{self.source}"})
+                    self.stopped.wait(backoff)
+                    backoff = min(backoff * 2, MAX_BACKOFF)
+                    self.reconnects += 1
+                    continue
+                self.connected = True
+                source_fps = cap.get(cv2.CAP_PROP_FPS) or 0
+                frame_interval = 1.0 / source_fps if source_fps > 0 else 0
+                next_frame_time = time.time()
+
+            if self.pacing == PACING_FAST:
+                self.consumed.wait()
+
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                if self.kind == "file" and self.loop_files and self.frames_decoded > 0:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                if self.kind == "file" and not self.loop_files:
+                    self.finished = True
+                    break
+                log.error("Lost source %r, reconnecting in %.0fs", self.source, backoff,
+                          extra={"key": f"capture-lost:{self.source}"})
+                cap.release()
+                cap = None
+                self.connected = False
+                self.stopped.wait(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                self.reconnects += 1
+                continue
+
+            backoff = INITIAL_BACKOFF
+            now = time.time()
+            with self.lock:
+                if self.seq > self.last_taken_seq:
+                    self.frames_dropped += 1
+                self.frame = frame
+                self.frame_time = now
+                self.seq += 1
+                self.frames_decoded += 1
+                self.consumed.clear()
+
+            # Files decode faster than real time; pace them at their own FPS
+            if self.kind in PACED_KINDS and self.pacing == PACING_REALTIME and frame_interval:
+                next_frame_time += frame_interval
+                delay = next_frame_time - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame_time = time.time()
+
+        if cap is not None:
+            cap.release()
+        self.connected = False
+
+    def latest(self, last_seq):
+        """Return (seq, frame, grab_time) if a frame newer than last_seq exists, else None."""
+        with self.lock:
+            if self.seq == last_seq or self.frame is None:
+                return None
+            self.last_taken_seq = self.seq
+            result = (self.seq, self.frame, self.frame_time)
+        self.consumed.set()
+        return result
+
+    def stop(self):
+        self.stopped.set()
+        self.consumed.set()
+
+
+def video_capture_process(shm_name, shape, source, cam_id, pacing=PACING_REALTIME, loop_files=True):
+    """
+    Publishes frames from a device index, video file or stream URL into the
+    camera's shared-memory buffer, resized to the buffer's shape, and keeps
+    the camera's metadata record (sequence number, timestamp, stats) current.
+    """
+    startup = StartupReport("capture", cam_id)
+    try:
+        source, kind = parse_source(source)
+    except ValueError as e:
+        log.error("Camera %s: %s", cam_id, e, extra={"cam_id": cam_id})
+        return
+
+    shm = open_shared_memory(shm_name)
+    frame_buffer = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    meta_shm, meta = attach_shared_array(frame_meta_name(cam_id), FRAME_META_DTYPE)
+
+    grabber = FrameGrabber(source, kind, pacing, loop_files)
+    grabber.start()
+    log.info("Capture started for Camera %s (%s: %r, pacing=%s)", cam_id, kind, source, grabber.pacing,
+             extra={"cam_id": cam_id})
+
+    last_seq = 0
+    published = 0
+    last_report = time.time()
+    decoded_at_report = 0
+    try:
+        while not grabber.finished:
+            latest = grabber.latest(last_seq)
+            if latest is None:
+                time.sleep(0.002)
+            else:
+                last_seq, frame, grab_time = latest
+                if frame.shape != shape:
+                    frame = cv2.resize(frame, (shape[1], shape[0]), interpolation=cv2.INTER_AREA)
+                meta["version"] += 1
+                np.copyto(frame_buffer, frame)
+                published += 1
+                meta["timestamp"] = grab_time
+                meta["seq"] = published
+                meta["version"] += 1
+                startup.finish()
+
+            now = time.time()
+            if now - last_report >= STATS_INTERVAL:
+                fps = (grabber.frames_decoded - decoded_at_report) / (now - last_report)
+                meta["decode_fps"] = fps
+                decoded_at_report = grabber.frames_decoded
+                last_report = now
+                log.info("Camera %s capture: %.1f fps decoded, %s dropped, %s reconnects", cam_id, fps,
+                         grabber.frames_dropped, grabber.reconnects, extra={"cam_id": cam_id})
+
+            meta["frames_decoded"] = grabber.frames_decoded
+            meta["frames_dropped"] = grabber.frames_dropped
+            meta["reconnects"] = grabber.reconnects
+            meta["connected"] = grabber.connected
+    finally:
+        log.info("Capture shutting down for Camera %s...", cam_id, extra={"cam_id": cam_id})
+        grabber.stop()
+        grabber.join(timeout=2)
+        meta["connected"] = 0
+        shm.close()
+        meta_shm.close()
+
+
+if __name__ == "__main__":
+    print("Run main.py to start the system.")
@@ -0,0 +1,152 @@
+import os
+import time
+from queue import Empty
+
+from change_gate import reuse_settings
+from detection_ring import detection_ring_name
+from startup_report import StartupReport
+from structured_log import get_logger
+from worker_profiler import host, unhost
+
+# 🔹 Pooled detector execution
+#
+# Instead of one process per camera per detector, a fixed pool of workers
+# serves every camera. Each (camera, detector) task is pinned to one worker
+# so its state (MOG2 background model, pending view, scheduler slot) lives in
+# exactly one place, and the YOLO model is loaded once per worker rather than
+# once per camera. New tasks go to the worker with the lowest estimated
+# cost, so every worker carries roughly the same load.
+
+log = get_logger("pool")
+
+TASK_COST = {"object": 10, "face": 5, "motion": 1}  # rough relative CPU cost per frame
+REPORT_INTERVAL = 30  # seconds between pool worker reports
+
+
+def default_pool_workers():
+    return int(os.getenv("IVSS_POOL_WORKERS") or os.cpu_count() or 1)
+
+
+def pick_worker(loads, detector):
+    """Least-loaded worker for a new task; adds the task's estimated cost to that worker's load."""
+    worker = loads.index(min(loads))
+    loads[worker] += TASK_COST.get(detector, 1)
+    return worker
+
+
+def detector_task(cam_id, detector, shm_name, shape, cam_config, view_spec, sched=None):
+    """Everything a pool worker needs to build one (camera, detector) detector."""
+    thresholds = {"motion": cam_config.get("motionThreshold"), "object": cam_config.get("objectThreshold")}
+    return {"cam_id": cam_id, "detector": detector, "shm_name": shm_name, "shape": shape,
+            "ring": detection_ring_name(cam_id, detector),
+            "threshold": thresholds.get(detector), "sched": sched, "view": view_spec,
+            "zones": cam_config.get("motionZones"), "engine": cam_config.get("motionEngine") or "mog2",
+            "reuse": reuse_settings(cam_config), "mode": cam_config.get("objectMode") or "full",
+            "latency_target": cam_config.get("objectLatencyTarget")}
+
+
+def create_detector(task, shared, startup=None):
+    detector = task["detector"]
+    if detector == "motion":
+        from motion_detection import MotionDetector
+        return MotionDetector(task["shm_name"], task["shape"], task["ring"], task["cam_id"], task["threshold"],
+                              task.get("zones"), task["view"], task.get("engine", "mog2"))
+    if detector == "object":
+        from object_detection import ObjectDetector, OBJECT_MODEL, load_object_model
+        # Weights per quality tier, loaded once per worker; the top tier's up front
+        models = shared.setdefault("object_models", {})
+        if OBJECT_MODEL not in models:
+            t0 = time.time()
+            models[OBJECT_MODEL] = load_object_model()
+            if startup is not None:
+                startup.stages["model_load"] = round(time.time() - t0, 3)
+        return ObjectDetector(task["shm_name"], task["shape"], task["ring"], task["cam_id"],
+                              task["threshold"], task.get("sched"), models=models,
+                              reuse=task.get("reuse"), mode=task.get("mode", "full"),
+                              latency_target=task.get("latency_target"))
+    if detector == "face":
+        from face_recognition_module import FaceDetector
+        return FaceDetector(task["shm_name"], task["shape"], task["ring"], task["cam_id"], task.get("sched"),
+                            task.get("reuse"))
+    raise ValueError(f"Unknown detector: {detector}")
+
+
+def detector_pool_process(worker_index, tasks, control_queue=None):
+    """
+    Round-robins over this worker's (camera, detector) tasks, giving each one
+    step at a time, and sleeps briefly only when none of them had work. The
+    pipeline adds, removes and reconfigures tasks through control_queue:
+    ("add", task), ("remove", cam_id, detector), ("update", cam_id, cam_config, detector).
+    """
+    startup = StartupReport(f"pool{worker_index}")
+    shared = {}
+    detectors = []
+    steps = []
+
+    def add(task):
+        try:
+            detectors.append((task, create_detector(task, shared, startup)))
+            steps.append(0)
+            host(f"cam{task['cam_id']}-{task['detector']}")  # profile requests for it reach this worker
+        except Exception as e:
+            log.error("Pool worker %s: could not start %s for Camera %s: %s", worker_index, task["detector"],
+                      task["cam_id"], e, extra={"cam_id": task["cam_id"]})
+
+    def handle(message):
+        if message[0] == "add":
+            add(message[1])
+        elif message[0] == "remove":
+            for index, (task, detector) in enumerate(detectors):
+                if (task["cam_id"], task["detector"]) == (message[1], message[2]):
+                    detector.close()
+                    del detectors[index], steps[index]
+                    unhost(f"cam{task['cam_id']}-{task['detector']}")
+                    break
+        elif message[0] == "update":
+            for task, detector in detectors:
+                if (task["cam_id"], task["detector"]) == (message[1], message[3]):
+                    detector.reconfigure(message[2])
+
+    for task in tasks:
+        add(task)
+    names = [f"cam{task['cam_id']}/{task['detector']}" for task, _ in detectors]
+    log.info("Pool worker %s started: %s", worker_index, ", ".join(names) or "no tasks yet")
+
+    last_report = time.time()
+    try:
+        while True:
+            while control_queue is not None:
+                try:
+                    handle(control_queue.get_nowait())
+                except Empty:
+                    break
+
+            busy = False
+            for index, (task, detector) in enumerate(detectors):
+                try:
+                    if detector.step():
+                        steps[index] += 1
+                        busy = True
+                        startup.finish()
+                except Exception:
+                    log.exception("Pool worker %s: %s on Camera %s failed", worker_index, task["detector"],
+                                  task["cam_id"], extra={"key": f"pool-step:{task['cam_id']}:{task['detector']}",
+                                                         "cam_id": task["cam_id"]})
+            if not busy:
+                time.sleep(0.005)
+
+            now = time.time()
+            if now - last_report >= REPORT_INTERVAL and detectors:
+                rates = ", ".join(f"cam{task['cam_id']}/{task['detector']} {n / (now - last_report):.1f}/s"
+                                  for (task, _), n in zip(detectors, steps))
+                log.info("Pool worker %s: %s", worker_index, rates)
+                steps[:] = [0] * len(detectors)
+                last_report = now
+    finally:
+        log.info("Pool worker %s shutting down...", worker_index)
+        for _, detector in detectors:
+            detector.close()
+
+
+if __name__ == "__main__":
+    print("Run main.py to start the system.")
@@ -0,0 +1,317 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from shared_state import attach_shared_array, create_shared_array
+from structured_log import get_logger
+
+# 🔹 On-demand sampling profiler for running workers
+#
+# Every pipeline process runs a ProfileWatcher thread that checks a small
+# shared request table (ivss_profile_shm) twice a second. When the
+# diagnostics page or the CLI below asks for a profile of a worker
+# ("cam0-object", "alerts", ...), that worker's watcher samples the Python
+# stacks of all its other threads every SAMPLE_INTERVAL seconds for the
+# requested time. It then writes two files to PROFILE_DIR:
+#   <stamp>_<target>.collapsed  "thread;outer;...;inner count" lines, the
+#                               input of flamegraph.pl and speedscope
+#   <stamp>_<target>.json       per-function self / total share of samples
+# The worker keeps running while it is sampled. A sample costs a walk of a
+# few stacks, so at 100 Hz the overhead is a fraction of one percent of a
+# core; the measured sampler CPU time is recorded in the summary. Time
+# spent in native code (YOLO, dlib, cv2.imencode, disk writes) shows up
+# under the Python function that called into it.
+#
+#   python worker_profiler.py cam0-object --seconds 15
+
+PROFILE_SHM_NAME = "ivss_profile_shm"
+PROFILE_SLOTS = 16
+PROFILE_DIR = os.path.join("diagnostics", "profiles")
+SAMPLE_INTERVAL = 0.01  # seconds
+MAX_SECONDS = 120
+WATCH_INTERVAL = 0.5
+SUMMARY_FUNCTIONS = 40
+IGNORED_THREADS = ("QueueFeederThread",)  # multiprocessing queue plumbing
+BOOTSTRAP_FILES = (os.path.join("multiprocessing", "process.py"), "threading.py")
+
+FREE, PENDING, RUNNING, DONE, FAILED = range(5)
+STATUS_NAMES = ("free", "pending", "running", "done", "failed")
+
+PROFILE_DTYPE = np.dtype([
+    ("request_id", "<u4"),
+    ("target", "S32"),       # process name, e.g. cam0-object
+    ("seconds", "<f4"),
+    ("status", "u1"),
+    ("requested", "<f8"),
+    ("finished", "<f8"),
+    ("samples", "<u4"),
+    ("output", "S96"),       # summary file name in PROFILE_DIR
+])
+
+log = get_logger("profiler")
+
+# Workers hosted by this process besides itself (pool workers run several cameras' detectors)
+_hosted = set()
+
+
+def create_profile_table():
+    return create_shared_array(PROFILE_SHM_NAME, PROFILE_DTYPE, (PROFILE_SLOTS,))
+
+
+def attach_profile_table(track=True):
+    """(shm, table) of the running pipeline. Raises FileNotFoundError if there is none."""
+    return attach_shared_array(PROFILE_SHM_NAME, PROFILE_DTYPE, (PROFILE_SLOTS,), track)
+
+
+def host(name):
+    _hosted.add(name)
+
+
+def unhost(name):
+    _hosted.discard(name)
+
+
+def request_profile(target, seconds):
+    """
+    Ask the worker named target to profile itself for seconds. Returns the
+    request id. Raises FileNotFoundError when the pipeline is not running and
+    RuntimeError when every slot is busy.
+    """
+    seconds = min(max(float(seconds), 1.0), MAX_SECONDS)
+    shm, table = attach_profile_table(track=False)
+    try:
+        now = time.time()
+        # Pending requests nobody claimed (no such worker) are given up after a while
+        free = [i for i in range(PROFILE_SLOTS)
+                if table["status"][i] in (FREE, DONE, FAILED)
+                or (table["status"][i] == PENDING and now - table["requested"][i] > MAX_SECONDS)]
+        if not free:
+            raise RuntimeError("All profile slots are busy")
+        index = min(free, key=lambda i: table["requested"][i])
+        request_id = int(table["request_id"].max()) + 1
+        table["request_id"][index] = request_id
+        table["target"][index] = target.encode()[:32]
+        table["seconds"][index] = seconds
+        table["requested"][index] = now
+        table["finished"][index] = 0
+        table["samples"][index] = 0
+        table["output"][index] = b""
+        table["status"][index] = PENDING  # last, so a watcher never sees a half-written request
+        return request_id
+    finally:
+        del table
+        shm.close()
+
+
+def profile_requests():
+    """Requests in the table, newest first, as dicts; empty when the pipeline is not running."""
+    try:
+        shm, table = attach_profile_table(track=False)
+    except FileNotFoundError:
+        return []
+    rows = table.copy()
+    del table
+    shm.close()
+    return [{
+        "request_id": int(row["request_id"]),
+        "target": row["target"].decode(),
+        "seconds": float(row["seconds"]),
+        "status": STATUS_NAMES[row["status"]],
+        "requested": float(row["requested"]),
+        "finished": float(row["finished"]) or None,
+        "samples": int(row["samples"]),
+        "output": row["output"].decode() or None,
+    } for row in sorted(rows, key=lambda r: -r["requested"]) if row["status"] != FREE]
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def entry_depth(codes):
+    """
+    Number of innermost frames to keep: everything below the process or thread
+    entry point. The frames above it (fork, bootstrap) are the same in every sample.
+    """
+    inside = False
+    for depth, code in enumerate(codes):
+        if not code.co_filename.endswith(BOOTSTRAP_FILES):
+            inside = True
+        elif inside:
+            return depth
+    return len(codes)
+
+
+def sample_stacks(seconds, interval=SAMPLE_INTERVAL):
+    """
+    Sample every other thread of this process for seconds. Returns (stacks,
+    samples, sampler_cpu): stacks counts (thread, outermost, ..., innermost) tuples.
+    """
+    own = threading.get_ident()
+    stacks = Counter()
+    samples = 0
+    cpu_start = time.thread_time()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            name = names.get(ident, str(ident))
+            if ident == own or name.startswith(IGNORED_THREADS):
+                continue
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            stacks[(name,) + tuple(frame_label(code) for code in reversed(codes[:entry_depth(codes)]))] += 1
+        samples += 1
+        time.sleep(interval)
+    return stacks, samples, time.thread_time() - cpu_start
+
+
+def collapsed_lines(stacks):
+    return [f"{';'.join(stack)} {count}" for stack, count in sorted(stacks.items())]
+
+
+def summarize(stacks, samples):
+    """Per-function self (innermost frame) and total (anywhere on the stack) share of samples."""
+    own, total = Counter(), Counter()
+    threads = Counter()
+    for stack, count in stacks.items():
+        threads[stack[0]] += count
+        own[stack[-1]] += count
+        for function in set(stack[1:]):
+            total[function] += count
+    functions = [{
+        "function": function,
+        "self": own[function],
+        "total": count,
+        "self_pct": round(100 * own[function] / max(samples, 1), 1),
+        "total_pct": round(100 * count / max(samples, 1), 1),
+    } for function, count in total.most_common(SUMMARY_FUNCTIONS)]
+    return {"threads": dict(threads), "functions": functions}
+
+
+def write_profile(target, stacks, samples, seconds, sampler_cpu, started, directory=PROFILE_DIR):
+    """Write the collapsed stacks and the summary; returns the summary file name."""
+    os.makedirs(directory, exist_ok=True)
+    stem = f"{time.strftime('%Y%m%d_%H%M%S', time.localtime(started))}_{target}"
+    with open(os.path.join(directory, stem + ".collapsed"), "w", encoding="utf-8") as f:
+        f.write("\n".join(collapsed_lines(stacks)) + "\n")
+    summary = {
+        "target": target,
+        "pid": os.getpid(),
+        "started": started,
+        "seconds": round(seconds, 2),
+        "samples": samples,
+        "interval": SAMPLE_INTERVAL,
+        "overhead_pct": round(100 * sampler_cpu / max(seconds, 1e-9), 2),
+        "collapsed": stem + ".collapsed",
+    }
+    summary.update(summarize(stacks, samples))
+    with open(os.path.join(directory, stem + ".json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=1)
+    return stem + ".json"
+
+
+def list_profiles(directory=PROFILE_DIR, limit=20):
+    """Summaries of the newest profiles written to directory."""
+    try:
+        names = sorted((n for n in os.listdir(directory) if n.endswith(".json")), reverse=True)[:limit]
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names:
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                profiles.append(dict(json.load(f), file=name))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+class ProfileWatcher(threading.Thread):
+    """Waits for profile requests addressed to this process and runs them."""
+
+    def __init__(self, process_name):
+        super().__init__(name="profile-watcher", daemon=True)
+        self.process_name = process_name
+        self.table = None
+
+    def run(self):
+        while True:
+            time.sleep(WATCH_INTERVAL)
+            if self.table is None:
+                try:
+                    self.shm, self.table = attach_profile_table()
+                except FileNotFoundError:
+                    continue
+            names = {self.process_name} | _hosted
+            for index in range(PROFILE_SLOTS):
+                if self.table["status"][index] == PENDING and self.table["target"][index].decode() in names:
+                    self.table["status"][index] = RUNNING
+                    self.profile(index)
+
+    def profile(self, index):
+        table = self.table
+        target = table["target"][index].decode()
+        seconds = float(table["seconds"][index])
+        log.info("Profiling %s (pid %s) for %.0fs", target, os.getpid(), seconds)
+        started = time.time()
+        try:
+            stacks, samples, sampler_cpu = sample_stacks(seconds)
+            output = write_profile(target, stacks, samples, time.time() - started, sampler_cpu, started)
+        except Exception as e:
+            log.error("Profiling %s failed: %s", target, e)
+            table["status"][index] = FAILED
+        else:
+            table["samples"][index] = samples
+            table["output"][index] = output.encode()[:96]
+            table["status"][index] = DONE
+            log.info("Profile of %s written to %s", target, os.path.join(PROFILE_DIR, output))
+        table["finished"][index] = time.time()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile a running pipeline worker without stopping it.")
+    parser.add_argument("target", help="Worker name: cam<N>-<capture|preprocess|motion|object|face|clip|record>, "
+                                       "alerts, scheduler or pool<N>")
+    parser.add_argument("--seconds", type=float, default=10, help=f"Sampling time (at most {MAX_SECONDS})")
+    parser.add_argument("--top", type=int, default=15, help="Functions to print")
+    args = parser.parse_args()
+
+    try:
+        request_id = request_profile(args.target, args.seconds)
+    except FileNotFoundError:
+        print("[ERROR] The pipeline is not running.")
+        sys.exit(1)
+    deadline = time.time() + args.seconds + 10
+    while time.time() < deadline:
+        request = next((r for r in profile_requests() if r["request_id"] == request_id), None)
+        if request and request["status"] in ("done", "failed"):
+            break
+        time.sleep(0.5)
+    else:
+        print(f"[ERROR] No worker named {args.target!r} picked up the request.")
+        sys.exit(1)
+    if request["status"] == "failed":
+        print(f"[ERROR] Profiling {args.target} failed; see logs/ivss.jsonl.")
+        sys.exit(1)
+
+    with open(os.path.join(PROFILE_DIR, request["output"]), encoding="utf-8") as f:
+        summary = json.load(f)
+    print(f"{summary['target']}: {summary['samples']} samples in {summary['seconds']}s, "
+          f"sampler overhead {summary['overhead_pct']}% of a core")
+    print(f"{'total%':>7} {'self%':>6}  function")
+    for function in summary["functions"][:args.top]:
+        print(f"{function['total_pct']:7.1f} {function['self_pct']:6.1f}  {function['function']}")
+    print(f"Collapsed stacks: {os.path.join(PROFILE_DIR, summary['collapsed'])}")
+
+
+if __name__ == "__main__":
+    main()